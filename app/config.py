@@ -13,6 +13,47 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY", "clave_admin_secreta_por_defecto")
 
+# Motor de almacenamiento de los repositorios: "json" (archivo completo), "log" (append-only)
+# o "sqlite" (base <coleccion>.sqlite3 en modo WAL).
+# STORAGE_ENGINES permite elegirlo por colección, p.ej. "examenes_resultados=log,citas=log".
+# Si no se fija STORAGE_ENGINE, citas usa "log": es la colección con más escrituras y con "json"
+# cada reserva o cancelación reescribiría el citas.json completo (el snapshot sigue siendo citas.json).
+STORAGE_ENGINE = os.getenv("STORAGE_ENGINE", "json")
+STORAGE_ENGINES = {
+    **({} if "STORAGE_ENGINE" in os.environ else {"citas": "log"}),
+    **dict(par.split("=", 1) for par in os.getenv("STORAGE_ENGINES", "").replace(" ", "").split(",") if "=" in par),
+}
+# Hilos del pool que ejecuta el I/O bloqueante (FileLock, open, json, os.replace) fuera del event loop.
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))
+
+# Ventana (ms) de group commit: las mutaciones concurrentes de una colección dentro de la
+# ventana se persisten con una sola escritura. 0 = cada mutación escribe por su cuenta.
+GROUP_COMMIT_MS = float(os.getenv("GROUP_COMMIT_MS", "0"))
+# Durabilidad: con STORAGE_FSYNC=1 cada escritura hace fsync (archivo y directorio) antes de
+# confirmar; SQLite usa synchronous=FULL. Con group commit el fsync se comparte por lote.
+STORAGE_FSYNC = os.getenv("STORAGE_FSYNC", "0").lower() in ("1", "true", "si")
+
+# Caché de tokens JWT ya verificados (app/security/token_cache.py): cantidad máxima de tokens
+# y segundos que una verificación se reutiliza (nunca más allá del 'exp' del token).
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+TOKEN_CACHE_TTL_S = float(os.getenv("TOKEN_CACHE_TTL_S", "300"))
+
+# Perfiles de pacientes y médicos parseados que cada proceso conserva en memoria (LRU por manager).
+PERFIL_CACHE_SIZE = int(os.getenv("PERFIL_CACHE_SIZE", "2048"))
+
+# Citas: duración de cada cita (minutos) y jornada de atención (horas locales [inicio, fin)).
+# La duración define el intervalo que ocupa una cita en la agenda del médico (sin solapamientos)
+# y la grilla de horarios libres que se ofrecen dentro de la jornada.
+CITA_DURACION_MIN = int(os.getenv("CITA_DURACION_MIN", "30"))
+CITA_JORNADA_INICIO = int(os.getenv("CITA_JORNADA_INICIO", "8"))
+CITA_JORNADA_FIN = int(os.getenv("CITA_JORNADA_FIN", "18"))
+# Cota de la duración de cualquier cita guardada (minutos): acota cuántas citas anteriores de la
+# agenda pueden seguir en curso. Debe ser >= todo CITA_DURACION_MIN usado históricamente.
+CITA_DURACION_MAX_MIN = int(os.getenv("CITA_DURACION_MAX_MIN", "240"))
+
+# Tamaño del log (bytes) a partir del cual se compacta en un snapshot en segundo plano.
+LOG_COMPACTION_BYTES = int(os.getenv("LOG_COMPACTION_BYTES", str(4 * 1024 * 1024)))
+
 
 def crear_token_acceso(data: dict):
     """
@@ -32,14 +73,20 @@ def decodificar_token_acceso(token: str):
     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     return payload
 
+def motor_almacenamiento(coleccion: str) -> str:
+    """
+    Retorna el motor configurado para una colección (nombre de archivo sin extensión).
+    """
+    return STORAGE_ENGINES.get(coleccion, STORAGE_ENGINE)
+
 def verificar_documento_paciente(documento: str):
     """
     Verifica si el documento del paciente está registrado.
-    Esta es una implementación básica que verifica si existe
-    un archivo JSON para el paciente.
+    Consulta el registro en memoria de pacientes/ (app/utils/registro_documentos.py);
+    sólo un documento desconocido se verifica contra su archivo JSON.
     """
-    paciente_file_path = BASE_DATA_DIR / "pacientes" / f"{documento}.json"
-    return paciente_file_path.exists()
+    from app.utils.registro_documentos import registro_documentos
+    return registro_documentos(BASE_DATA_DIR / "pacientes").existe(documento)
 
 def obtener_directorio_pacientes():
     """
@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import logging
 from dotenv import load_dotenv
 from app.managers.cita_manager import CitaManager
 from app.managers.historial_cita import HistorialCita
@@ -11,10 +12,18 @@ from app.routers.paciente_router import router as paciente_router
 from app.routers.medico_router import router as medico_router
 from app.routers.admin_router import router as admin_router
 from app.routers.examenes_router import router as examenes_router
+from app.repositories.unit_of_work import recuperar_journals
+from app.repositories.cita_repository import CitaRepository
+from app.repositories.diagnostico_repository import DiagnosticoRepository
+from app.repositories.examen_repository import ExamenSolicitudRepository, ExamenResultadoRepository
+from app.repositories.alerta_repository import AlertaRepository
+from app.config import BASE_DATA_DIR
+from app.utils.sesion import SesionMiddleware
+from app.utils.registro_documentos import registro_documentos
 # Métricas
-from app.metrics.metrics import observe_request, generate_latest, CONTENT_TYPE_LATEST
+from app.metrics.metrics import generate_latest, CONTENT_TYPE_LATEST
+from app.metrics.middleware import MetricsMiddleware
 from starlette.responses import Response
-import time
 
 app = FastAPI(title="VitalApp API")
 
@@ -42,22 +51,11 @@ app.include_router(medico_router)
 app.include_router(admin_router)
 app.include_router(examenes_router)
 
-# Middleware de métricas HTTP
-@app.middleware("http")
-async def metrics_http_middleware(request, call_next):
-    start = time.perf_counter()
-    response = None
-    try:
-        response = await call_next(request)
-        return response
-    finally:
-        duration = time.perf_counter() - start
-        # Obtener ruta normalizada (plantilla) si es posible
-        route_obj = request.scope.get("route")
-        route_path = getattr(route_obj, "path", None)
-        method = request.method
-        status_code = response.status_code if response else 500
-        observe_request(method, route_path, status_code, duration)
+# Sesión por solicitud: cada archivo de entidad se lee una vez y los cambios se escriben al final
+app.add_middleware(SesionMiddleware)
+
+# Middleware de métricas HTTP (ASGI puro; el último agregado es el más externo: mide todo)
+app.add_middleware(MetricsMiddleware)
 
 # Endpoint /metrics
 @app.get("/metrics")
@@ -65,6 +63,18 @@ async def metrics_endpoint():
     data = generate_latest()
     return Response(content=data, media_type=CONTENT_TYPE_LATEST)
 
+# Completar unidades de trabajo interrumpidas (journal pendiente) antes de atender solicitudes
+recuperar_journals(BASE_DATA_DIR)
+
+# Validar claves primarias/únicas contra los archivos de datos (además precarga índices y caché)
+for repositorio in (CitaRepository, DiagnosticoRepository, ExamenSolicitudRepository, ExamenResultadoRepository, AlertaRepository):
+    for problema in repositorio(BASE_DATA_DIR).validar_claves():
+        logging.getLogger("vitalapp").warning("Clave duplicada en almacenamiento: %s", problema)
+
+# Registro en memoria de documentos de pacientes y médicos (verificación de existencia sin disco)
+for carpeta in ("pacientes", "medicos"):
+    registro_documentos(BASE_DATA_DIR / carpeta).cargar()
+
 # Crear instancias
 cm = CitaManager()
 hc = HistorialCita()
@@ -77,7 +87,8 @@ def read_root():
 
 # Leyenda arquitectura:
 # main.py -> registra routers (capa de entrada HTTP)
-# routers -> validación ligera + dependencias de seguridad JWT
+# routers -> validación ligera + dependencias de seguridad JWT; el I/O bloqueante se delega
+#            al pool de app/utils/blocking.py (ejecutar_bloqueante) para no detener el event loop
 # services -> lógica de negocio (workflow, reglas)
 # managers -> fachada legacy/persistencia directa JSON (en transición a repositorios)
 # repositories -> abstracción de almacenamiento (JSON ahora, adaptable a SQL)
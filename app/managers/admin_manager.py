@@ -1,9 +1,9 @@
-import json
-import os
 from datetime import datetime
 from pathlib import Path
-from filelock import FileLock
 from app.config import BASE_DATA_DIR
+from app.utils.file_atomic import atomic_load_json
+from app.utils.sesion import al_confirmar, cargar_json, existe_json, guardar_json
+from app.utils.indice_persistente import IndicePersistente
 
 
 class AdminManager:
@@ -18,57 +18,64 @@ class AdminManager:
         self.examenes_dir = self.base_dir / "examenes"
         self.examenes_dir.mkdir(parents=True, exist_ok=True)
 
+        # Índice documento_paciente -> códigos de examen (fuera de examenes/: no es un examen)
+        self.indice_pacientes = IndicePersistente(
+            self.base_dir / "indices" / "examenes_por_paciente.json", self._construir_indice_pacientes
+        )
+
     def crear_resultado_examen(self, codigo_examen: str, datos_examen: dict):
         """
         Crea un resultado de examen con los datos proporcionados.
         """
         archivo = self.examenes_dir / f"{codigo_examen}.json"
-        lock_path = str(archivo) + ".lock"
         
         # Agregar marca de tiempo
         datos_examen["fecha_registro"] = datetime.now().isoformat()
         datos_examen["codigo_examen"] = codigo_examen
         
-        with FileLock(lock_path):
-            with open(archivo, "w") as f:
-                json.dump(datos_examen, f, indent=4)
+        anterior = cargar_json(str(archivo))
+        guardar_json(str(archivo), datos_examen)
+        al_confirmar(lambda: self._indexar(codigo_examen, datos_examen, anterior))
+
+    def _indexar(self, codigo_examen: str, examen: dict, anterior: dict = None):
+        # Si el examen cambió de paciente se retira del índice del paciente anterior.
+        if isinstance(anterior, dict) and anterior.get("documento_paciente") not in (None, examen.get("documento_paciente")):
+            self.indice_pacientes.quitar(anterior["documento_paciente"], codigo_examen)
+        if examen.get("documento_paciente"):
+            self.indice_pacientes.agregar(examen["documento_paciente"], codigo_examen)
+
+    def _construir_indice_pacientes(self) -> dict:
+        # Fuente de verdad: archivos de examenes/. Sólo se recorre si el índice no existe.
+        indice = {}
+        for archivo in sorted(self.examenes_dir.glob("*.json")):
+            examen = atomic_load_json(str(archivo))
+            if isinstance(examen, dict) and examen.get("documento_paciente"):
+                indice.setdefault(examen["documento_paciente"], []).append(archivo.stem)
+        return indice
 
     def obtener_resultado_examen(self, codigo_examen: str) -> dict:
         """
         Obtiene el resultado de un examen específico.
         """
         archivo = self.examenes_dir / f"{codigo_examen}.json"
-        lock_path = str(archivo) + ".lock"
         
-        if not os.path.exists(archivo):
+        if not existe_json(str(archivo)):
             return None
-
-        with FileLock(lock_path):
-            try:
-                with open(archivo, "r") as f:
-                    return json.load(f)
-            except Exception:
-                return None
+        # Sin lock: los escritores reemplazan el archivo de forma atómica.
+        return cargar_json(str(archivo))
 
     def listar_examenes_paciente(self, documento_paciente: str) -> list:
         """
         Lista todos los exámenes de un paciente específico.
+        Sólo lee los archivos del paciente, resueltos con el índice documento -> códigos.
         """
         examenes = []
         
-        # Recorrer todos los archivos de exámenes
-        for archivo in self.examenes_dir.iterdir():
-            if archivo.is_file() and archivo.suffix == '.json':
-                with FileLock(str(archivo) + ".lock"):
-                    try:
-                        with open(archivo, "r") as f:
-                            examen = json.load(f)
-                            # Verificar si el examen pertenece al paciente
-                            if examen.get("documento_paciente") == documento_paciente:
-                                examenes.append(examen)
-                    except Exception:
-                        # Ignorar archivos que no se pueden leer
-                        continue
+        for codigo_examen in self.indice_pacientes.obtener(documento_paciente):
+            examen = self.obtener_resultado_examen(codigo_examen)
+            # Ignorar archivos que no se pueden leer o que ya no pertenecen al paciente
+            if isinstance(examen, dict) and examen.get("documento_paciente") == documento_paciente:
+                examenes.append(examen)
                         
         return examenes
 
@@ -86,10 +93,7 @@ class AdminManager:
             examen["observaciones"] = observaciones
             
         archivo = self.examenes_dir / f"{codigo_examen}.json"
-        lock_path = str(archivo) + ".lock"
-        
-        with FileLock(lock_path):
-            with open(archivo, "w") as f:
-                json.dump(examen, f, indent=4)
+        guardar_json(str(archivo), examen)
+        al_confirmar(lambda: self._indexar(codigo_examen, examen))
                 
         return True
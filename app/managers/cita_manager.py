@@ -1,64 +1,124 @@
-import json
 import os
-import secrets
-import string
-from datetime import datetime, timezone
-from filelock import FileLock
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+import app.config as config
+from app.config import BASE_DATA_DIR
 from app.managers.medico_manager import MedicoManager
+from app.repositories.cita_repository import CitaRepository
+from app.utils.file_atomic import atomic_load_json
+
+logger = logging.getLogger("vitalapp")
+
+
+def fecha_a_epoch(fecha):
+    """
+    Convierte una fecha ISO 8601 en segundos epoch (UTC).
+    Fechas 'naive' se interpretan en hora local; 'Z' y offsets se respetan.
+    Lanza ValueError si el formato es inválido.
+    """
+    raw = fecha.strip()
+    # Reemplazar 'Z' por '+00:00' para compatibilidad con fromisoformat
+    if raw.endswith('Z'):
+        raw = raw[:-1] + '+00:00'
+    return datetime.fromisoformat(raw).timestamp()
 
 
 class CitaManager:
 
     def __init__(self, base_path=None):
         """
-        En vez de un solo archivo global, ahora trabajamos con una carpeta donde
-        cada paciente tendrá su propio archivo JSON.
+        Las citas se guardan en un único almacén (CitaRepository, citas.json) indexado por
+        paciente y por médico. base_path es la carpeta legacy con un archivo por paciente;
+        si se indica explícitamente (tests) el almacén también se crea en esa carpeta.
         """
         if base_path is None:
             # Persistencia fuera del proyecto (como en EC2)
             base_path = os.path.expanduser("~/memoryApps/saludVital/citas/")
+            repo_dir = BASE_DATA_DIR
+        else:
+            repo_dir = Path(base_path)
 
         self.base_path = base_path
         os.makedirs(self.base_path, exist_ok=True)
         self.medico_manager = MedicoManager()
+        self.repo = CitaRepository(repo_dir)
+        self._migrar_legacy()
 
     # ===============================================================
-    #  📌 UTILIDADES DE ARCHIVOS POR PACIENTE
+    #  📌 MIGRACIÓN DESDE ARCHIVOS POR PACIENTE / AGENDAS
     # ===============================================================
 
-    def _get_file_path(self, documento):
-        """
-        Retorna la ruta del archivo JSON del paciente.
-        """
-        return os.path.join(self.base_path, f"{documento}.json")
-
-    def _load_data_paciente(self, documento):
+    def _migrar_legacy(self):
         """
-        Carga las citas específicas del paciente.
+        Migración única de citas/<paciente>.json y agendas/<medico>.json al almacén citas.json.
+        Si una cita aparece en ambos, prevalece la copia de la agenda (era la única que
+        registraba el cierre). Es idempotente: sólo inserta códigos que aún no existen.
+        Los códigos legacy (6 caracteres) podían repetirse: dos citas con el mismo código pero
+        distinto paciente/médico/fecha se conservan ambas; la segunda recibe el código
+        <codigo>-<n> (el original queda en codigo_cita_legacy) y se registra una advertencia.
         """
-        file_path = self._get_file_path(documento)
-        lock_path = file_path + ".lock"
+        marca = self.repo.file_path.with_suffix(".migrado")
+        if marca.exists():
+            return
+        por_codigo = {}  # codigo_cita -> citas distintas que lo usan
 
-        if not os.path.exists(file_path):
-            return []
+        def _agregar(cita, fusionar):
+            variantes = por_codigo.setdefault(cita["codigo_cita"], [])
+            for i, previa in enumerate(variantes):
+                if self._identidad_legacy(previa) == self._identidad_legacy(cita):
+                    variantes[i] = {**previa, **cita} if fusionar else cita
+                    return
+            variantes.append(cita)
 
-        with FileLock(lock_path):
-            try:
-                with open(file_path, "r") as f:
-                    return json.load(f)
-            except Exception:
-                return []
+        for archivo in sorted(Path(self.base_path).glob("*.json")):
+            if archivo == self.repo.file_path:
+                continue
+            for cita in atomic_load_json(str(archivo)) or []:
+                if isinstance(cita, dict) and cita.get("codigo_cita"):
+                    _agregar(cita, fusionar=False)
+        for archivo in sorted((self.repo.file_path.parent / "agendas").glob("*.json")):
+            for cita in atomic_load_json(str(archivo)) or []:
+                if isinstance(cita, dict) and cita.get("codigo_cita"):
+                    _agregar(cita, fusionar=True)
+        citas = []
+        for codigo, variantes in por_codigo.items():
+            citas.append(variantes[0])
+            n = 1
+            for cita in variantes[1:]:
+                while f"{codigo}-{n}" in por_codigo:
+                    n += 1
+                nuevo = f"{codigo}-{n}"
+                n += 1
+                logger.warning("Migración de citas: código %s repetido con otra cita; se conserva como %s", codigo, nuevo)
+                citas.append({**cita, "codigo_cita": nuevo, "codigo_cita_legacy": codigo})
+        if citas:
+            self.repo.importar([self._con_documentos(c) for c in citas])
+        marca.touch()
 
-    def _save_data_paciente(self, documento, citas):
-        """
-        Guarda únicamente las citas del paciente.
-        """
-        file_path = self._get_file_path(documento)
-        lock_path = file_path + ".lock"
+    @staticmethod
+    def _identidad_legacy(cita):
+        # Misma cita en el archivo del paciente y en la agenda: mismo paciente, médico y fecha.
+        medico = (cita.get("medico_info") or {}).get("documento_medico") or cita.get("medico")
+        return cita.get("documento"), medico, cita.get("fecha")
 
-        with FileLock(lock_path):
-            with open(file_path, "w") as f:
-                json.dump(citas, f, indent=4)
+    def _con_documentos(self, cita):
+        # Claves de índice en el nivel superior (las citas legacy sólo tenían documento / medico_info).
+        documento_medico = (cita.get("medico_info") or {}).get("documento_medico")
+        cita = {
+            **cita,
+            "documento_paciente": cita.get("documento"),
+            "documento_medico": documento_medico if documento_medico != "N/A" else None,
+        }
+        if cita.get("fecha_epoch") is None and isinstance(cita.get("fecha"), str):
+            try:
+                cita["fecha_epoch"] = fecha_a_epoch(cita["fecha"])
+            except ValueError:
+                pass
+        return cita
 
     def verificar_medico(self, medico):
         """
@@ -79,17 +139,15 @@ class CitaManager:
                     "documento": datos_medico["documento"]
                 }
             
-            # Si no se encontró por documento, buscamos por nombre
-            # Recorremos todos los archivos de médicos
-            for archivo in os.listdir(self.medico_manager.medicos_dir):
-                if archivo.endswith(".json"):
-                    documento = archivo[:-5]  # Quitamos .json
-                    datos_medico = self.medico_manager.obtener_datos_medico(documento)
-                    if datos_medico and datos_medico.get("nombre_completo") == medico:
-                        return {
-                            "nombre": datos_medico["nombre_completo"],
-                            "documento": datos_medico["documento"]
-                        }
+            # Si no se encontró por documento, buscamos por nombre en el índice
+            # (nombre normalizado -> documentos) sin recorrer el directorio de médicos
+            for documento in self.medico_manager.buscar_documentos_por_nombre(medico):
+                datos_medico = self.medico_manager.obtener_datos_medico(documento)
+                if datos_medico:
+                    return {
+                        "nombre": datos_medico["nombre_completo"],
+                        "documento": datos_medico["documento"]
+                    }
         
         # Fallback placeholder
         return {"nombre": medico, "documento": "N/A"}
@@ -99,12 +157,29 @@ class CitaManager:
     # ===============================================================
 
     def obtener_citas_paciente(self, documento):
-        # Wrapper público requerido por tests unitarios.
-        return self._load_data_paciente(documento)
+        # Lectura por índice documento_paciente del almacén de citas.
+        return self.repo.listar_citas_paciente(documento)
+
+    def obtener_agenda_medico(self, documento_medico, desde=None, hasta=None):
+        # Lectura por índice documento_medico ordenado por fecha_epoch: misma cita que ve el
+        # paciente (sin copias). desde/hasta (epoch) se resuelven con búsqueda binaria; sin
+        # límites se retorna la agenda completa (incluye citas legacy sin fecha).
+        if desde is None and hasta is None:
+            return self.repo.listar_citas_medico(documento_medico)
+        return self.repo.listar_agenda_medico(documento_medico, desde, hasta)
+
+    def obtener_citas_sin_fecha(self, documento_medico):
+        return self.repo.listar_citas_sin_fecha(documento_medico)
+
+    def obtener_cita(self, codigo_cita):
+        return self.repo.obtener_por_codigo(codigo_cita)
+
+    def actualizar_estado_cita(self, codigo_cita, estado):
+        return self.repo.update(codigo_cita, lambda cita: {**cita, "estado": estado})
 
     def agendar_cita(self, paciente, medico, fecha, documento, tipoCita, motivoPaciente):
         """
-        Guarda la cita en el archivo individual del paciente.
+        Guarda la cita una sola vez en citas.json; la agenda del médico es una vista por índice.
         """
         # Verificar que el médico exista
         datos_medico = self.verificar_medico(medico)
@@ -114,13 +189,15 @@ class CitaManager:
             "documento_medico": datos_medico['documento'],
             "nombre_medico": datos_medico['nombre']
         }
-        citas_paciente = self._load_data_paciente(documento)
-        fecha_valida = self._verificar_fecha(fecha)
+        fecha_valida, fecha_epoch = self._verificar_fecha(fecha)
         nueva_cita = {
             "paciente": paciente,
             "medico": medico_str,
             "medico_info": medico_info,
             "fecha": fecha_valida,
+            "fecha_epoch": fecha_epoch,
+            "duracion_min": config.CITA_DURACION_MIN,
+            "fecha_fin_epoch": fecha_epoch + config.CITA_DURACION_MIN * 60,
             "documento": documento,
             "registrado": datetime.now().isoformat(),
             "codigo_cita": self._generar_codigo_cita(),
@@ -128,56 +205,101 @@ class CitaManager:
             "motivoPaciente": motivoPaciente,
             "prioridad": self._calcular_prioridad(tipoCita)
         }
-        citas_paciente.append(nueva_cita)
-        self._save_data_paciente(documento, citas_paciente)
-        # Leyenda: Sincronización hacia agenda de médico (persistencia paralela). Evita agenda vacía.
-        doc_med = datos_medico['documento']
-        if doc_med != 'N/A':
-            agenda_medico = self.medico_manager.obtener_agenda_medico(doc_med)
-            # Evitar duplicados (por código de cita)
-            if not any(c.get("codigo_cita") == nueva_cita["codigo_cita"] for c in agenda_medico):
-                agenda_medico.append({**nueva_cita})
-                self.medico_manager.actualizar_agenda_medico(doc_med, agenda_medico)
+        nueva_cita = self._con_documentos(nueva_cita)
+        # Leyenda: Una sola escritura; la agenda del médico es una vista por índice del mismo almacén.
+        # Con médico registrado se rechaza (HorarioOcupado) si su agenda ya tiene una cita solapada.
+        if nueva_cita["documento_medico"] is None:
+            self.repo.insert(nueva_cita)
+        else:
+            self.repo.reservar(nueva_cita)
         return nueva_cita
 
+    def horarios_libres(self, documentos_medicos, desde, hasta, n=5):
+        """
+        Próximos n horarios libres entre desde y hasta (epoch) para los médicos dados, en orden
+        cronológico. Los horarios siguen la grilla de la jornada (CITA_JORNADA_INICIO/FIN, pasos de
+        CITA_DURACION_MIN) y se descartan los que se cruzan con intervalos ocupados de la agenda.
+        """
+        desde = max(desde, time.time())
+        por_medico = [self._libres_medico(documento, desde, hasta) for documento in documentos_medicos]
+        return [
+            {
+                "documento_medico": documento,
+                "fecha": datetime.fromtimestamp(inicio).isoformat(),
+                "fecha_epoch": inicio,
+                "duracion_min": config.CITA_DURACION_MIN,
+            }
+            for inicio, documento in islice(heapq.merge(*por_medico), n)
+        ]
+
+    def _libres_medico(self, documento_medico, desde, hasta):
+        # Recorre la grilla de la jornada y los intervalos ocupados (ordenados) a la vez.
+        # Produce (inicio, documento_medico) para mezclar varios médicos en orden cronológico.
+        duracion = config.CITA_DURACION_MIN * 60
+        ocupados = self.repo.intervalos_ocupados(documento_medico, desde, hasta)
+        i = 0
+        for inicio in self._grilla(desde, hasta):
+            fin = inicio + duracion
+            while i < len(ocupados) and ocupados[i][1] <= inicio:
+                i += 1
+            if i < len(ocupados) and ocupados[i][0] < fin:
+                continue
+            yield inicio, documento_medico
+
+    @staticmethod
+    def _grilla(desde, hasta):
+        # Inicios de los horarios de la jornada (hora local) con inicio >= desde y fin <= hasta.
+        paso = timedelta(minutes=config.CITA_DURACION_MIN)
+        dia = datetime.fromtimestamp(desde).replace(hour=0, minute=0, second=0, microsecond=0)
+        while dia.timestamp() < hasta:
+            horario = dia + timedelta(hours=config.CITA_JORNADA_INICIO)
+            cierre = dia + timedelta(hours=config.CITA_JORNADA_FIN)
+            while horario + paso <= cierre:
+                inicio = horario.timestamp()
+                if inicio + paso.total_seconds() > hasta:
+                    return
+                if inicio >= desde:
+                    yield inicio
+                horario += paso
+            dia += timedelta(days=1)
+
     def eliminar_cita(self, paciente, medico, fecha, documento):
         """
-        Elimina una cita del archivo específico del paciente.
-        Nota-todo-> Si hay múltiples citas que coinciden, elimina todas.
-                ajustar el metodo de creacion de citas para que no hayan citas duplicadas que
-                coincidan en estos parametros, ya que por logica un medico no deberia
-                atender mas de un tipo de cita a un mismo paciente en la misma fecha.
+        Elimina (marca como eliminadas) las citas del paciente que coinciden.
+        Nota: Si hay múltiples citas que coinciden, elimina todas. Con médico registrado
+                agendar_cita ya rechaza horarios solapados; sólo pueden coincidir citas legacy
+                o con médico sin registrar (documento "N/A").
         """
-        citas = self._load_data_paciente(documento)
-        inicial = len(citas)
+        citas = self.repo.listar_citas_paciente(documento)
         if isinstance(medico, list):
             medico_str = medico[1]
         else:
             medico_str = medico
-        # Obtener códigos de citas que se eliminarán (para limpiar agenda del médico)
         codigos_eliminados = [c.get("codigo_cita") for c in citas if c.get("paciente") == paciente and c.get("medico") == medico_str and c.get("fecha") == fecha and c.get("documento") == documento]
-        citas = [c for c in citas if not (c.get("paciente") == paciente and c.get("medico") == medico_str and c.get("fecha") == fecha and c.get("documento") == documento)]
-        if len(citas) < inicial:
-            self._save_data_paciente(documento, citas)
-            # Leyenda: Limpieza de agenda del médico para mantener consistencia.
-            datos_medico = self.verificar_medico(medico_str)
-            doc_med = datos_medico['documento']
-            if doc_med != 'N/A' and codigos_eliminados:
-                agenda_medico = self.medico_manager.obtener_agenda_medico(doc_med)
-                agenda_filtrada = [a for a in agenda_medico if a.get("codigo_cita") not in codigos_eliminados]
-                if len(agenda_filtrada) != len(agenda_medico):
-                    self.medico_manager.actualizar_agenda_medico(doc_med, agenda_filtrada)
+        if codigos_eliminados:
+            # Leyenda: La agenda del médico se deriva del mismo almacén; no hay copia que limpiar.
+            self.repo.eliminar(codigos_eliminados)
             return True
 
         return False
 
+    def cancelar_cita(self, codigo_cita):
+        """
+        Cancela una cita por código: una búsqueda por índice (codigo_cita), bajo el lock del
+        almacén, y una marca de eliminación (eliminada=True). La cita desaparece a la vez de la
+        vista del paciente y de la agenda del médico, que son índices del mismo almacén.
+        Retorna la cita cancelada o None si no existe (o ya estaba cancelada).
+        """
+        cancelada = self.repo.eliminar([codigo_cita])
+        return cancelada[0] if cancelada else None
+
     # ===============================================================
     #  📌 UTILIDADES DE LOGICA
     # ===============================================================
 
-    def _generar_codigo_cita(self, length=6):
-        chars = string.ascii_uppercase + string.digits
-        return ''.join(secrets.choice(chars) for _ in range(length))
+    def _generar_codigo_cita(self):
+        # Id ordenable por tiempo y verificado contra la clave primaria (codigo_cita).
+        return self.repo.nuevo_id()
 
     def _calcular_prioridad(self, tipoCita):
         prioridades = {
@@ -200,28 +322,16 @@ class CitaManager:
         - Fechas 'naive' (sin zona horaria) e.g. 2025-11-24T12:00:00
         - Fechas con 'Z' (UTC) e.g. 2025-11-24T12:00:00Z
         - Fechas con offset e.g. 2025-11-24T12:00:00+00:00
-        Normaliza la comparación para evitar 'can't compare offset-naive and offset-aware datetimes'.
-        Mantiene la cadena original retornada para no romper tests previos.
+        La fecha se normaliza una sola vez a epoch UTC (naive = hora local), lo que evita
+        'can't compare offset-naive and offset-aware datetimes' y permite ordenar la agenda.
+        Retorna (cadena original, fecha_epoch); la cadena se conserva para no romper tests previos.
         """
         try:
-            raw = fecha.strip()
-            # Reemplazar 'Z' por '+00:00' para compatibilidad con fromisoformat
-            if raw.endswith('Z'):
-                raw = raw[:-1] + '+00:00'
-            fecha_cita = datetime.fromisoformat(raw)
+            fecha_epoch = fecha_a_epoch(fecha)
         except ValueError:
             raise ValueError("Formato de fecha inválido. Use ISO 8601.")
 
-        # Normalizar referencia temporal
-        if fecha_cita.tzinfo is None:
-            # Fecha naive -> comparar contra ahora naive
-            ahora = datetime.now()
-        else:
-            # Fecha aware -> comparar en UTC
-            ahora = datetime.now(timezone.utc)
-            fecha_cita = fecha_cita.astimezone(timezone.utc)
-
-        if fecha_cita < ahora:
+        if fecha_epoch < time.time():
             raise ValueError("No se puede agendar una cita en una fecha pasada.")
 
-        return fecha
\ No newline at end of file
+        return fecha, fecha_epoch
\ No newline at end of file
@@ -1,18 +1,30 @@
-import json
 import hashlib
-import os
+import unicodedata
 from datetime import datetime
 from pathlib import Path
-from filelock import FileLock
-from app.config import BASE_DATA_DIR
-from app.utils.file_atomic import locked_atomic_write, locked_atomic_load
+from app.config import BASE_DATA_DIR, PERFIL_CACHE_SIZE
+from app.utils.cache_lru import CacheLRU
+from app.utils.file_atomic import atomic_load_json
+from app.utils.registro_documentos import registro_documentos
+from app.utils.sesion import al_confirmar, cargar_json, existe_json, guardar_json
+from app.utils.indice_persistente import IndicePersistente
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """Clave de búsqueda por nombre: sin tildes, sin distinguir mayúsculas y con espacios simples."""
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFKD", nombre) if not unicodedata.combining(c))
+    return " ".join(sin_tildes.casefold().split())
+
+
+# Perfiles leídos (compartidos por todas las instancias del proceso; la clave es la ruta).
+_PERFILES = CacheLRU(PERFIL_CACHE_SIZE)
 
 
 class MedicoManager:
     # Leyenda: Fachada legacy para operaciones de médicos.
     # Responsabilidades actuales:
     # - Registro / autenticación de médicos (persistencia en archivos individuales)
-    # - Gestión de agenda (archivo por médico con lista de citas)
+    # - La agenda ya no se guarda aquí: es una vista por índice del almacén de citas (CitaManager)
     # - Almacenamiento de diagnóstico por código de cita (1 archivo por diagnóstico)
     # Relación con servicios: MedicoService delega aquí mientras se migra a repositorios.
     # Futuro: separar en repositorios y services (MedicoRepository, AgendaService, DiagnosticoService).
@@ -24,15 +36,21 @@ class MedicoManager:
         self.base_dir = base_dir or BASE_DATA_DIR
         self.medicos_dir = self.base_dir / "medicos"
         self.medicos_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Directorio para almacenar las agendas de los médicos
-        self.agendas_dir = self.base_dir / "agendas"
-        self.agendas_dir.mkdir(parents=True, exist_ok=True)
+        # Documentos registrados en memoria: la existencia no requiere consultar el disco
+        self.registro = registro_documentos(self.medicos_dir)
         
         # Directorio para almacenar los diagnósticos
         self.diagnosticos_dir = self.base_dir / "diagnosticos"
         self.diagnosticos_dir.mkdir(parents=True, exist_ok=True)
 
+        # Índices nombre / especialidad normalizados -> documentos (evitan recorrer medicos/)
+        self.indice_nombres = IndicePersistente(
+            self.base_dir / "indices" / "medicos_por_nombre.json", self._construir_indice_nombres
+        )
+        self.indice_especialidades = IndicePersistente(
+            self.base_dir / "indices" / "medicos_por_especialidad.json", self._construir_indice_especialidades
+        )
+
     def _hash_contraseña(self, contraseña: str) -> str:
         """
         Genera un hash de la contraseña para almacenarla de forma segura.
@@ -48,16 +66,17 @@ class MedicoManager:
         datos_a_guardar = datos_medico.copy()
         datos_a_guardar["contraseña"] = self._hash_contraseña(datos_medico["contraseña"])
         datos_a_guardar["fecha_registro"] = datetime.now().isoformat()
-        locked_atomic_write(str(archivo), datos_a_guardar)
+        guardar_json(str(archivo), datos_a_guardar, _PERFILES)
 
     def _cargar_medico(self, documento: str) -> dict:
         """
         Carga los datos de un médico desde su archivo JSON.
         """
-        archivo = self.medicos_dir / f"{documento}.json"
-        if not os.path.exists(archivo):
+        archivo = str(self.medicos_dir / f"{documento}.json")
+        # existe_json cubre un registro de esta misma solicitud aún no confirmado.
+        if not self.registro.existe(documento) and not existe_json(archivo):
             return None
-        return locked_atomic_load(str(archivo))
+        return cargar_json(archivo, _PERFILES)
 
     def registrar_medico(self, documento: str, nombre_completo: str, contraseña: str,
                          telefono: str, email: str, especialidad: str) -> bool:
@@ -81,18 +100,30 @@ class MedicoManager:
 
         # Guardar médico
         self._guardar_medico(datos_medico)
+        # Registro e índices se actualizan cuando el archivo ya está en disco.
+        al_confirmar(lambda: self._indexar_medico(documento, nombre_completo, especialidad))
         return True
 
+    def _indexar_medico(self, documento: str, nombre_completo: str, especialidad: str):
+        self.registro.agregar(documento)
+        self.indice_nombres.agregar(normalizar_nombre(nombre_completo), documento)
+        self.indice_especialidades.agregar(normalizar_nombre(especialidad), documento)
+
     def autenticar_medico(self, documento: str, contraseña: str) -> bool:
         """
         Autentica a un médico verificando su documento y contraseña.
         """
-        medico = self._cargar_medico(documento)
-        if not medico:
-            return False
+        return self.autenticar_y_obtener(documento, contraseña)[0]
 
-        hash_contraseña = self._hash_contraseña(contraseña)
-        return medico.get("contraseña") == hash_contraseña
+    def autenticar_y_obtener(self, documento: str, contraseña: str) -> tuple:
+        """
+        Autentica con una sola carga del perfil.
+        Retorna (autenticado, datos del médico sin la contraseña o None).
+        """
+        medico = self._cargar_medico(documento)
+        if not medico or medico.pop("contraseña", None) != self._hash_contraseña(contraseña):
+            return False, None
+        return True, medico
 
     def obtener_datos_medico(self, documento: str) -> dict:
         """
@@ -105,42 +136,38 @@ class MedicoManager:
             return medico
         return None
 
-    def existe_medico(self, documento: str) -> bool:
+    def buscar_documentos_por_nombre(self, nombre: str) -> list:
         """
-        Verifica si un médico está registrado en el sistema.
+        Retorna los documentos de los médicos cuyo nombre coincide (sin distinguir tildes ni mayúsculas).
         """
-        archivo = self.medicos_dir / f"{documento}.json"
-        return os.path.exists(archivo)
+        return self.indice_nombres.obtener(normalizar_nombre(nombre))
 
-    def obtener_agenda_medico(self, documento: str) -> list:
+    def buscar_documentos_por_especialidad(self, especialidad: str) -> list:
         """
-        Obtiene todas las citas asignadas a un médico.
+        Retorna los documentos de los médicos de una especialidad (sin distinguir tildes ni mayúsculas).
         """
-        archivo = self.agendas_dir / f"{documento}.json"
-        lock_path = str(archivo) + ".lock"
-        
-        if not os.path.exists(archivo):
-            return []
+        return self.indice_especialidades.obtener(normalizar_nombre(especialidad))
+
+    def _construir_indice_nombres(self) -> dict:
+        return self._construir_indice("nombre_completo")
 
-        with FileLock(lock_path):
-            try:
-                with open(archivo, "r") as f:
-                    return json.load(f)
-            except Exception:
-                return []
+    def _construir_indice_especialidades(self) -> dict:
+        return self._construir_indice("especialidad")
 
-    def actualizar_agenda_medico(self, documento: str, citas: list):
+    def _construir_indice(self, campo: str) -> dict:
+        # Fuente de verdad: archivos de medicos/. Sólo se recorre si el índice no existe.
+        indice = {}
+        for archivo in sorted(self.medicos_dir.glob("*.json")):
+            medico = atomic_load_json(str(archivo))
+            if medico and medico.get(campo):
+                indice.setdefault(normalizar_nombre(medico[campo]), []).append(archivo.stem)
+        return indice
+
+    def existe_medico(self, documento: str) -> bool:
         """
-        Actualiza la agenda de un médico.
+        Verifica si un médico está registrado en el sistema.
         """
-        archivo = self.agendas_dir / f"{documento}.json"
-        lock_path = str(archivo) + ".lock"
-        
-        with FileLock(lock_path):
-            tmp_path = str(archivo) + ".tmp"
-            with open(tmp_path, "w") as f:
-                json.dump(citas, f, indent=4)
-            os.replace(tmp_path, archivo)
+        return self.registro.existe(documento)
 
     def agregar_diagnostico(self, codigo_cita: str, diagnostico_data: dict):
         # Leyenda: Persistencia simple de diagnóstico por cita.
@@ -154,7 +181,7 @@ class MedicoManager:
                 except Exception:
                     pass
         diagnostico_data["fecha_registro"] = datetime.now().isoformat()
-        locked_atomic_write(str(archivo), diagnostico_data)
+        guardar_json(str(archivo), diagnostico_data)
 
     def obtener_diagnostico(self, codigo_cita: str) -> dict:
         """
@@ -162,9 +189,9 @@ class MedicoManager:
         """
         archivo = self.diagnosticos_dir / f"{codigo_cita}.json"
         
-        if not os.path.exists(archivo):
+        if not existe_json(str(archivo)):
             return None
-        return locked_atomic_load(str(archivo))
+        return cargar_json(str(archivo))
 
     def marcar_cita_atendida(self, documento_medico: str, codigo_cita: str):
         """
@@ -180,4 +207,4 @@ class MedicoManager:
                 
                 # Guardar cambios
                 archivo = self.medicos_dir / f"{documento_medico}.json"
-                locked_atomic_write(str(archivo), medico)
+                guardar_json(str(archivo), medico, _PERFILES)
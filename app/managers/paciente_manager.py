@@ -1,8 +1,13 @@
-import json
 import hashlib
 import os
 from datetime import datetime
-from app.config import obtener_archivo_paciente
+from app.config import PERFIL_CACHE_SIZE
+from app.utils.cache_lru import CacheLRU
+from app.utils.registro_documentos import registro_documentos
+from app.utils.sesion import al_confirmar, cargar_json, existe_json, guardar_json
+# Perfiles leídos (compartidos por todas las instancias del proceso; la clave es la ruta).
+_PERFILES = CacheLRU(PERFIL_CACHE_SIZE)
+
 
 class PacienteManager:
     def __init__(self, base_dir=None):
@@ -15,6 +20,8 @@ class PacienteManager:
         # Directorio local de pacientes según base_dir
         self._pacientes_dir = os.path.join(self.base_dir, 'pacientes')
         os.makedirs(self._pacientes_dir, exist_ok=True)
+        # Documentos registrados en memoria: la existencia no requiere consultar el disco
+        self.registro = registro_documentos(self._pacientes_dir)
 
     def _archivo_paciente(self, documento: str) -> str:
         return os.path.join(self._pacientes_dir, f"{documento}.json")
@@ -33,15 +40,15 @@ class PacienteManager:
         datos_a_guardar = datos_paciente.copy()
         datos_a_guardar["contraseña"] = self._hash_contraseña(datos_paciente["contraseña"])
         datos_a_guardar["fecha_registro"] = datetime.now().isoformat()
-        with open(archivo, "w") as f:
-            json.dump(datos_a_guardar, f, indent=4)
+        # Reemplazo atómico: los lectores (_cargar_paciente) no necesitan lock.
+        # En una solicitud HTTP la escritura se difiere al cierre de la sesión.
+        guardar_json(archivo, datos_a_guardar, _PERFILES)
 
     def _cargar_paciente(self, documento: str) -> dict:
-        archivo = self._archivo_paciente(documento)
-        if not os.path.exists(archivo):
+        # existe_json cubre un registro de esta misma solicitud aún no confirmado.
+        if not self.registro.existe(documento) and not existe_json(self._archivo_paciente(documento)):
             return None
-        with open(archivo, "r") as f:
-            return json.load(f)
+        return cargar_json(self._archivo_paciente(documento), _PERFILES)
 
     def registrar_paciente(self, documento: str, nombre_completo: str, contraseña: str, 
                           telefono: str, email: str, edad: int, sexo: str) -> bool:
@@ -61,6 +68,8 @@ class PacienteManager:
             "sexo": sexo
         }
         self._guardar_paciente(datos_paciente)
+        # El registro en memoria se actualiza cuando el archivo ya está en disco.
+        al_confirmar(lambda: self.registro.agregar(documento))
         return True
 
     def verificar_edad(self, edad):
@@ -73,11 +82,17 @@ class PacienteManager:
         return edad_int
 
     def autenticar_paciente(self, documento: str, contraseña: str) -> bool:
+        return self.autenticar_y_obtener(documento, contraseña)[0]
+
+    def autenticar_y_obtener(self, documento: str, contraseña: str) -> tuple:
+        """
+        Autentica con una sola carga del perfil.
+        Retorna (autenticado, datos del paciente sin la contraseña o None).
+        """
         paciente = self._cargar_paciente(documento)
-        if not paciente:
-            return False
-        hash_contraseña = self._hash_contraseña(contraseña)
-        return paciente.get("contraseña") == hash_contraseña
+        if not paciente or paciente.pop("contraseña", None) != self._hash_contraseña(contraseña):
+            return False, None
+        return True, paciente
 
     def obtener_datos_paciente(self, documento: str) -> dict:
         paciente = self._cargar_paciente(documento)
@@ -87,4 +102,4 @@ class PacienteManager:
         return None
 
     def existe_paciente(self, documento: str) -> bool:
-        return os.path.exists(self._archivo_paciente(documento))
+        return self.registro.existe(documento)
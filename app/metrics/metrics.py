@@ -6,7 +6,7 @@ Convenciones:
 
 Helpers expuestos para incrementar métricas de negocio desde servicios.
 """
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from time import perf_counter
 
 # Métricas HTTP
@@ -21,6 +21,17 @@ HTTP_REQUEST_DURATION_SECONDS = Histogram(
     ['method', 'route']
 )
 
+HTTP_RESPONSE_SIZE_BYTES = Histogram(
+    'vitalapp_http_response_size_bytes',
+    'Tamaño del cuerpo de las respuestas HTTP (bytes)',
+    ['method', 'route'],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+)
+HTTP_REQUESTS_EN_CURSO = Gauge(
+    'vitalapp_http_requests_en_curso',
+    'Solicitudes HTTP en curso (recibidas y con respuesta aún sin terminar de enviar)'
+)
+
 # Métricas de negocio
 CITAS_AGENDADAS_TOTAL = Counter(
     'vitalapp_citas_agendadas_total',
@@ -47,6 +58,95 @@ MEDICOS_LOGIN_TOTAL = Counter(
     'Total de logins exitosos de médicos'
 )
 
+# Métricas de almacenamiento (etiqueta coleccion = nombre del archivo sin extensión)
+REPO_CACHE_HITS_TOTAL = Counter(
+    'vitalapp_repo_cache_hits_total',
+    'Lecturas de repositorio servidas desde la caché en memoria',
+    ['coleccion']
+)
+REPO_CACHE_MISSES_TOTAL = Counter(
+    'vitalapp_repo_cache_misses_total',
+    'Lecturas de repositorio que requirieron parsear el archivo',
+    ['coleccion']
+)
+REPO_GROUP_COMMIT_LOTE = Histogram(
+    'vitalapp_repo_group_commit_lote',
+    'Mutaciones confirmadas por cada escritura compartida (group commit)',
+    ['coleccion'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+LECTURAS_COALESCIDAS_TOTAL = Counter(
+    'vitalapp_lecturas_coalescidas_total',
+    'Lecturas concurrentes de un mismo archivo resueltas con el parseo en curso de otro hilo (single-flight)',
+    ['coleccion']
+)
+# Tiempos y volumen de E/S por colección (repositorios, file_atomic.py y loaders de managers)
+_BUCKETS_ALMACENAMIENTO = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+STORAGE_LOCK_ESPERA_SECONDS = Histogram(
+    'vitalapp_storage_lock_espera_seconds',
+    'Tiempo esperando el lock de una colección (FileLock o transacción SQLite, segundos)',
+    ['coleccion'],
+    buckets=_BUCKETS_ALMACENAMIENTO
+)
+STORAGE_LOCK_RETENCION_SECONDS = Histogram(
+    'vitalapp_storage_lock_retencion_seconds',
+    'Tiempo que se retiene el lock de una colección una vez adquirido (segundos)',
+    ['coleccion'],
+    buckets=_BUCKETS_ALMACENAMIENTO
+)
+STORAGE_PARSEO_SECONDS = Histogram(
+    'vitalapp_storage_parseo_seconds',
+    'Duración del parseo JSON de lo leído de disco (segundos)',
+    ['coleccion'],
+    buckets=_BUCKETS_ALMACENAMIENTO
+)
+STORAGE_SERIALIZACION_SECONDS = Histogram(
+    'vitalapp_storage_serializacion_seconds',
+    'Duración de la serialización JSON antes de escribir (segundos)',
+    ['coleccion'],
+    buckets=_BUCKETS_ALMACENAMIENTO
+)
+STORAGE_BYTES_LEIDOS_TOTAL = Counter(
+    'vitalapp_storage_bytes_leidos_total',
+    'Bytes leídos de disco por colección',
+    ['coleccion']
+)
+STORAGE_BYTES_ESCRITOS_TOTAL = Counter(
+    'vitalapp_storage_bytes_escritos_total',
+    'Bytes escritos en disco por colección',
+    ['coleccion']
+)
+
+# Autenticación: caché de JWT verificados (app/security/token_cache.py)
+TOKEN_CACHE_TOTAL = Counter(
+    'vitalapp_token_cache_total',
+    'Verificaciones de token resueltas por la caché de JWT (resultado=hit|miss)',
+    ['resultado']
+)
+TOKEN_VERIFICACION_SECONDS = Histogram(
+    'vitalapp_token_verificacion_seconds',
+    'Duración de la verificación criptográfica de un JWT (sólo en miss, segundos)',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+
+# Pool de hilos para I/O bloqueante (app/utils/blocking.py)
+IO_POOL_TAMANO = Gauge(
+    'vitalapp_io_pool_tamano',
+    'Hilos máximos del pool de I/O bloqueante'
+)
+IO_POOL_OCUPADOS = Gauge(
+    'vitalapp_io_pool_ocupados',
+    'Tareas ejecutándose en el pool de I/O bloqueante'
+)
+IO_POOL_EN_COLA = Gauge(
+    'vitalapp_io_pool_en_cola',
+    'Tareas esperando un hilo libre en el pool de I/O bloqueante'
+)
+IO_POOL_ESPERA_SECONDS = Histogram(
+    'vitalapp_io_pool_espera_seconds',
+    'Tiempo que una tarea espera en cola antes de ejecutarse en el pool de I/O (segundos)'
+)
+
 # Futuras métricas (ejemplo gauge) podrían declararse aquí.
 # from prometheus_client import Gauge
 # PACIENTES_ACTIVOS = Gauge('vitalapp_pacientes_activos', 'Pacientes con sesión activa')
@@ -71,21 +171,76 @@ def inc_paciente_login():
 def inc_medico_login():
     MEDICOS_LOGIN_TOTAL.inc()
 
+# Helpers almacenamiento
+
+def inc_repo_cache_hit(coleccion: str):
+    REPO_CACHE_HITS_TOTAL.labels(coleccion=coleccion).inc()
+
+def inc_repo_cache_miss(coleccion: str):
+    REPO_CACHE_MISSES_TOTAL.labels(coleccion=coleccion).inc()
+
+def observe_repo_group_commit_lote(coleccion: str, tamano: int):
+    REPO_GROUP_COMMIT_LOTE.labels(coleccion=coleccion).observe(tamano)
+
+def inc_lectura_coalescida(coleccion: str):
+    LECTURAS_COALESCIDAS_TOTAL.labels(coleccion=coleccion).inc()
+
+def observe_lock_espera(coleccion: str, duration_seconds: float):
+    STORAGE_LOCK_ESPERA_SECONDS.labels(coleccion=coleccion).observe(duration_seconds)
+
+def observe_lock_retencion(coleccion: str, duration_seconds: float):
+    STORAGE_LOCK_RETENCION_SECONDS.labels(coleccion=coleccion).observe(duration_seconds)
+
+def observe_parseo(coleccion: str, duration_seconds: float, bytes_leidos: int):
+    STORAGE_PARSEO_SECONDS.labels(coleccion=coleccion).observe(duration_seconds)
+    STORAGE_BYTES_LEIDOS_TOTAL.labels(coleccion=coleccion).inc(bytes_leidos)
+
+def observe_serializacion(coleccion: str, duration_seconds: float, bytes_escritos: int):
+    STORAGE_SERIALIZACION_SECONDS.labels(coleccion=coleccion).observe(duration_seconds)
+    STORAGE_BYTES_ESCRITOS_TOTAL.labels(coleccion=coleccion).inc(bytes_escritos)
+
+def inc_token_cache(resultado: str):
+    TOKEN_CACHE_TOTAL.labels(resultado=resultado).inc()
+
+def observe_token_verificacion(duration_seconds: float):
+    TOKEN_VERIFICACION_SECONDS.observe(duration_seconds)
+
+def registrar_io_pool(tamano: int, ocupados, en_cola):
+    # Los gauges se calculan al hacer scrape: sin costo por tarea.
+    IO_POOL_TAMANO.set(tamano)
+    IO_POOL_OCUPADOS.set_function(ocupados)
+    IO_POOL_EN_COLA.set_function(en_cola)
+
+def observe_io_pool_espera(duration_seconds: float):
+    IO_POOL_ESPERA_SECONDS.observe(duration_seconds)
+
 # Helpers HTTP (usado por middleware)
 
-def observe_request(method: str, route: str, status: int, duration_seconds: float):
+def observe_request(method: str, route: str, status: int, duration_seconds: float, response_size: int | None = None):
     # Normalización defensiva
     method = (method or 'UNKNOWN').upper()
     route = route or 'unknown'
     status_str = str(status)
     HTTP_REQUESTS_TOTAL.labels(method=method, route=route, status=status_str).inc()
     HTTP_REQUEST_DURATION_SECONDS.labels(method=method, route=route).observe(duration_seconds)
+    if response_size is not None:
+        HTTP_RESPONSE_SIZE_BYTES.labels(method=method, route=route).observe(response_size)
+
+def inc_request_en_curso():
+    HTTP_REQUESTS_EN_CURSO.inc()
+
+def dec_request_en_curso():
+    HTTP_REQUESTS_EN_CURSO.dec()
 
 # Endpoint /metrics usará generate_latest() y CONTENT_TYPE_LATEST
 __all__ = [
     'generate_latest', 'CONTENT_TYPE_LATEST',
     'inc_cita_agendada', 'inc_examen_solicitado', 'inc_paciente_registrado',
     'inc_medico_registrado', 'inc_paciente_login', 'inc_medico_login',
-    'observe_request'
+    'inc_repo_cache_hit', 'inc_repo_cache_miss', 'observe_repo_group_commit_lote',
+    'inc_lectura_coalescida', 'observe_lock_espera', 'observe_lock_retencion',
+    'observe_parseo', 'observe_serializacion', 'inc_token_cache', 'observe_token_verificacion',
+    'registrar_io_pool', 'observe_io_pool_espera',
+    'observe_request', 'inc_request_en_curso', 'dec_request_en_curso'
 ]
 
@@ -0,0 +1,51 @@
+"""Middleware ASGI de métricas HTTP.
+Reemplaza a @app.middleware("http") (BaseHTTPMiddleware), que agrega tareas y streams
+intermedios a cada solicitud y rompe las respuestas en streaming. Aquí sólo se envuelve
+`send` para observar los mensajes de la respuesta:
+- status: del mensaje http.response.start.
+- tamaño: suma de los bytes de cada http.response.body.
+- duración: hasta el último fragmento del cuerpo (more_body=False), no hasta que el
+  endpoint retorna.
+- ruta: plantilla (p.ej. /citas/{documento}) que el router deja en scope["route"].
+También mantiene el gauge de solicitudes en curso.
+"""
+from __future__ import annotations
+from time import perf_counter
+from app.metrics.metrics import observe_request, inc_request_en_curso, dec_request_en_curso
+
+
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = perf_counter()
+        estado = {"status": 500, "bytes": 0, "registrado": False}
+
+        def _registrar():
+            if estado["registrado"]:
+                return
+            estado["registrado"] = True
+            dec_request_en_curso()
+            ruta = getattr(scope.get("route"), "path", None)
+            observe_request(scope.get("method"), ruta, estado["status"], perf_counter() - inicio, estado["bytes"])
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                estado["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                estado["bytes"] += len(message.get("body", b""))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                _registrar()
+
+        inc_request_en_curso()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # Sin cuerpo completo (excepción o desconexión) se registra al terminar la app.
+            _registrar()
@@ -31,7 +31,8 @@ class SeveridadAlerta(str, Enum):
 
 class BaseDomainModel(BaseModel):
     """Modelo base para todas las entidades de dominio.
-    version: soporte para control de concurrencia optimista.
+    version: soporte para control de concurrencia optimista. Los repositorios la incrementan
+    en cada update y la comparan en update(id, updater, expected_version=...).
     created_at / updated_at: timestamps para auditoría básica.
     """
     version: int = Field(default=1)
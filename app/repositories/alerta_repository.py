@@ -9,9 +9,11 @@ from .base_repository import BaseRepository
 from app.models.alerta import Alerta
 
 class AlertaRepository(BaseRepository[Alerta]):
+    indices = ("documento_paciente",)
+
     def __init__(self, base_dir: Path):
         super().__init__(base_dir, "alertas.json")
 
     def listar_por_paciente(self, documento_paciente: str) -> List[dict]:
-        return self.filter(lambda a: a.get("documento_paciente") == documento_paciente)
+        return self.find_by("documento_paciente", documento_paciente)
 
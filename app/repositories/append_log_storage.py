@@ -0,0 +1,190 @@
+"""Motor de almacenamiento append-only.
+Archivos por colección (ej. examenes_resultados):
+- examenes_resultados.json  -> snapshot (mismo formato que JsonFileStorage: lista de items)
+- examenes_resultados.jsonl -> log de mutaciones, una por línea:
+  {"op": "insert" | "update", "id": <id o codigo_cita>, "version": <version del item>, "item": {...}}
+Escribir cuesta O(tamaño del item): sólo se agrega una línea al log.
+La lectura reconstruye el estado con snapshot + replay del log; si el snapshot no cambió y el
+log sólo creció, se aplican únicamente las líneas nuevas sobre la entrada en memoria
+(EntradaCache.aplicar, bajo el lock de la entrada). Las lecturas no toman el lock de escritura.
+Cuando el log supera LOG_COMPACTION_BYTES un hilo en segundo plano lo pliega en un snapshot.
+El replay es idempotente (insert de una clave existente la reemplaza), por lo que una caída
+entre el reemplazo del snapshot y el vaciado del log no duplica registros.
+"""
+from __future__ import annotations
+from typing import List, Optional, Dict, Any, Iterable
+from pathlib import Path
+from time import perf_counter
+import json
+import os
+import threading
+from app.config import LOG_COMPACTION_BYTES, STORAGE_FSYNC
+from app.metrics.metrics import observe_parseo, observe_serializacion
+from app.repositories.storage import (
+    EntradaCache, Firma, Mutacion, JsonFileStorage, clave_de, firma_stat, fsync_archivo, fsync_directorio,
+    serializar_default,
+)
+
+_SIN_ARCHIVO = (0, 0, 0)
+
+
+class AppendLogStorage(JsonFileStorage):
+    """Snapshot JSON + log JSON-lines. Igual que JsonFileStorage, asume lock() tomado por el llamador."""
+
+    def __init__(self, file_path: Path):
+        super().__init__(file_path)
+        self.log_path = file_path.with_suffix(".jsonl")
+        self._compactando = threading.Lock()
+
+    def _firma_log(self) -> Firma:
+        try:
+            return firma_stat(os.stat(self.log_path))
+        except FileNotFoundError:
+            return _SIN_ARCHIVO
+
+    def firma(self) -> Optional[Firma]:
+        snapshot = super().firma()
+        log = self._firma_log()
+        if snapshot is None and log == _SIN_ARCHIVO:
+            return None
+        return (snapshot or _SIN_ARCHIVO) + log
+
+    def leer(self, previa: Optional[EntradaCache], campos: Iterable[str]) -> Optional[EntradaCache]:
+        # Sin lock: la compactación reemplaza primero el snapshot y después vacía el log. Si tras
+        # leer el log el snapshot sigue siendo el leído, ambos corresponden; si no, se reintenta.
+        while True:
+            firma = self.firma()
+            if firma is None:
+                return None
+            snapshot = firma[:3]
+            # Incremental: mismo snapshot y mismo archivo de log que sólo creció.
+            if (previa is not None and previa.firma is not None and previa.firma[:3] == snapshot
+                    and previa.firma[4] == firma[4] and previa.firma[5] <= firma[5]):
+                entrada, desde = previa, previa.firma[5]
+            else:
+                entrada = super().leer(None, campos) if snapshot != _SIN_ARCHIVO else None
+                snapshot = entrada.firma if entrada is not None else _SIN_ARCHIVO
+                if entrada is None:
+                    entrada = EntradaCache(None, [], campos)
+                desde = 0
+            log, registros, fin = self._leer_log(desde)
+            if (super().firma() or _SIN_ARCHIVO) != snapshot:
+                continue
+            if entrada is previa and log[1] != previa.firma[4]:
+                # El log se reemplazó entre la firma y la lectura: se relee completo.
+                previa = None
+                continue
+            entrada.aplicar(self._mutaciones(entrada, registros))
+            entrada.firma = snapshot + log[:2] + (desde + fin,)
+            return entrada
+
+    def _leer_log(self, desde: int):
+        """Lee y parsea las líneas completas del log a partir del offset `desde`.
+        Retorna (firma del log, registros, bytes consumidos).
+        """
+        try:
+            with open(self.log_path, "rb") as f:
+                log = firma_stat(os.fstat(f.fileno()))
+                f.seek(desde)
+                datos = f.read()
+        except FileNotFoundError:
+            log, datos = _SIN_ARCHIVO, b""
+        # Sólo se consumen líneas completas: una escritura a medias se reintenta en la próxima lectura.
+        fin = datos.rfind(b"\n") + 1
+        inicio = perf_counter()
+        registros = [json.loads(linea) for linea in datos[:fin].splitlines() if linea.strip()]
+        observe_parseo(self.coleccion, perf_counter() - inicio, fin)
+        return log, registros, fin
+
+    def _mutaciones(self, entrada: EntradaCache, registros: List[Dict[str, Any]]) -> List[Mutacion]:
+        """Resuelve cada registro del log a una mutación posicional sobre la entrada (replay
+        idempotente: un insert de una clave existente la reemplaza).
+        """
+        mutaciones: List[Mutacion] = []
+        nuevas: Dict[Any, int] = {}
+        siguiente = len(entrada.items)
+        for registro in registros:
+            clave, item = registro["id"], registro["item"]
+            pos = nuevas.get(clave) if clave is not None else None
+            if pos is None:
+                pos = self._posicion(entrada, clave)
+            if pos is None:
+                if clave is not None:
+                    nuevas[clave] = siguiente
+                siguiente += 1
+                mutaciones.append(("insert", None, item))
+            else:
+                mutaciones.append(("update", pos, item))
+        return mutaciones
+
+    @staticmethod
+    def _posicion(entrada: EntradaCache, clave: Any) -> Optional[int]:
+        # Índices de la entrada (se mantienen en agregar/reemplazar): el replay incremental no
+        # recorre la colección completa para ubicar cada clave.
+        if clave is None:
+            return None
+        for campo in ("id", "codigo_cita"):
+            posiciones = entrada.indice(campo).get(clave)
+            if posiciones:
+                return posiciones[-1]
+        return None
+
+    def registrar(self, entrada: EntradaCache, mutaciones: List[Mutacion]) -> Firma:
+        inicio = perf_counter()
+        lineas = "".join(
+            json.dumps({"op": op, "id": clave_de(item), "version": item.get("version"), "item": item},
+                       default=serializar_default) + "\n"
+            for op, _, item in mutaciones
+        ).encode("utf-8")
+        observe_serializacion(self.coleccion, perf_counter() - inicio, len(lineas))
+        nuevo = not self.log_path.exists()
+        with open(self.log_path, "ab") as f:
+            f.write(lineas)
+            f.flush()
+            if STORAGE_FSYNC:
+                os.fsync(f.fileno())
+            log = firma_stat(os.fstat(f.fileno()))
+        if STORAGE_FSYNC and nuevo:
+            fsync_directorio(self.log_path)
+        if log[2] >= LOG_COMPACTION_BYTES:
+            self._programar_compactacion()
+        return (super().firma() or _SIN_ARCHIVO) + log
+
+    def escribir_todo(self, items: List[Dict[str, Any]]) -> Firma:
+        # Reescritura completa = snapshot nuevo + log vacío.
+        snapshot = super().escribir_todo(items)
+        return snapshot + self._vaciar_log()
+
+    def _vaciar_log(self) -> Firma:
+        # Con STORAGE_FSYNC el log vacío es durable como el snapshot: tras una caída no queda
+        # un log anterior que no corresponda al snapshot nuevo.
+        tmp_path = str(self.log_path) + ".tmp"
+        with open(tmp_path, "w") as f:
+            if STORAGE_FSYNC:
+                os.fsync(f.fileno())
+            log = firma_stat(os.fstat(f.fileno()))
+        os.replace(tmp_path, self.log_path)
+        if STORAGE_FSYNC:
+            fsync_directorio(self.log_path)
+        return log
+
+    def sincronizar(self) -> None:
+        fsync_archivo(self.log_path)
+        super().sincronizar()
+
+    def _programar_compactacion(self) -> None:
+        if self._compactando.locked():
+            return
+        threading.Thread(target=self.compactar, name=f"compactar-{self.file_path.stem}", daemon=True).start()
+
+    def compactar(self) -> None:
+        """Pliega el log en un snapshot nuevo. Toma el lock de la colección por su cuenta."""
+        if not self._compactando.acquire(blocking=False):
+            return
+        try:
+            with self.lock():
+                entrada = self.leer(None, ())
+                if entrada is not None:
+                    self.escribir_todo(entrada.items)
+        finally:
+            self._compactando.release()
@@ -1,7 +1,10 @@
 """Repositorio base.
-Define operaciones genéricas para cargar/guardar colecciones JSON (lista de entidades).
-Cada colección se almacena en un archivo. Las entidades deben tener 'id' único.
-Optimista: si se pasa expected_version se valida contra version del objeto.
+Operaciones genéricas sobre una colección de entidades (dicts con clave primaria única)
+persistida por un motor de storage.py (JSON, log append-only o SQLite, según app.config).
+Cada proceso cachea los items parseados con sus índices (igualdad y ordenados), validados por
+la firma del motor; las lecturas no toman el lock y devuelven copias profundas. Las mutaciones
+se calculan y persisten bajo el lock de la colección (con group commit opcional), verifican
+claves únicas y versionan cada item para la concurrencia optimista (expected_version).
 """
 
 # Al crear una solicitud de examen:
@@ -13,69 +16,332 @@ Optimista: si se pasa expected_version se valida contra version del objeto.
 # Se valida que la solicitud esté en estado autorizado (o procesando), luego se crea un ExamenResultado que se inserta mediante ExamenResultadoRepository.insert(...) en examenes_resultados.json.
 # Paralelamente se hace un update sobre la solicitud para marcar su estado como resultado y guardar fecha_resultado. No se reescribe datos redundantes (se conserva trazabilidad por solicitud_id y codigo_cita).
 from __future__ import annotations
-from typing import TypeVar, Generic, List, Optional, Callable, Dict, Any
+from typing import TypeVar, Generic, List, Optional, Callable, Dict, Any, Tuple
 from pathlib import Path
-import json
-from filelock import FileLock
-import os
+from bisect import bisect_left, bisect_right
+from copy import deepcopy
 from datetime import datetime
+import math
+import json
+import threading
+from app.config import GROUP_COMMIT_MS
+from app.metrics.metrics import inc_repo_cache_hit, inc_repo_cache_miss
+from app.repositories.group_commit import grupo_commit
+from app.repositories.storage import EntradaCache, Mutacion, crear_storage, serializar_default
+from app.utils.identificadores import nuevo_ulid
+from app.utils.single_flight import SingleFlight
 
 T = TypeVar("T")
+R = TypeVar("R")
+
+# Caché por proceso compartida por todas las instancias que apunten al mismo archivo.
+_CACHE: Dict[str, EntradaCache] = {}
+_CACHE_LOCK = threading.Lock()
+_LECTURAS = SingleFlight()
+
+
+class ClaveDuplicada(ValueError):
+    """Un insert/update repetiría el valor de la clave primaria o de una clave única."""
+
+
+class ConflictoVersion(Exception):
+    """La versión del item cambió desde que el llamador lo leyó (control optimista)."""
+
+    def __init__(self, id: str, esperada: int, actual: int):
+        super().__init__(f"Conflicto de versión en '{id}': esperada {esperada}, actual {actual}")
+        self.id = id
+        self.esperada = esperada
+        self.actual = actual
+
+
+def reintentar_en_conflicto(operacion: Callable[[], R], intentos: int = 3) -> R:
+    """Ejecuta operacion (que relee y actualiza con expected_version) reintentando ante ConflictoVersion.
+    Tras agotar los intentos propaga el último conflicto.
+    """
+    for intento in range(intentos):
+        try:
+            return operacion()
+        except ConflictoVersion:
+            if intento == intentos - 1:
+                raise
+
+
+def version_de(item: Dict[str, Any]) -> int:
+    # Items previos al control de versiones se consideran versión 1.
+    return item.get("version") or 1
+
+
+def limpiar_cache() -> None:
+    """Vacía la caché de colecciones del proceso (útil en tests)."""
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
 
 class BaseRepository(Generic[T]):
+    # Campos con índice secundario declarado por cada repositorio concreto.
+    indices: Tuple[str, ...] = ()
+    # Clave primaria y claves únicas adicionales (índice valor -> posición, unicidad verificada al escribir).
+    clave_primaria: str = "id"
+    claves_unicas: Tuple[str, ...] = ()
+
     def __init__(self, base_dir: Path, filename: str):
         self.file_path = base_dir / filename
         self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self._storage_actual = None
+
+    @property
+    def coleccion(self) -> str:
+        # Nombre usado como etiqueta de métricas (p.ej. examenes_resultados).
+        return self.file_path.stem
+
+    @property
+    def _campos_indexados(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys((self.clave_primaria,) + self.claves_unicas + self.indices))
+
+    @property
+    def _storage(self):
+        # file_path puede reasignarse tras construir el repositorio (tests / base_dir explícito).
+        if self._storage_actual is None or self._storage_actual.file_path != self.file_path:
+            self._storage_actual = crear_storage(self.file_path)
+        return self._storage_actual
+
+    def _entrada(self, bloqueado: bool = False) -> EntradaCache:
+        """Entrada vigente de la colección; sólo lee el almacenamiento si su firma cambió.
+        bloqueado=True indica que el llamador ya tiene el lock de la colección.
+        """
+        clave = str(self.file_path)
+        storage = self._storage
+        firma = storage.firma()
+        if firma is None:
+            return EntradaCache(None, [], self._campos_indexados)
+        previa = _CACHE.get(clave)
+        if previa is not None and previa.firma == firma:
+            inc_repo_cache_hit(self.coleccion)
+            return previa
+        inc_repo_cache_miss(self.coleccion)
+        if bloqueado:
+            entrada = storage.leer(previa, self._campos_indexados)
+        else:
+            # Single-flight: lectores concurrentes de la misma versión comparten un solo parseo.
+            entrada = _LECTURAS.hacer(self.coleccion, (clave, firma), lambda: self._leer(storage, previa))
+        if entrada is None:
+            return EntradaCache(None, [], self._campos_indexados)
+        with _CACHE_LOCK:
+            _CACHE[clave] = entrada
+        return entrada
+
+    def _leer(self, storage, previa: Optional[EntradaCache]) -> Optional[EntradaCache]:
+        with storage.lock_lectura():
+            return storage.leer(previa, self._campos_indexados)
+
+    def _items(self) -> List[Dict[str, Any]]:
+        """Retorna la lista cacheada (sin copiar). Uso interno: no mutar el resultado."""
+        return self._entrada().items
 
     def _load_all(self) -> List[Dict[str, Any]]:
-        if not self.file_path.exists():
-            return []
-        lock_path = str(self.file_path) + ".lock"
-        with FileLock(lock_path):
-            try:
-                with open(self.file_path, "r") as f:
-                    return json.load(f)
-            except Exception:
-                return []
+        # Copia superficial: los llamadores pueden modificar los dicts sin afectar la caché.
+        return [deepcopy(itm) for itm in self._items()]
+
+    def _normalizar(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        # Deja el item tal como quedará en disco (datetimes/enums -> str) para que la caché
+        # devuelva lo mismo que una lectura desde archivo.
+        return json.loads(json.dumps(item, default=serializar_default))
+
+    def _nuevo(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        nuevo = self._normalizar(item)
+        nuevo.setdefault("version", 1)
+        return nuevo
+
+    def _versionar(self, anterior: Dict[str, Any], nuevo: Dict[str, Any]) -> Dict[str, Any]:
+        # Equivalente a BaseDomainModel.bump_version sobre el dict persistido.
+        nuevo = self._normalizar(nuevo)
+        nuevo["version"] = version_de(anterior) + 1
+        if "updated_at" in nuevo:
+            nuevo["updated_at"] = datetime.utcnow().isoformat()
+        return nuevo
+
+    def _mutar(self, calcular: Callable[[EntradaCache], List[Mutacion]]) -> List[Mutacion]:
+        """Calcula mutaciones sobre la entrada fresca y las persiste, todo bajo el lock de la colección.
+        La entrada en caché se actualiza de forma incremental (items + índices) sin releer el archivo.
+        Con GROUP_COMMIT_MS > 0 se delega en el group commit de la colección (group_commit.py).
+        """
+        if GROUP_COMMIT_MS > 0:
+            return grupo_commit(str(self.file_path)).enviar(self, calcular, GROUP_COMMIT_MS / 1000)
+        with self._storage.lock():
+            entrada = self._entrada(bloqueado=True)
+            mutaciones = calcular(entrada)
+            if mutaciones:
+                self._verificar_claves(entrada, mutaciones)
+                self._persistir(entrada, mutaciones)
+        return mutaciones
+
+    def _verificar_claves(self, entrada: EntradaCache, mutaciones: List[Mutacion]) -> None:
+        """Lanza ClaveDuplicada si las mutaciones repiten la clave primaria o una clave única."""
+        for campo in (self.clave_primaria,) + self.claves_unicas:
+            indice = entrada.indice(campo)
+            nuevos: Dict[Any, Optional[int]] = {}
+            for op, pos, item in mutaciones:
+                valor = item.get(campo)
+                if valor is None:
+                    continue
+                existentes = [p for p in indice.get(valor, ()) if p != pos]
+                # Repetido dentro del lote: sólo se admite si es otra actualización de la misma posición.
+                repetido = valor in nuevos and (pos is None or nuevos[valor] != pos)
+                if existentes or repetido:
+                    raise ClaveDuplicada(f"Ya existe un registro con {campo}={valor} en {self.coleccion}")
+                nuevos[valor] = pos
+
+    def _persistir(self, entrada: EntradaCache, mutaciones: List[Mutacion]) -> None:
+        """Persiste mutaciones ya calculadas y las aplica a la caché. Requiere el lock de la colección."""
+        firma = self._storage.registrar(entrada, mutaciones)
+        with _CACHE_LOCK:
+            entrada.aplicar(mutaciones)
+            entrada.firma = firma
+            _CACHE[str(self.file_path)] = entrada
+
+    def _mutaciones_por_clave(self, entrada: EntradaCache, registros: List[Tuple[str, str, Dict[str, Any]]]) -> List[Mutacion]:
+        """Convierte registros (op, clave, item) en mutaciones posicionales de forma idempotente:
+        un insert cuya clave ya existe reemplaza al item (usado al rehacer un journal).
+        """
+        mutaciones: List[Mutacion] = []
+        nuevas: Dict[str, int] = {}
+        for _, clave, item in registros:
+            if clave in nuevas:
+                mutaciones[nuevas[clave]] = ("insert", None, item)
+                continue
+            pos = self._posicion(entrada, clave)
+            if pos is None:
+                nuevas[clave] = len(mutaciones)
+                mutaciones.append(("insert", None, item))
+            else:
+                mutaciones.append(("update", pos, item))
+        return mutaciones
+
+    def _consulta_directa(self, campo: str, valor: Any) -> Optional[List[Dict[str, Any]]]:
+        """Consulta por columna indexada del motor (SQLite) si la colección no está cacheada.
+        Retorna None cuando la consulta debe resolverse en memoria.
+        """
+        storage = self._storage
+        if campo not in getattr(storage, "columnas_indexadas", ()):
+            return None
+        previa = _CACHE.get(str(self.file_path))
+        if previa is not None and previa.firma == storage.firma():
+            return None
+        return storage.buscar(campo, valor)
+
+    def _posicion(self, entrada: EntradaCache, id: str) -> Optional[int]:
+        # O(1) por índice: clave primaria y, como alternativa, codigo_cita.
+        if id is None:
+            return None
+        for campo in (self.clave_primaria, "codigo_cita"):
+            posiciones = entrada.indice(campo).get(id)
+            if posiciones:
+                return posiciones[0]
+        return None
 
-    def _save_all(self, items: List[Dict[str, Any]]) -> None:
-        lock_path = str(self.file_path) + ".lock"
-        tmp_path = str(self.file_path) + ".tmp"
-        def _default(o):
-            if isinstance(o, datetime):
-                return o.isoformat()
-            raise TypeError(f"Tipo no serializable: {type(o)}")
-        with FileLock(lock_path):
-            with open(tmp_path, "w") as f:
-                json.dump(items, f, indent=4, default=_default)
-            os.replace(tmp_path, self.file_path)
+    def nuevo_id(self, intentos: int = 5) -> str:
+        """Id ordenable por tiempo que no está en uso en la clave primaria de la colección."""
+        entrada = self._entrada()
+        for _ in range(intentos):
+            candidato = nuevo_ulid()
+            if self._posicion(entrada, candidato) is None:
+                return candidato
+        raise RuntimeError(f"No se pudo generar un id libre para {self.coleccion}")
 
     def list(self) -> List[Dict[str, Any]]:
         return self._load_all()
 
     def get(self, id: str) -> Optional[Dict[str, Any]]:
-        for item in self._load_all():
-            if item.get("id") == id or item.get("codigo_cita") == id:
-                return item
-        return None
+        directa = self._consulta_directa("id", id)
+        if directa is not None:
+            encontrados = directa or self._consulta_directa("codigo_cita", id)
+            return encontrados[0] if encontrados else None
+        entrada = self._entrada()
+        pos = self._posicion(entrada, id)
+        return deepcopy(entrada.items[pos]) if pos is not None else None
+
+    def find_by(self, campo: str, valor: Any) -> List[Dict[str, Any]]:
+        """Retorna los items cuyo campo es igual a valor usando el índice del campo."""
+        directa = self._consulta_directa(campo, valor)
+        if directa is not None:
+            return directa
+        entrada = self._entrada()
+        return [deepcopy(entrada.items[pos]) for pos in entrada.indice(campo).get(valor, ())]
+
+    def range_by(self, campo: str, valor: Any, orden: str, desde: Any = None, hasta: Any = None) -> List[Dict[str, Any]]:
+        """Items con campo == valor ordenados por `orden` y acotados a [desde, hasta].
+        Los límites se ubican con búsqueda binaria sobre el índice ordenado: O(log n + resultados).
+        """
+        entrada = self._entrada()
+        lista = entrada.ordenado(campo, orden).get(valor, [])
+        inicio = 0 if desde is None else bisect_left(lista, (desde,))
+        fin = len(lista) if hasta is None else bisect_right(lista, (hasta, math.inf))
+        return [deepcopy(entrada.items[pos]) for _, pos in lista[inicio:fin]]
+
+    def get_by(self, campo: str, valor: Any) -> Optional[Dict[str, Any]]:
+        """Búsqueda puntual por clave única (p.ej. solicitud_id)."""
+        encontrados = self.find_by(campo, valor)
+        return encontrados[0] if encontrados else None
+
+    def validar_claves(self) -> List[str]:
+        """Carga la colección desde su archivo, construye los índices de clave y retorna los
+        valores duplicados encontrados (lista vacía si la colección es consistente).
+        """
+        entrada = self._entrada()
+        problemas = []
+        for campo in (self.clave_primaria,) + self.claves_unicas:
+            for valor, posiciones in entrada.indice(campo).items():
+                if valor is not None and len(posiciones) > 1:
+                    problemas.append(f"{self.coleccion}: {campo}={valor} repetido en {len(posiciones)} registros")
+        return problemas
 
     def insert(self, item: Dict[str, Any]) -> None:
-        items = self._load_all()
-        items.append(item)
-        self._save_all(items)
-
-    def update(self, id: str, updater: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        items = self._load_all()
-        updated = None
-        for i, itm in enumerate(items):
-            if itm.get("id") == id or itm.get("codigo_cita") == id:
-                new_item = updater(dict(itm))
-                items[i] = new_item
-                updated = new_item
-                break
-        if updated:
-            self._save_all(items)
-        return updated
+        item = self._nuevo(item)
+        self._mutar(lambda entrada: [("insert", None, item)])
+
+    def insert_many(self, items: List[Dict[str, Any]]) -> None:
+        """Inserta varios items con una sola lectura y una sola escritura (todos o ninguno)."""
+        normalizados = [self._nuevo(item) for item in items]
+        self._mutar(lambda entrada: [("insert", None, item) for item in normalizados])
+
+    def update_many(self, updaters: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Aplica un updater por id en una sola escritura. Los ids inexistentes se omiten.
+        Si algún updater lanza excepción no se persiste ningún cambio.
+        """
+        def _calcular(entrada: EntradaCache) -> List[Mutacion]:
+            mutaciones = []
+            for id, updater in updaters.items():
+                pos = self._posicion(entrada, id)
+                if pos is not None:
+                    anterior = entrada.items[pos]
+                    mutaciones.append(("update", pos, self._versionar(anterior, updater(deepcopy(anterior)))))
+            return mutaciones
+        return [deepcopy(item) for _, _, item in self._mutar(_calcular)]
+
+    def update(self, id: str, updater: Callable[[Dict[str, Any]], Dict[str, Any]],
+               expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Actualiza el item id con updater e incrementa su versión.
+        Con expected_version funciona como compare-and-swap: si la versión vigente difiere se lanza
+        ConflictoVersion. La verificación se hace primero sobre la lectura sin lock (falla rápido)
+        y se repite bajo el lock antes de escribir.
+        """
+        if expected_version is not None:
+            actual = self.get(id)
+            if actual is None:
+                return None
+            if version_de(actual) != expected_version:
+                raise ConflictoVersion(id, expected_version, version_de(actual))
+
+        def _calcular(entrada: EntradaCache) -> List[Mutacion]:
+            pos = self._posicion(entrada, id)
+            if pos is None:
+                return []
+            anterior = entrada.items[pos]
+            if expected_version is not None and version_de(anterior) != expected_version:
+                raise ConflictoVersion(id, expected_version, version_de(anterior))
+            return [("update", pos, self._versionar(anterior, updater(deepcopy(anterior))))]
+        mutaciones = self._mutar(_calcular)
+        return deepcopy(mutaciones[0][2]) if mutaciones else None
 
     def filter(self, predicate: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
-        return [itm for itm in self._load_all() if predicate(itm)]
+        return [deepcopy(itm) for itm in self._items() if predicate(itm)]
@@ -1,23 +1,152 @@
 """Repositorio de Citas.
-Archivo: citas.json almacena todas las citas (se puede fragmentar por paciente en futuro).
+Archivo: citas.json es la única fuente de verdad de las citas (reemplaza a citas/<paciente>.json
+y agendas/<medico>.json, que duplicaban cada cita y divergían al cerrarla).
+Por defecto usa el motor "log" (app/config.py): citas.json es el snapshot y cada reserva o
+cancelación agrega sólo la cita afectada a citas.jsonl.
+Cada cita se identifica por codigo_cita y lleva documento_paciente / documento_medico en el
+nivel superior: las vistas "citas del paciente" y "agenda del médico" son lecturas de índice.
+La agenda del médico se mantiene ordenada por fecha_epoch (calculado al agendar) y las consultas
+por rango de fechas son búsquedas binarias sin parsear fechas en la lectura.
+Cada cita ocupa el intervalo [fecha_epoch, fecha_fin_epoch). La duración puede variar entre citas
+(CITA_DURACION_MIN es configurable), pero ninguna supera duracion_maxima(): sólo las citas que
+empiezan en [inicio - duración máxima, fin) pueden cruzarse con [inicio, fin) y se revisan todas.
+Las citas eliminadas se conservan marcadas (eliminada=True) y se excluyen de las consultas.
 Relación con modelos: usa estructura directa del modelo Cita (dict).
 """
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Optional
+from bisect import bisect_left
+from copy import deepcopy
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
 from .base_repository import BaseRepository
+from .storage import EntradaCache
 from app.models.cita import Cita
+import app.config as config
+
+
+class HorarioOcupado(ValueError):
+    """El médico ya tiene una cita vigente que se solapa con el horario solicitado."""
+
+    def __init__(self, cita: dict):
+        self.cita = cita
+        super().__init__("El médico ya tiene una cita en ese horario.")
+
+
+def intervalo(cita: Dict[str, Any]) -> Tuple[float, float]:
+    """[inicio, fin) en epoch; citas sin fecha_fin_epoch ocupan la duración configurada."""
+    inicio = cita["fecha_epoch"]
+    return inicio, cita.get("fecha_fin_epoch") or inicio + config.CITA_DURACION_MIN * 60
+
+
+def duracion_maxima() -> float:
+    """Duración máxima (segundos) que puede tener una cita guardada."""
+    return max(config.CITA_DURACION_MAX_MIN, config.CITA_DURACION_MIN) * 60
+
 
 class CitaRepository(BaseRepository[Cita]):
+    indices = ("documento_paciente", "documento_medico")
+    # Las citas no tienen id: se identifican por codigo_cita
+    clave_primaria = "codigo_cita"
+
     def __init__(self, base_dir: Path):
         super().__init__(base_dir, "citas.json")
 
     def listar_citas_paciente(self, documento_paciente: str) -> List[dict]:
-        return self.filter(lambda c: c.get("documento_paciente") == documento_paciente)
+        return [c for c in self.find_by("documento_paciente", documento_paciente) if not c.get("eliminada")]
 
     def listar_citas_medico(self, documento_medico: str) -> List[dict]:
-        return self.filter(lambda c: c.get("documento_medico") == documento_medico)
+        return [c for c in self.find_by("documento_medico", documento_medico) if not c.get("eliminada")]
+
+    def listar_agenda_medico(self, documento_medico: str, desde: Optional[float] = None,
+                             hasta: Optional[float] = None) -> List[dict]:
+        """Citas del médico ordenadas por fecha_epoch, acotadas a [desde, hasta] (epoch)."""
+        citas = self.range_by("documento_medico", documento_medico, "fecha_epoch", desde, hasta)
+        return [c for c in citas if not c.get("eliminada")]
+
+    def listar_citas_sin_fecha(self, documento_medico: str) -> List[dict]:
+        """Citas vigentes del médico sin fecha_epoch (legacy o fecha no interpretable): no están en la agenda ordenada."""
+        return [c for c in self.listar_citas_medico(documento_medico) if c.get("fecha_epoch") is None]
+
+    def intervalos_ocupados(self, documento_medico: str, desde: float, hasta: float) -> List[Tuple[float, float]]:
+        """Intervalos [inicio, fin) de las citas vigentes del médico que se cruzan con [desde, hasta)."""
+        entrada = self._entrada()
+        lista = entrada.ordenado("documento_medico", "fecha_epoch").get(documento_medico, [])
+        # Las citas que empezaron antes de `desde` pueden seguir en curso (hasta la duración máxima).
+        i = bisect_left(lista, (desde - duracion_maxima(),))
+        ocupados = []
+        while i < len(lista) and lista[i][0] < hasta:
+            cita = entrada.items[lista[i][1]]
+            if not cita.get("eliminada"):
+                inicio, fin = intervalo(cita)
+                if fin > desde:
+                    ocupados.append((inicio, fin))
+            i += 1
+        return ocupados
+
+    def reservar(self, cita: dict) -> dict:
+        """Inserta la cita si el médico está libre en su intervalo; si no, lanza HorarioOcupado.
+        La verificación y la inserción ocurren bajo el lock de la colección.
+        """
+        inicio, fin = intervalo(cita)
+        if fin - inicio > duracion_maxima():
+            raise ValueError("La duración de la cita supera CITA_DURACION_MAX_MIN.")
+        nueva = self._nuevo(cita)
+
+        def _calcular(entrada: EntradaCache):
+            lista = entrada.ordenado("documento_medico", "fecha_epoch").get(cita["documento_medico"], [])
+            solapada = self._solapada(entrada, lista, inicio, fin)
+            if solapada is not None:
+                raise HorarioOcupado(solapada)
+            return [("insert", None, nueva)]
+        self._mutar(_calcular)
+        return deepcopy(nueva)
+
+    @staticmethod
+    def _solapada(entrada: EntradaCache, lista: List[Tuple[float, int]], inicio: float, fin: float) -> Optional[dict]:
+        # Cita no eliminada de la agenda que se cruza con [inicio, fin), o None. Sólo pueden
+        # cruzarse las que empiezan después de inicio - duración máxima y antes de fin.
+        i = bisect_left(lista, (fin,))
+        limite = inicio - duracion_maxima()
+        while i > 0 and lista[i - 1][0] > limite:
+            i -= 1
+            cita = entrada.items[lista[i][1]]
+            if not cita.get("eliminada") and intervalo(cita)[1] > inicio:
+                return cita
+        return None
 
     def obtener_por_codigo(self, codigo_cita: str) -> Optional[dict]:
-        return self.get(codigo_cita)
+        cita = self.get(codigo_cita)
+        return cita if cita and not cita.get("eliminada") else None
+
+    def eliminar(self, codigos: List[str]) -> List[dict]:
+        """Marca las citas vigentes como eliminadas con una sola escritura y las retorna; omite las
+        inexistentes o ya eliminadas. Con el motor log (por defecto) o sqlite sólo se escriben las
+        citas marcadas; con json se reescribe citas.json completo.
+        """
+        fecha = datetime.now().isoformat()
+
+        def _calcular(entrada: EntradaCache):
+            mutaciones = []
+            for codigo in dict.fromkeys(codigos):
+                pos = self._posicion(entrada, codigo)
+                if pos is None or entrada.items[pos].get("eliminada"):
+                    continue
+                anterior = entrada.items[pos]
+                marcada = {**anterior, "eliminada": True, "fecha_eliminacion": fecha}
+                mutaciones.append(("update", pos, self._versionar(anterior, marcada)))
+            return mutaciones
+        return [deepcopy(item) for _, _, item in self._mutar(_calcular)]
 
+    def importar(self, citas: List[dict]) -> int:
+        """Inserta con una sola escritura las citas cuyo codigo_cita aún no existe (migración idempotente)."""
+        def _calcular(entrada):
+            mutaciones, vistos = [], set()
+            for cita in citas:
+                codigo = cita.get("codigo_cita")
+                if codigo is None or codigo in vistos or self._posicion(entrada, codigo) is not None:
+                    continue
+                vistos.add(codigo)
+                mutaciones.append(("insert", None, self._nuevo(cita)))
+            return mutaciones
+        return len(self._mutar(_calcular))
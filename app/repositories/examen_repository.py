@@ -9,22 +9,28 @@ from .base_repository import BaseRepository
 from app.models.examen import ExamenSolicitud, ExamenResultado
 
 class ExamenSolicitudRepository(BaseRepository[ExamenSolicitud]):
+    indices = ("documento_paciente", "documento_medico")
+
     def __init__(self, base_dir: Path):
         super().__init__(base_dir, "examenes_solicitudes.json")
 
     def listar_por_paciente(self, documento_paciente: str) -> List[dict]:
-        return self.filter(lambda e: e.get("documento_paciente") == documento_paciente)
+        return self.find_by("documento_paciente", documento_paciente)
 
     def listar_por_medico(self, documento_medico: str) -> List[dict]:
-        return self.filter(lambda e: e.get("documento_medico") == documento_medico)
+        return self.find_by("documento_medico", documento_medico)
 
 class ExamenResultadoRepository(BaseRepository[ExamenResultado]):
+    indices = ("documento_paciente", "documento_medico")
+    # Un único resultado por solicitud
+    claves_unicas = ("solicitud_id",)
+
     def __init__(self, base_dir: Path):
         super().__init__(base_dir, "examenes_resultados.json")
 
     def listar_por_paciente(self, documento_paciente: str) -> List[dict]:
-        return self.filter(lambda e: e.get("documento_paciente") == documento_paciente)
+        return self.find_by("documento_paciente", documento_paciente)
 
     def listar_por_medico(self, documento_medico: str) -> List[dict]:
-        return self.filter(lambda e: e.get("documento_medico") == documento_medico)
+        return self.find_by("documento_medico", documento_medico)
 
@@ -0,0 +1,188 @@
+"""Group commit de escrituras por colección.
+Con GROUP_COMMIT_MS > 0, BaseRepository._mutar no escribe directamente: encola su función de
+cálculo y el primer hilo en llegar (líder) espera la ventana, toma el lock de la colección y
+aplica todas las mutaciones encoladas con una sola escritura del motor (una reescritura del
+JSON, un append al log o una transacción SQLite, con un único fsync si STORAGE_FSYNC está activo).
+- Cada llamador recibe su resultado (o su excepción) sólo cuando la escritura compartida terminó.
+- Los cálculos se ejecutan en orden de llegada sobre una vista superpuesta a la entrada (sin
+  copiarla): cada uno ve las mutaciones de los anteriores del mismo lote, que sólo se aplican a
+  la entrada viva tras la escritura. Si un cálculo falla sólo falla su llamador.
+- Mientras el líder escribe, las nuevas solicitudes forman el siguiente lote.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+from app.metrics.metrics import observe_repo_group_commit_lote
+from app.repositories.storage import EntradaCache, Mutacion
+
+
+class _Pendiente:
+    __slots__ = ("calcular", "listo", "resultado", "error")
+
+    def __init__(self, calcular: Callable[[EntradaCache], List[Mutacion]]):
+        self.calcular = calcular
+        self.listo = threading.Event()
+        self.resultado: List[Mutacion] = []
+        self.error: Optional[BaseException] = None
+
+
+class _Items:
+    """Lista de items de la vista: los cambios del lote por encima de los items de la entrada."""
+    __slots__ = ("_vista",)
+
+    def __init__(self, vista: "_Superpuesta"):
+        self._vista = vista
+
+    def __getitem__(self, pos: int) -> Dict[str, Any]:
+        cambio = self._vista._cambios.get(pos)
+        return cambio if cambio is not None else self._vista._base.items[pos]
+
+    def __len__(self) -> int:
+        return self._vista._total
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self[pos] for pos in range(len(self)))
+
+
+class _Consulta:
+    """Índice de la vista: resuelve get(valor) combinando el índice de la entrada con el lote."""
+    __slots__ = ("_resolver",)
+
+    def __init__(self, resolver: Callable[[Any], list]):
+        self._resolver = resolver
+
+    def get(self, valor: Any, defecto: Any = None) -> Any:
+        return self._resolver(valor) or defecto
+
+
+class _Superpuesta:
+    """Vista de trabajo del lote con la interfaz de lectura de EntradaCache (items, indice,
+    ordenado, aplicar). Las posiciones cambiadas o agregadas por el lote viven en _cambios; el
+    resto se lee de la entrada viva, que no se modifica hasta la escritura. Cada consulta cuesta
+    lo que la de la entrada más el tamaño del lote, nunca O(colección).
+    """
+
+    def __init__(self, base: EntradaCache):
+        self.firma = base.firma
+        self._base = base
+        self._cambios: Dict[int, Dict[str, Any]] = {}
+        self._total = len(base.items)
+        self._resueltos: Dict[Tuple, list] = {}
+        self.items = _Items(self)
+
+    def indice(self, campo: str) -> _Consulta:
+        def _resolver(valor):
+            clave = (campo, valor)
+            if clave not in self._resueltos:
+                base = self._base.indice(campo).get(valor, ())
+                if not self._cambios:
+                    return base
+                self._resueltos[clave] = sorted(
+                    [pos for pos in base if pos not in self._cambios]
+                    + [pos for pos, item in self._cambios.items() if item.get(campo) == valor]
+                )
+            return self._resueltos[clave]
+        return _Consulta(_resolver)
+
+    def ordenado(self, campo: str, orden: str) -> _Consulta:
+        def _resolver(valor):
+            clave = (campo, orden, valor)
+            if clave not in self._resueltos:
+                base = self._base.ordenado(campo, orden).get(valor, ())
+                if not self._cambios:
+                    return base
+                self._resueltos[clave] = sorted(
+                    [par for par in base if par[1] not in self._cambios]
+                    + [(item[orden], pos) for pos, item in self._cambios.items()
+                       if item.get(campo) == valor and item.get(orden) is not None]
+                )
+            return self._resueltos[clave]
+        return _Consulta(_resolver)
+
+    def aplicar(self, mutaciones: List[Mutacion]) -> None:
+        for op, pos, item in mutaciones:
+            if op == "insert":
+                pos = self._total
+                self._total += 1
+            self._cambios[pos] = item
+        self._resueltos.clear()
+
+
+class GrupoCommit:
+    """Cola de mutaciones pendientes de una colección."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cola: List[_Pendiente] = []
+        self._hay_lider = False
+
+    def enviar(self, repo, calcular: Callable[[EntradaCache], List[Mutacion]], ventana: float) -> List[Mutacion]:
+        pendiente = _Pendiente(calcular)
+        with self._lock:
+            self._cola.append(pendiente)
+            lider = not self._hay_lider
+            self._hay_lider = True
+        if lider:
+            time.sleep(ventana)
+            with self._lock:
+                lote, self._cola = self._cola, []
+                # El siguiente llamador lidera el próximo lote mientras éste se escribe.
+                self._hay_lider = False
+            _confirmar_lote(repo, lote)
+        pendiente.listo.wait()
+        if pendiente.error is not None:
+            raise pendiente.error
+        return pendiente.resultado
+
+
+def _confirmar_lote(repo, lote: List[_Pendiente]) -> None:
+    try:
+        with repo._storage.lock():
+            entrada = repo._entrada(bloqueado=True)
+            base = len(entrada.items)
+            trabajo = _Superpuesta(entrada)
+            mutaciones: List[Mutacion] = []
+            insertados: Dict[int, int] = {}  # posición en la copia -> índice en mutaciones
+            confirmados: List[_Pendiente] = []
+            for pendiente in lote:
+                try:
+                    propias = pendiente.calcular(trabajo)
+                    repo._verificar_claves(trabajo, propias)
+                except Exception as e:
+                    pendiente.error = e
+                    continue
+                for op, pos, item in propias:
+                    if op == "insert":
+                        insertados[base + len(insertados)] = len(mutaciones)
+                        mutaciones.append(("insert", None, item))
+                    elif pos in insertados:
+                        # Update sobre un item insertado en este mismo lote: se escribe ya actualizado.
+                        mutaciones[insertados[pos]] = ("insert", None, item)
+                    else:
+                        mutaciones.append(("update", pos, item))
+                trabajo.aplicar(propias)
+                pendiente.resultado = propias
+                confirmados.append(pendiente)
+            if mutaciones:
+                repo._persistir(entrada, mutaciones)
+            observe_repo_group_commit_lote(repo.coleccion, len(confirmados))
+    except BaseException as e:
+        for pendiente in lote:
+            if pendiente.error is None:
+                pendiente.error = e
+    finally:
+        for pendiente in lote:
+            pendiente.listo.set()
+
+
+_GRUPOS: Dict[str, GrupoCommit] = {}
+_GRUPOS_LOCK = threading.Lock()
+
+
+def grupo_commit(clave: str) -> GrupoCommit:
+    with _GRUPOS_LOCK:
+        grupo = _GRUPOS.get(clave)
+        if grupo is None:
+            grupo = _GRUPOS[clave] = GrupoCommit()
+        return grupo
@@ -0,0 +1,258 @@
+"""Motor de almacenamiento SQLite (modo WAL).
+Cada colección usa su propia base <coleccion>.sqlite3 junto al JSON original, con una tabla:
+  items(clave, id, codigo_cita, documento_paciente, documento_medico, estado, data)
+donde data es el item completo en JSON y el resto son columnas indexadas para consultas puntuales.
+- Escrituras: transacción BEGIN IMMEDIATE en una conexión compartida por proceso; los lectores
+  no esperan (WAL) y los workers uvicorn ya no compiten por un FileLock de archivo completo.
+- Firma para la caché de BaseRepository: contador en la tabla _meta incrementado en cada commit.
+  Cada fila guarda en `cambio` el contador del commit que la escribió: si otro worker escribió,
+  la caché se pone al día leyendo sólo las filas con cambio > su firma (no la tabla completa,
+  que además se haría dentro de BEGIN IMMEDIATE en el camino de escritura). Sólo una
+  reescritura completa (escribir_todo, registrada en _meta.reescritura) obliga a releer todo.
+- Lecturas: conexión por hilo (sqlite3 no admite uso concurrente de una misma conexión).
+Importación única desde el JSON existente:
+    python -m app.repositories.sqlite_storage ~/memoryApps/saludVital/examenes_resultados.json
+"""
+from __future__ import annotations
+from typing import List, Optional, Dict, Any, Iterable
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import sqlite3
+import sys
+import threading
+from time import perf_counter
+from app.config import STORAGE_FSYNC
+from app.metrics.metrics import observe_parseo, observe_serializacion
+from app.repositories.storage import EntradaCache, Firma, Mutacion, clave_de, serializar_default
+from app.utils.file_atomic import LockMedido
+
+COLUMNAS_INDEXADAS = ("id", "codigo_cita", "documento_paciente", "documento_medico", "estado")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    clave TEXT,
+    id TEXT,
+    codigo_cita TEXT,
+    documento_paciente TEXT,
+    documento_medico TEXT,
+    estado TEXT,
+    data TEXT NOT NULL,
+    cambio INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_items_clave ON items(clave);
+CREATE INDEX IF NOT EXISTS ix_items_id ON items(id);
+CREATE INDEX IF NOT EXISTS ix_items_codigo_cita ON items(codigo_cita);
+CREATE INDEX IF NOT EXISTS ix_items_documento_paciente ON items(documento_paciente);
+CREATE INDEX IF NOT EXISTS ix_items_documento_medico ON items(documento_medico);
+CREATE INDEX IF NOT EXISTS ix_items_estado ON items(estado);
+CREATE TABLE IF NOT EXISTS _meta (version INTEGER NOT NULL, reescritura INTEGER NOT NULL DEFAULT 0);
+INSERT INTO _meta (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM _meta);
+"""
+# Bases creadas antes de las lecturas incrementales: se agregan las columnas faltantes.
+_COLUMNAS_AGREGADAS = (
+    ("items", "cambio", "INTEGER NOT NULL DEFAULT 0"),
+    ("_meta", "reescritura", "INTEGER NOT NULL DEFAULT 0"),
+)
+_INSERTAR = ("INSERT INTO items (clave, id, codigo_cita, documento_paciente, documento_medico, estado, data, cambio) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+class _Conexiones:
+    """Conexión de escritura compartida + conexiones de lectura por hilo para una base."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.escritura = self._conectar()
+        self.escritura.execute("PRAGMA journal_mode=WAL")
+        self.escritura.executescript(_ESQUEMA)
+        for tabla, columna, tipo in _COLUMNAS_AGREGADAS:
+            existentes = {fila[1] for fila in self.escritura.execute(f"PRAGMA table_info({tabla})")}
+            if columna not in existentes:
+                self.escritura.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+        self.escritura.execute("CREATE INDEX IF NOT EXISTS ix_items_cambio ON items(cambio)")
+        self.rlock = threading.RLock()
+        self.profundidad = 0
+        self._locales = threading.local()
+
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        # WAL + NORMAL: durable hasta el último checkpoint; FULL hace fsync del WAL en cada commit.
+        conn.execute("PRAGMA synchronous=FULL" if STORAGE_FSYNC else "PRAGMA synchronous=NORMAL")
+        return conn
+
+    def lectura(self) -> sqlite3.Connection:
+        conn = getattr(self._locales, "conn", None)
+        if conn is None:
+            conn = self._locales.conn = self._conectar()
+        return conn
+
+
+_CONEXIONES: Dict[str, _Conexiones] = {}
+_CONEXIONES_LOCK = threading.Lock()
+
+
+def _conexiones(db_path: Path) -> _Conexiones:
+    with _CONEXIONES_LOCK:
+        conexiones = _CONEXIONES.get(str(db_path))
+        if conexiones is None:
+            conexiones = _CONEXIONES[str(db_path)] = _Conexiones(db_path)
+        return conexiones
+
+
+def _fila(item: Dict[str, Any]) -> tuple:
+    columnas = tuple(None if item.get(c) is None else str(item.get(c)) for c in COLUMNAS_INDEXADAS)
+    return (clave_de(item),) + columnas + (json.dumps(item, default=serializar_default),)
+
+
+class SQLiteStorage:
+    """Motor SQLite con la misma interfaz que JsonFileStorage (lock/firma/leer/registrar/escribir_todo)."""
+
+    columnas_indexadas = COLUMNAS_INDEXADAS
+
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self.coleccion = file_path.stem
+        self.db_path = file_path.with_suffix(".sqlite3")
+        self._conexiones = _conexiones(self.db_path)
+
+    def lock(self) -> LockMedido:
+        return LockMedido(self._transaccion(), self.coleccion)
+
+    @contextmanager
+    def _transaccion(self):
+        """Transacción de escritura (BEGIN IMMEDIATE); reentrante dentro del mismo hilo."""
+        c = self._conexiones
+        with c.rlock:
+            externa = c.profundidad == 0
+            if externa:
+                c.escritura.execute("BEGIN IMMEDIATE")
+            c.profundidad += 1
+            try:
+                yield
+            except BaseException:
+                if externa:
+                    c.escritura.execute("ROLLBACK")
+                raise
+            else:
+                if externa:
+                    c.escritura.execute("COMMIT")
+            finally:
+                c.profundidad -= 1
+
+    def sincronizar(self) -> None:
+        """Hace durables los commits ya confirmados: el checkpoint sincroniza WAL y base."""
+        c = self._conexiones
+        with c.rlock:
+            c.escritura.execute("PRAGMA wal_checkpoint(FULL)")
+
+    @contextmanager
+    def lock_lectura(self):
+        # WAL: los lectores ven el último commit sin bloquear a los escritores.
+        yield
+
+    def firma(self) -> Optional[Firma]:
+        return (self._conexiones.lectura().execute("SELECT version FROM _meta").fetchone()[0],)
+
+    def leer(self, previa: Optional[EntradaCache], campos: Iterable[str]) -> Optional[EntradaCache]:
+        conn = self._conexiones.lectura()
+        # Transacción de lectura: versión e items provienen del mismo snapshot.
+        conn.execute("BEGIN")
+        try:
+            version, reescritura = conn.execute("SELECT version, reescritura FROM _meta").fetchone()
+            incremental = (previa is not None and previa.firma is not None
+                           and reescritura <= previa.firma[0] <= version)
+            if incremental:
+                filas = conn.execute(
+                    "SELECT rowid, data FROM items WHERE cambio > ? ORDER BY rowid", (previa.firma[0],)
+                ).fetchall()
+            else:
+                filas = conn.execute("SELECT rowid, data FROM items ORDER BY rowid").fetchall()
+        finally:
+            conn.execute("COMMIT")
+        inicio = perf_counter()
+        items = [json.loads(data) for (_, data) in filas]
+        observe_parseo(self.coleccion, perf_counter() - inicio, sum(len(data) for (_, data) in filas))
+        if incremental and self._aplicar_cambios(previa, filas, items):
+            previa.firma = (version,)
+            return previa
+        if incremental:
+            return self.leer(None, campos)
+        return EntradaCache((version,), items, campos)
+
+    @staticmethod
+    def _aplicar_cambios(entrada: EntradaCache, filas: List[tuple], items: List[Dict[str, Any]]) -> bool:
+        # Fuera de escribir_todo no se borran filas: rowid - 1 es la posición del item en la colección.
+        # Se valida antes de aplicar: una fila fuera de secuencia obliga a releer la tabla completa.
+        total = len(entrada.items)
+        for rowid, _ in filas:
+            if rowid - 1 > total:
+                return False
+            total += rowid - 1 == total
+        for (rowid, _), item in zip(filas, items):
+            if rowid - 1 < len(entrada.items):
+                entrada.reemplazar(rowid - 1, item)
+            else:
+                entrada.agregar(item)
+        return True
+
+    def buscar(self, campo: str, valor: Any) -> List[Dict[str, Any]]:
+        """Consulta puntual por una columna indexada, sin cargar la colección completa."""
+        if campo not in COLUMNAS_INDEXADAS:
+            raise ValueError(f"Columna no indexada: {campo}")
+        filas = self._conexiones.lectura().execute(
+            f"SELECT data FROM items WHERE {campo} = ? ORDER BY rowid", (str(valor),)
+        )
+        return [json.loads(data) for (data,) in filas]
+
+    def _siguiente_version(self) -> int:
+        return self._conexiones.escritura.execute("SELECT version FROM _meta").fetchone()[0] + 1
+
+    def registrar(self, entrada: EntradaCache, mutaciones: List[Mutacion]) -> Firma:
+        conn = self._conexiones.escritura
+        version = self._siguiente_version()
+        inicio = perf_counter()
+        filas = [_fila(item) for _, _, item in mutaciones]
+        observe_serializacion(self.coleccion, perf_counter() - inicio, sum(len(f[-1]) for f in filas))
+        for (op, pos, _), fila in zip(mutaciones, filas):
+            if op == "update":
+                anterior = clave_de(entrada.items[pos])
+                cursor = conn.execute(
+                    "UPDATE items SET clave=?, id=?, codigo_cita=?, documento_paciente=?, documento_medico=?, "
+                    "estado=?, data=?, cambio=? WHERE rowid = (SELECT rowid FROM items WHERE clave = ? ORDER BY rowid LIMIT 1)",
+                    fila + (version, anterior),
+                )
+                if cursor.rowcount:
+                    continue
+            conn.execute(_INSERTAR, fila + (version,))
+        conn.execute("UPDATE _meta SET version = ?", (version,))
+        return (version,)
+
+    def escribir_todo(self, items: List[Dict[str, Any]]) -> Firma:
+        conn = self._conexiones.escritura
+        version = self._siguiente_version()
+        inicio = perf_counter()
+        filas = [_fila(i) + (version,) for i in items]
+        observe_serializacion(self.coleccion, perf_counter() - inicio, sum(len(f[-2]) for f in filas))
+        conn.execute("DELETE FROM items")
+        conn.executemany(_INSERTAR, filas)
+        conn.execute("UPDATE _meta SET version = ?, reescritura = ?", (version, version))
+        return (version,)
+
+
+def importar_json(json_path: Path) -> int:
+    """Importa (una vez) la colección JSON existente a <coleccion>.sqlite3. Retorna items importados.
+    Reemplaza el contenido previo de la base, por lo que puede re-ejecutarse sin duplicar.
+    """
+    json_path = Path(json_path)
+    with open(json_path, "r") as f:
+        items = json.load(f)
+    storage = SQLiteStorage(json_path)
+    with storage.lock():
+        storage.escribir_todo(items)
+    return len(items)
+
+
+if __name__ == "__main__":
+    for ruta in sys.argv[1:]:
+        print(f"{ruta}: {importar_json(Path(ruta).expanduser())} items importados")
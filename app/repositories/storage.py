@@ -0,0 +1,246 @@
+"""Motores de almacenamiento de los repositorios.
+BaseRepository mantiene la colección en memoria (EntradaCache con items e índices) y
+delega en un motor cómo se lee y persiste esa colección:
+- JsonFileStorage: un archivo JSON con la lista completa, reescrito de forma atómica.
+- AppendLogStorage (append_log_storage.py): snapshot + log de mutaciones JSON-lines.
+- SQLiteStorage (sqlite_storage.py): base SQLite en modo WAL con columnas indexadas.
+El motor de cada colección se elige en app.config (STORAGE_ENGINE / STORAGE_ENGINES).
+Los motores registran espera/retención del lock, parseo, serialización y bytes por colección
+(vitalapp_storage_*), con la misma etiqueta que BaseRepository.coleccion.
+"""
+from __future__ import annotations
+from typing import List, Optional, Dict, Any, Tuple, Iterable
+from pathlib import Path
+from bisect import bisect_left, insort
+from contextlib import nullcontext
+from datetime import datetime
+import os
+import threading
+from filelock import FileLock
+from app.config import STORAGE_FSYNC, motor_almacenamiento
+from app.utils.file_atomic import LockMedido, parsear_json, serializar_json
+
+Firma = Tuple[int, ...]
+Indice = Dict[Any, List[int]]
+# valor del campo de grupo -> [(valor del campo de orden, posición)] ordenado
+IndiceOrdenado = Dict[Any, List[Tuple[Any, int]]]
+# (operación, posición en la colección o None si es insert, item resultante)
+Mutacion = Tuple[str, Optional[int], Dict[str, Any]]
+
+
+def firma_stat(st: os.stat_result) -> Firma:
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+def fsync_directorio(path: Path) -> None:
+    """Hace durable un os.replace / creación de archivo dentro de path.parent."""
+    fd = os.open(str(path.parent), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_archivo(path: Path) -> None:
+    """Fuerza a disco el contenido ya escrito en path (no falla si el archivo no existe)."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def clave_de(item: Dict[str, Any]) -> Any:
+    """Clave con la que los motores y el journal identifican un item (id, o codigo_cita en citas)."""
+    return item.get("id") or item.get("codigo_cita")
+
+
+def serializar_default(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(o)}")
+
+
+class EntradaCache:
+    """Items parseados de una colección, la firma de la que provienen y sus índices.
+    Los índices perezosos se construyen bajo el lock de la entrada, el mismo que toman agregar y
+    reemplazar: una mutación concurrente nunca cae entre el recorrido de los items y la
+    publicación del índice (quedaría fuera de él para siempre). Las consultas no toman el lock.
+    """
+    __slots__ = ("firma", "items", "indices", "ordenados", "_lock")
+
+    def __init__(self, firma: Optional[Firma], items: List[Dict[str, Any]], campos: Iterable[str] = ()):
+        self.firma = firma
+        self.items = items
+        self.indices: Dict[str, Indice] = {}
+        self.ordenados: Dict[Tuple[str, str], IndiceOrdenado] = {}
+        self._lock = threading.RLock()
+        for campo in campos:
+            self.indice(campo)
+
+    def indice(self, campo: str) -> Indice:
+        """Índice valor -> posiciones del campo; se construye en la primera consulta."""
+        idx = self.indices.get(campo)
+        if idx is None:
+            with self._lock:
+                idx = self.indices.get(campo)
+                if idx is None:
+                    idx = {}
+                    for pos, itm in enumerate(self.items):
+                        idx.setdefault(itm.get(campo), []).append(pos)
+                    self.indices[campo] = idx
+        return idx
+
+    def ordenado(self, campo: str, orden: str) -> IndiceOrdenado:
+        """Índice campo -> [(orden, posición)] ordenado por `orden` (p.ej. agenda por fecha_epoch).
+        Los items sin valor de orden no se incluyen. Se construye en la primera consulta.
+        """
+        idx = self.ordenados.get((campo, orden))
+        if idx is None:
+            with self._lock:
+                idx = self.ordenados.get((campo, orden))
+                if idx is None:
+                    idx = {}
+                    for pos, itm in enumerate(self.items):
+                        if itm.get(orden) is not None:
+                            idx.setdefault(itm.get(campo), []).append((itm[orden], pos))
+                    for lista in idx.values():
+                        lista.sort()
+                    self.ordenados[(campo, orden)] = idx
+        return idx
+
+    def agregar(self, item: Dict[str, Any]) -> None:
+        # El item se agrega a la lista antes que a los índices: un lector concurrente
+        # nunca encuentra una posición inexistente.
+        with self._lock:
+            self._agregar(item)
+
+    def _agregar(self, item: Dict[str, Any]) -> None:
+        pos = len(self.items)
+        self.items.append(item)
+        for campo, idx in list(self.indices.items()):
+            idx.setdefault(item.get(campo), []).append(pos)
+        for (campo, orden), idx in list(self.ordenados.items()):
+            if item.get(orden) is not None:
+                insort(idx.setdefault(item.get(campo), []), (item[orden], pos))
+
+    def reemplazar(self, pos: int, item: Dict[str, Any]) -> None:
+        with self._lock:
+            self._reemplazar(pos, item)
+
+    def _reemplazar(self, pos: int, item: Dict[str, Any]) -> None:
+        anterior = self.items[pos]
+        self.items[pos] = item
+        for campo, idx in list(self.indices.items()):
+            viejo, nuevo = anterior.get(campo), item.get(campo)
+            if viejo == nuevo:
+                continue
+            posiciones = idx.get(viejo, [])
+            if pos in posiciones:
+                posiciones.remove(pos)
+                if not posiciones:
+                    idx.pop(viejo, None)
+            insort(idx.setdefault(nuevo, []), pos)
+        for (campo, orden), idx in list(self.ordenados.items()):
+            viejo, nuevo = (anterior.get(campo), anterior.get(orden)), (item.get(campo), item.get(orden))
+            if viejo == nuevo:
+                continue
+            if viejo[1] is not None:
+                lista = idx.get(viejo[0], [])
+                i = bisect_left(lista, (viejo[1], pos))
+                if i < len(lista) and lista[i] == (viejo[1], pos):
+                    del lista[i]
+            if nuevo[1] is not None:
+                insort(idx.setdefault(nuevo[0], []), (nuevo[1], pos))
+
+    def aplicar(self, mutaciones: Iterable[Mutacion]) -> None:
+        with self._lock:
+            for op, pos, item in mutaciones:
+                if op == "insert":
+                    self._agregar(item)
+                else:
+                    self._reemplazar(pos, item)
+
+
+class JsonFileStorage:
+    """Colección completa en un archivo JSON; cada mutación reescribe el archivo (tmp + os.replace).
+    Los métodos de lectura/escritura asumen que el llamador ya tiene tomado lock().
+    """
+
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self.coleccion = file_path.stem
+
+    def lock(self) -> LockMedido:
+        return LockMedido(FileLock(str(self.file_path) + ".lock"), self.coleccion)
+
+    def lock_lectura(self):
+        # Sin lock: escribir_todo reemplaza el archivo con os.replace, por lo que un lector
+        # abre la versión anterior o la nueva completa; leer() toma la firma del mismo descriptor.
+        return nullcontext()
+
+    def firma(self) -> Optional[Firma]:
+        try:
+            return firma_stat(os.stat(self.file_path))
+        except FileNotFoundError:
+            return None
+
+    def leer(self, previa: Optional[EntradaCache], campos: Iterable[str]) -> Optional[EntradaCache]:
+        # La firma se toma del mismo descriptor que se parsea: contenido y firma siempre coinciden.
+        try:
+            with open(self.file_path, "rb") as f:
+                firma = firma_stat(os.fstat(f.fileno()))
+                contenido = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            items = parsear_json(contenido, self.coleccion)
+        except Exception:
+            items = []
+        return EntradaCache(firma, items, campos)
+
+    def escribir_todo(self, items: List[Dict[str, Any]]) -> Firma:
+        """Reemplaza el archivo de forma atómica y retorna la firma del archivo escrito."""
+        contenido = serializar_json(items, self.coleccion, indent=4, default=serializar_default)
+        tmp_path = str(self.file_path) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(contenido)
+            f.flush()
+            if STORAGE_FSYNC:
+                os.fsync(f.fileno())
+            firma = firma_stat(os.fstat(f.fileno()))
+        os.replace(tmp_path, self.file_path)
+        if STORAGE_FSYNC:
+            fsync_directorio(self.file_path)
+        return firma
+
+    def sincronizar(self) -> None:
+        """Hace durable lo ya escrito (archivo y directorio) aunque STORAGE_FSYNC esté apagado."""
+        fsync_archivo(self.file_path)
+        fsync_directorio(self.file_path)
+
+    def registrar(self, entrada: EntradaCache, mutaciones: List[Mutacion]) -> Firma:
+        items = list(entrada.items)
+        for op, pos, item in mutaciones:
+            if op == "insert":
+                items.append(item)
+            else:
+                items[pos] = item
+        return self.escribir_todo(items)
+
+
+def crear_storage(file_path: Path):
+    """Instancia el motor configurado para la colección del archivo."""
+    motor = motor_almacenamiento(file_path.stem)
+    if motor == "log":
+        from app.repositories.append_log_storage import AppendLogStorage
+        return AppendLogStorage(file_path)
+    if motor == "sqlite":
+        from app.repositories.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(file_path)
+    if motor != "json":
+        raise ValueError(f"Motor de almacenamiento desconocido: {motor}")
+    return JsonFileStorage(file_path)
@@ -0,0 +1,184 @@
+"""Unidad de trabajo sobre varios repositorios.
+Uso:
+    with UnidadDeTrabajo(solicitud_repo, resultado_repo) as uow:
+        solicitud = uow.get(solicitud_repo, solicitud_id)
+        uow.insert(resultado_repo, resultado)
+        uow.update(solicitud_repo, solicitud_id, transicion)
+- Al entrar toma los locks de todas las colecciones (orden fijo por ruta: sin deadlocks) y
+  carga cada colección una sola vez.
+- Los cambios se acumulan en memoria; get() ve los cambios ya preparados.
+- Al salir sin excepción: se escribe un journal (redo log) con todas las mutaciones y se
+  persiste una escritura por colección. El journal se elimina recién cuando, liberados los
+  locks (SQLite confirma su transacción al soltarlo), cada colección escrita se sincronizó a
+  disco (storage.sincronizar), con independencia de STORAGE_FSYNC. Si el proceso cae antes,
+  recuperar_journals() (al iniciar la app) rehace el journal; rehacer es idempotente y no pisa
+  items que ya tengan una versión posterior a la del journal.
+  La creación y el borrado del journal se sincronizan también en el directorio (fsync).
+- Si hay excepción no se persiste nada.
+"""
+from __future__ import annotations
+from contextlib import ExitStack
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+import json
+import os
+from app.repositories.base_repository import BaseRepository, ConflictoVersion, version_de
+from app.repositories.storage import EntradaCache, clave_de, fsync_directorio, serializar_default
+
+Registro = Tuple[str, str, Dict[str, Any]]
+
+
+class UnidadDeTrabajo:
+    def __init__(self, *repos: BaseRepository):
+        # Un repositorio por archivo; el orden por ruta es el orden de adquisición de locks.
+        por_ruta = {str(r.file_path): r for r in repos}
+        self._repos: List[BaseRepository] = [por_ruta[k] for k in sorted(por_ruta)]
+        self._entradas: Dict[str, EntradaCache] = {}
+        self._registros: Dict[str, List[Registro]] = {}
+        self._preparados: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        self._locks = ExitStack()
+
+    def __enter__(self) -> "UnidadDeTrabajo":
+        try:
+            for repo in self._repos:
+                self._locks.enter_context(repo._storage.lock())
+                clave = str(repo.file_path)
+                self._entradas[clave] = repo._entrada(bloqueado=True)
+                self._registros[clave] = []
+                self._preparados[clave] = {}
+        except BaseException:
+            self._locks.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        journal = None
+        try:
+            if exc_type is None:
+                journal = self._confirmar()
+        finally:
+            self._locks.close()
+        if journal is not None:
+            for repo in self._repos:
+                if self._registros[str(repo.file_path)]:
+                    repo._storage.sincronizar()
+            _eliminar_journal(journal)
+
+    # ------------------ Operaciones ------------------
+
+    def get(self, repo: BaseRepository, id: str) -> Optional[Dict[str, Any]]:
+        clave = str(repo.file_path)
+        for item in self._preparados[clave].values():
+            if item.get("id") == id or item.get("codigo_cita") == id:
+                return deepcopy(item)
+        entrada = self._entradas[clave]
+        pos = repo._posicion(entrada, id)
+        return deepcopy(entrada.items[pos]) if pos is not None else None
+
+    def insert(self, repo: BaseRepository, item: Dict[str, Any]) -> None:
+        item = repo._nuevo(item)
+        clave = str(repo.file_path)
+        entrada = self._entradas[clave]
+        # Las claves se verifican contra lo persistido y contra lo ya preparado en esta unidad.
+        preparadas = [("update" if pos is not None else "insert", pos, previo)
+                      for previo in self._preparados[clave].values()
+                      for pos in (repo._posicion(entrada, clave_de(previo)),)]
+        repo._verificar_claves(entrada, preparadas + [("insert", None, item)])
+        self._preparar(repo, "insert", item)
+
+    def update(self, repo: BaseRepository, id: str, updater: Callable[[Dict[str, Any]], Dict[str, Any]],
+               expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        actual = self.get(repo, id)
+        if actual is None:
+            return None
+        if expected_version is not None and version_de(actual) != expected_version:
+            raise ConflictoVersion(id, expected_version, version_de(actual))
+        nuevo = repo._versionar(actual, updater(deepcopy(actual)))
+        self._preparar(repo, "update", nuevo)
+        return deepcopy(nuevo)
+
+    def _preparar(self, repo: BaseRepository, op: str, item: Dict[str, Any]) -> None:
+        clave = str(repo.file_path)
+        self._registros[clave].append((op, clave_de(item), item))
+        self._preparados[clave][clave_de(item)] = item
+
+    # ------------------ Confirmación ------------------
+
+    def _confirmar(self) -> Optional[Path]:
+        """Escribe el journal y las colecciones; retorna el journal a eliminar una vez durable."""
+        pendientes = {str(r.file_path): self._registros[str(r.file_path)] for r in self._repos if self._registros[str(r.file_path)]}
+        if not pendientes:
+            return None
+        journal = _escribir_journal(Path(next(iter(pendientes))).parent, pendientes)
+        self._rehacer(pendientes)
+        return journal
+
+    def _vigentes(self, colecciones: Dict[str, List[Registro]]) -> Dict[str, List[Registro]]:
+        """Descarta registros del journal cuyo item ya tiene una versión posterior persistida:
+        el journal pudo quedar tras soltar los locks y otro proceso volver a escribir el item.
+        """
+        vigentes: Dict[str, List[Registro]] = {}
+        for repo in self._repos:
+            clave = str(repo.file_path)
+            entrada = self._entradas[clave]
+            registros = []
+            for registro in colecciones.get(clave, []):
+                pos = repo._posicion(entrada, registro[1])
+                if pos is None or version_de(entrada.items[pos]) <= version_de(registro[2]):
+                    registros.append(registro)
+            vigentes[clave] = registros
+        return vigentes
+
+    def _rehacer(self, colecciones: Dict[str, List[Registro]]) -> None:
+        # Una escritura por colección; las mutaciones se resuelven por clave (idempotente).
+        for repo in self._repos:
+            registros = colecciones.get(str(repo.file_path))
+            if registros:
+                entrada = self._entradas[str(repo.file_path)]
+                repo._persistir(entrada, repo._mutaciones_por_clave(entrada, registros))
+
+
+def _escribir_journal(directorio: Path, colecciones: Dict[str, List[Registro]]) -> Path:
+    journal = directorio / f"uow-{uuid4().hex}.journal"
+    tmp_path = str(journal) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(colecciones, f, default=serializar_default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, journal)
+    fsync_directorio(journal)
+    return journal
+
+
+def _eliminar_journal(journal: Path) -> None:
+    try:
+        os.remove(journal)
+    except FileNotFoundError:
+        # Otro proceso que rehacía el mismo journal ya lo eliminó.
+        return
+    fsync_directorio(journal)
+
+
+def recuperar_journals(directorio: Path) -> int:
+    """Rehace los journals que quedaron de una unidad de trabajo interrumpida. Retorna cuántos aplicó."""
+    aplicados = 0
+    for journal in sorted(Path(directorio).glob("uow-*.journal")):
+        try:
+            with open(journal, "r") as f:
+                colecciones = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        repos = [BaseRepository(Path(ruta).parent, Path(ruta).name) for ruta in colecciones]
+        with UnidadDeTrabajo(*repos) as uow:
+            # Otro proceso pudo completarlo mientras se esperaban los locks.
+            rehecho = journal.exists()
+            if rehecho:
+                uow._rehacer(uow._vigentes(colecciones))
+        if rehecho:
+            for repo in repos:
+                repo._storage.sincronizar()
+            _eliminar_journal(journal)
+            aplicados += 1
+    return aplicados
@@ -1,21 +1,17 @@
 import os
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional
 from app.services.admin_service import AdminService
-from app.config import decodificar_token_acceso
 from app.security.roles import require_role, Role
+from app.utils.blocking import ejecutar_bloqueante
 
 router = APIRouter(prefix="/admin", tags=["administradores"])
 
 # Servicio para manejar las operaciones de administradores
 admin_service = AdminService()
 
-# Seguridad con token Bearer
-security = HTTPBearer()
-
 # Clave secreta para administradores (debería estar en variables de entorno)
 ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY", "admin")
 
@@ -37,33 +33,14 @@ class ActualizarEstadoExamen(BaseModel):
     estado: str
     observaciones: Optional[str] = None
 
-def verificar_token_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """
-    Verifica el token de acceso para administradores.
-    """
-    try:
-        payload = decodificar_token_acceso(credentials.credentials)
-        # Verificar que sea un token de administrador
-        if payload.get("tipo_usuario") != "admin":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Acceso denegado. Se requiere privilegios de administrador.",
-            )
-        return payload
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido o expirado",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
 @router.post("/login")
 async def login_admin(credenciales: AdminLogin):
     """
     Autentica a un administrador y devuelve un token de acceso.
     """
     try:
-        resultado = admin_service.login_admin(
+        resultado = await ejecutar_bloqueante(
+            admin_service.login_admin,
             credenciales.username,
             credenciales.password
         )
@@ -91,7 +68,7 @@ async def crear_resultado_examen(
     Crea un resultado de examen.
     """
     try:
-        admin_service.crear_resultado_examen(codigo_examen, datos_examen.dict())
+        await ejecutar_bloqueante(admin_service.crear_resultado_examen, codigo_examen, datos_examen.dict())
         return {"mensaje": "Resultado de examen creado exitosamente"}
     except Exception as e:
         raise HTTPException(
@@ -109,7 +86,7 @@ async def obtener_resultado_examen(
     Obtiene el resultado de un examen específico.
     """
     try:
-        examen = admin_service.obtener_resultado_examen(codigo_examen)
+        examen = await ejecutar_bloqueante(admin_service.obtener_resultado_examen, codigo_examen)
         if not examen:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -133,7 +110,8 @@ async def actualizar_estado_examen(
     Actualiza el estado de un examen.
     """
     try:
-        resultado = admin_service.actualizar_estado_examen(
+        resultado = await ejecutar_bloqueante(
+            admin_service.actualizar_estado_examen,
             codigo_examen,
             datos_actualizacion.estado,
             datos_actualizacion.observaciones
@@ -160,7 +138,7 @@ async def listar_examenes_paciente(
     Lista todos los exámenes de un paciente específico.
     """
     try:
-        examenes = admin_service.listar_examenes_paciente(documento_paciente)
+        examenes = await ejecutar_bloqueante(admin_service.listar_examenes_paciente, documento_paciente)
         return {"examenes": examenes}
     except Exception as e:
         raise HTTPException(
@@ -1,18 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from pydantic import BaseModel
+from datetime import datetime
 import os
 from app.services.citas_service import CitasService
-from app.config import decodificar_token_acceso, verificar_documento_paciente
+from app.repositories.cita_repository import HorarioOcupado
+from app.config import verificar_documento_paciente
+from app.security.roles import get_payload
+from app.utils.blocking import ejecutar_bloqueante
 
 router = APIRouter(prefix="/citas", tags=["citas"])
 
 # Servicio para manejar las citas
 citas_service = CitasService()
 
-# Seguridad con token Bearer
-security = HTTPBearer()
-
 # Modelo para la creación de citas
 class CrearCitaRequest(BaseModel):
     paciente: str
@@ -29,20 +29,6 @@ class EliminarCitaRequest(BaseModel):
     fecha: str
     documento: str
 
-def verificar_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """
-    Verifica el token de acceso y devuelve el payload si es válido.
-    """
-    try:
-        payload = decodificar_token_acceso(credentials.credentials)
-        return payload
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido o expirado",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
 def verificar_paciente_registrado(documento: str):
     """
     Verifica si el paciente está registrado.
@@ -57,7 +43,7 @@ def verificar_paciente_registrado(documento: str):
 @router.post("/")
 async def crear_cita(
     datos_cita: CrearCitaRequest,
-    payload: dict = Depends(verificar_token)
+    payload: dict = Depends(get_payload)
 ):
     """
     Crea una nueva cita para un paciente.
@@ -73,10 +59,11 @@ async def crear_cita(
         )
     
     # Verificar que el paciente esté registrado
-    verificar_paciente_registrado(datos_cita.documento)
+    await ejecutar_bloqueante(verificar_paciente_registrado, datos_cita.documento)
     
     try:
-        cita = citas_service.crear_cita_service(
+        cita = await ejecutar_bloqueante(
+            citas_service.crear_cita_service,
             datos_cita.paciente,
             datos_cita.medico,
             datos_cita.fecha,
@@ -85,6 +72,11 @@ async def crear_cita(
             datos_cita.motivoPaciente
         )
         return {"mensaje": "Cita creada exitosamente", "cita": cita}
+    except HorarioOcupado as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -99,7 +91,7 @@ async def crear_cita(
 @router.delete("/")
 async def eliminar_cita(
     datos_eliminacion: EliminarCitaRequest,
-    payload: dict = Depends(verificar_token)
+    payload: dict = Depends(get_payload)
 ):
     """
     Elimina una cita específica de un paciente.
@@ -115,10 +107,11 @@ async def eliminar_cita(
         )
     
     # Verificar que el paciente esté registrado
-    verificar_paciente_registrado(datos_eliminacion.documento)
+    await ejecutar_bloqueante(verificar_paciente_registrado, datos_eliminacion.documento)
     
     try:
-        resultado = citas_service.eliminar_cita_service(
+        resultado = await ejecutar_bloqueante(
+            citas_service.eliminar_cita_service,
             datos_eliminacion.paciente,
             datos_eliminacion.medico,
             datos_eliminacion.fecha,
@@ -137,10 +130,70 @@ async def eliminar_cita(
             detail=f"Error al eliminar la cita: {str(e)}"
         )
 
+@router.delete("/{codigo_cita}")
+async def cancelar_cita(
+    codigo_cita: str,
+    payload: dict = Depends(get_payload)
+):
+    """
+    Cancela una cita por su código.
+    
+    Requiere un token válido del paciente dueño de la cita. La cita se ubica por índice y
+    se marca como eliminada (no se reescriben las listas del paciente ni del médico).
+    """
+    try:
+        cita = await ejecutar_bloqueante(citas_service.cancelar_cita_service, codigo_cita, payload.get("documento"))
+    except PermissionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al cancelar la cita: {str(e)}"
+        )
+    if cita is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cita no encontrada"
+        )
+    return {"mensaje": "Cita cancelada exitosamente", "codigo_cita": codigo_cita}
+
+@router.get("/disponibilidad")
+async def obtener_horarios_libres(
+    documento_medico: str | None = None,
+    especialidad: str | None = None,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    n: int = Query(5, ge=1, le=100),
+    payload: dict = Depends(get_payload)
+):
+    """
+    Obtiene los próximos n horarios libres de un médico (documento_medico) o de una especialidad
+    entre desde y hasta (ISO 8601; por defecto ahora y los próximos 7 días).
+    Se calcula con la agenda ordenada de cada médico, sin recorrer las citas.
+    """
+    try:
+        horarios = await ejecutar_bloqueante(
+            citas_service.horarios_libres_service, documento_medico, especialidad, desde, hasta, n
+        )
+        return {"horarios": horarios}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener la disponibilidad: {str(e)}"
+        )
+
 @router.get("/{documento}")
 async def obtener_citas_paciente(
     documento: str,
-    payload: dict = Depends(verificar_token) # valida que solo los pacientes autenticados puedan acceder a sus citas
+    payload: dict = Depends(get_payload) # valida que solo los pacientes autenticados puedan acceder a sus citas
 ):
     """
     Obtiene todas las citas de un paciente.
@@ -156,10 +209,10 @@ async def obtener_citas_paciente(
         )
     
     # Verificar que el paciente esté registrado
-    verificar_paciente_registrado(documento)
+    await ejecutar_bloqueante(verificar_paciente_registrado, documento)
     
     try:
-        citas = citas_service.obtener_citas_paciente_service(documento)
+        citas = await ejecutar_bloqueante(citas_service.obtener_citas_paciente_service, documento)
         return {"citas": citas}
     except Exception as e:
         raise HTTPException(
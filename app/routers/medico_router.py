@@ -1,19 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 from app.services.medico_service import MedicoService
-from app.config import decodificar_token_acceso
 from app.security.roles import require_role, Role, get_payload
+from app.utils.blocking import ejecutar_bloqueante
 
 router = APIRouter(prefix="/medicos", tags=["medicos"])
 
 # Servicio para manejar las operaciones de médicos
 medico_service = MedicoService()
 
-# Seguridad con token Bearer
-security = HTTPBearer()
-
 class RegistroMedico(BaseModel):
     documento: str
     nombre_completo: str
@@ -44,7 +41,8 @@ async def registrar_medico(datos: RegistroMedico):
     Solo accesible por administradores en implementaciones futuras.
     """
     try:
-        medico_service.registrar_medico(
+        await ejecutar_bloqueante(
+            medico_service.registrar_medico,
             datos.documento,
             datos.nombre_completo,
             datos.contraseña,
@@ -70,7 +68,8 @@ async def login_medico(credenciales: LoginMedico):
     Autentica a un médico y devuelve un token de acceso.
     """
     try:
-        resultado = medico_service.login_medico(
+        resultado = await ejecutar_bloqueante(
+            medico_service.login_medico,
             credenciales.documento,
             credenciales.contraseña
         )
@@ -88,13 +87,19 @@ async def login_medico(credenciales: LoginMedico):
         )
 
 @router.get("/agenda")
-async def obtener_agenda(payload: dict = Depends(require_role(Role.medico))):
+async def obtener_agenda(
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    payload: dict = Depends(require_role(Role.medico))
+):
     """
-    Obtiene la agenda de un médico con sus citas futuras.
+    Obtiene la agenda de un médico ordenada por fecha.
+    Filtros opcionales (ISO 8601): desde (por defecto ahora) y hasta.
+    Sin desde, las citas sin fecha interpretable se agregan al final para revisión manual.
     """
     try:
         documento_medico = payload.get("documento")
-        agenda = medico_service.obtener_agenda_medico(documento_medico)
+        agenda = await ejecutar_bloqueante(medico_service.obtener_agenda_medico, documento_medico, desde, hasta)
         return {"agenda": agenda}
     except Exception as e:
         raise HTTPException(
@@ -114,7 +119,8 @@ async def cerrar_cita(
     try:
         documento_medico = payload.get("documento")
         diagnostico_dict = datos_cierre.diagnostico.dict() if datos_cierre.diagnostico else None
-        resultado = medico_service.cerrar_cita(
+        resultado = await ejecutar_bloqueante(
+            medico_service.cerrar_cita,
             documento_medico,
             datos_cierre.codigo_cita,
             datos_cierre.estado,
@@ -141,7 +147,7 @@ async def obtener_diagnostico(
     Obtiene el diagnóstico de una cita específica.
     """
     try:
-        diagnostico = medico_service.obtener_diagnostico(codigo_cita)
+        diagnostico = await ejecutar_bloqueante(medico_service.obtener_diagnostico, codigo_cita)
         if not diagnostico:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1,33 +1,14 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from app.services.paciente_service import PacienteService
-from app.config import decodificar_token_acceso
 from app.security.roles import require_role, Role
+from app.utils.blocking import ejecutar_bloqueante
 
 router = APIRouter(prefix="/pacientes", tags=["pacientes"])
 
 # Servicio para manejar las operaciones de pacientes
 paciente_service = PacienteService()
 
-# Seguridad con token Bearer
-security = HTTPBearer()
-
-def verificar_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """
-    Verifica el token de acceso y devuelve el payload si es válido.
-    """
-    try:
-        payload = decodificar_token_acceso(credentials.credentials)
-        return payload
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido o expirado",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-
 class RegistroPaciente(BaseModel):
     documento: str
     nombre_completo: str
@@ -49,7 +30,8 @@ async def registrar_paciente(datos: RegistroPaciente):
     Registra un nuevo paciente en el sistema.
     """
     try:
-        paciente_service.registrar_paciente(
+        await ejecutar_bloqueante(
+            paciente_service.registrar_paciente,
             datos.documento,
             datos.nombre_completo,
             datos.contraseña,
@@ -78,7 +60,7 @@ async def obtener_examenes_paciente(payload: dict = Depends(require_role(Role.pa
     """
     try:
         documento_paciente = payload.get("documento")
-        examenes = paciente_service.obtener_examenes_paciente(documento_paciente)
+        examenes = await ejecutar_bloqueante(paciente_service.obtener_examenes_paciente, documento_paciente)
         return {"examenes": examenes}
     except Exception as e:
         raise HTTPException(
@@ -97,7 +79,7 @@ async def obtener_resultado_examen(
     """
     try:
         documento_paciente = payload.get("documento")
-        examen = paciente_service.obtener_resultado_examen(codigo_examen)
+        examen = await ejecutar_bloqueante(paciente_service.obtener_resultado_examen, codigo_examen)
         if not examen:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -124,7 +106,8 @@ async def login_paciente(credenciales: LoginPaciente):
     Autentica a un paciente y devuelve un token de acceso.
     """
     try:
-        resultado = paciente_service.login_paciente(
+        resultado = await ejecutar_bloqueante(
+            paciente_service.login_paciente,
             credenciales.documento,
             credenciales.contraseña
         )
@@ -2,7 +2,8 @@
 Leyenda / Transferencia de conocimiento:
 - Este módulo abstrae la verificación de JWT y control de acceso por rol.
 - Admite una futura migración a scopes granulares (e.g. 'examen:create').
-- Las dependencias FastAPI aquí definidas se usan en los routers para evitar lógica duplicada.
+- Las dependencias FastAPI aquí definidas se usan en los routers para evitar lógica duplicada:
+  get_payload es la única verificación de JWT; usa la caché de tokens verificados (token_cache.py).
 - Para extender: agregar Enum de scopes y un validador adicional que lea un claim 'scopes'.
 Advertencia: No almacenar lógica de negocio aquí, solo autorizaciones.
 """
@@ -11,7 +12,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from enum import Enum
 from typing import Callable, List, Dict
-from app.config import decodificar_token_acceso
+from app.security.token_cache import verificar_token
 
 security = HTTPBearer()
 
@@ -24,8 +25,7 @@ class Role(str, Enum):
 
 def _decode_token(credentials: HTTPAuthorizationCredentials) -> Dict:
     try:
-        payload = decodificar_token_acceso(credentials.credentials)
-        return payload
+        return verificar_token(credentials.credentials)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
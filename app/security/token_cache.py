@@ -0,0 +1,50 @@
+"""Caché LRU de tokens JWT ya verificados.
+Cada solicitud protegida verificaba la firma HMAC y los claims del token. Un mismo cliente
+repite el mismo token durante toda su sesión, así que la verificación se reutiliza:
+- Clave: el token completo (firma incluida); un token alterado nunca coincide.
+- Vigencia: TOKEN_CACHE_TTL_S desde la verificación y nunca más allá del claim 'exp'.
+- Tamaño acotado (TOKEN_CACHE_SIZE): al llenarse se descarta el token usado hace más tiempo.
+- Sólo se guardan tokens válidos; un token inválido se verifica (y rechaza) cada vez.
+Métricas: vitalapp_token_cache_total{resultado} y vitalapp_token_verificacion_seconds.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from time import perf_counter, time
+from typing import Dict, Tuple
+import threading
+import app.config as config
+from app.metrics.metrics import inc_token_cache, observe_token_verificacion
+
+_lock = threading.Lock()
+_tokens: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()  # token -> (vence, payload)
+
+
+def verificar_token(token: str) -> Dict:
+    """Payload del token verificado; lanza la excepción de decodificar_token_acceso si es inválido."""
+    ahora = time()
+    with _lock:
+        entrada = _tokens.get(token)
+        if entrada is not None:
+            if entrada[0] > ahora:
+                _tokens.move_to_end(token)
+                inc_token_cache("hit")
+                return dict(entrada[1])
+            del _tokens[token]
+    inc_token_cache("miss")
+    inicio = perf_counter()
+    payload = config.decodificar_token_acceso(token)
+    observe_token_verificacion(perf_counter() - inicio)
+    vence = ahora + config.TOKEN_CACHE_TTL_S
+    if isinstance(payload.get("exp"), (int, float)):
+        vence = min(vence, payload["exp"])
+    with _lock:
+        _tokens[token] = (vence, payload)
+        _tokens.move_to_end(token)
+        while len(_tokens) > config.TOKEN_CACHE_SIZE:
+            _tokens.popitem(last=False)
+    return dict(payload)
+
+
+def limpiar_tokens() -> None:
+    with _lock:
+        _tokens.clear()
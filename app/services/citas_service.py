@@ -1,6 +1,10 @@
+import time
 from app.managers.cita_manager import CitaManager
 from app.metrics.metrics import inc_cita_agendada
 
+# Ventana por defecto de la búsqueda de horarios libres
+VENTANA_DISPONIBILIDAD_DIAS = 7
+
 class CitasService:
     def __init__(self):
         self.citaManagerInstance = CitaManager()
@@ -14,5 +18,43 @@ class CitasService:
     def eliminar_cita_service(self,paciente,medico,fecha,documento):
         return self.citaManagerInstance.eliminar_cita(paciente, medico, fecha, documento)
 
+    def cancelar_cita_service(self, codigo_cita, documento):
+        """
+        Cancela la cita si pertenece al paciente del token.
+        Retorna None si no existe; lanza PermissionError si es de otro paciente.
+        """
+        cita = self.citaManagerInstance.obtener_cita(codigo_cita)
+        if cita is None:
+            return None
+        if cita.get("documento_paciente") != documento:
+            raise PermissionError("No tienes permiso para cancelar esta cita")
+        return self.citaManagerInstance.cancelar_cita(codigo_cita)
+
     def  obtener_citas_paciente_service(self,documento):
-        return self.citaManagerInstance.obtener_citas_paciente(documento)
\ No newline at end of file
+        return self.citaManagerInstance.obtener_citas_paciente(documento)
+
+    def horarios_libres_service(self, documento_medico=None, especialidad=None, desde=None, hasta=None, n=5):
+        """
+        Próximos n horarios libres de un médico o de los médicos de una especialidad.
+        desde/hasta son datetime opcionales (por defecto: ahora y VENTANA_DISPONIBILIDAD_DIAS días).
+        """
+        medico_manager = self.citaManagerInstance.medico_manager
+        if documento_medico:
+            if not medico_manager.existe_medico(documento_medico):
+                raise ValueError("Médico no registrado")
+            documentos = [documento_medico]
+        elif especialidad:
+            documentos = medico_manager.buscar_documentos_por_especialidad(especialidad)
+        else:
+            raise ValueError("Debe indicar documento_medico o especialidad")
+        inicio = desde.timestamp() if desde else time.time()
+        fin = hasta.timestamp() if hasta else inicio + VENTANA_DISPONIBILIDAD_DIAS * 86400
+        horarios = self.citaManagerInstance.horarios_libres(documentos, inicio, fin, n)
+        nombres = {}
+        for horario in horarios:
+            documento = horario["documento_medico"]
+            if documento not in nombres:
+                datos = medico_manager.obtener_datos_medico(documento) or {}
+                nombres[documento] = datos.get("nombre_completo")
+            horario["nombre_medico"] = nombres[documento]
+        return horarios
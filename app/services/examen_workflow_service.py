@@ -8,11 +8,12 @@ Relaciones:
 - Interactúa potencialmente con AlertaService para generar alertas por resultado crítico
 """
 from __future__ import annotations
-from typing import Dict, Any
-from uuid import uuid4
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
 from app.config import BASE_DATA_DIR
 from app.repositories.examen_repository import ExamenSolicitudRepository, ExamenResultadoRepository
+from app.repositories.base_repository import reintentar_en_conflicto, version_de
+from app.repositories.unit_of_work import UnidadDeTrabajo
 from app.models.examen import ExamenSolicitud, ExamenResultado
 from app.models.base import EstadoExamen
 from app.metrics.metrics import inc_examen_solicitado
@@ -27,7 +28,7 @@ class ExamenWorkflowService:
 
     def crear_solicitud(self, codigo_cita: str, documento_paciente: str, documento_medico: str, tipo_examen: str) -> Dict[str, Any]:
         solicitud = ExamenSolicitud(
-            id=str(uuid4()),
+            id=self.solicitud_repo.nuevo_id(),
             codigo_cita=codigo_cita,
             documento_paciente=documento_paciente,
             documento_medico=documento_medico,
@@ -37,11 +38,42 @@ class ExamenWorkflowService:
         inc_examen_solicitado()
         return solicitud.model_dump()
 
-    def autorizar_solicitud(self, solicitud_id: str) -> Dict[str, Any]:
-        updated = self.solicitud_repo.update(solicitud_id, lambda s: self._transicion_autorizar(s))
-        if not updated:
-            raise ValueError("Solicitud no encontrada")
-        return updated
+    def crear_solicitudes(self, codigo_cita: str, documento_paciente: str, documento_medico: str, tipos_examen: List[str]) -> List[Dict[str, Any]]:
+        """Crea varias solicitudes de la misma cita con una sola escritura del repositorio."""
+        solicitudes = [
+            ExamenSolicitud(
+                id=self.solicitud_repo.nuevo_id(),
+                codigo_cita=codigo_cita,
+                documento_paciente=documento_paciente,
+                documento_medico=documento_medico,
+                tipo_examen=tipo_examen
+            ).model_dump()
+            for tipo_examen in tipos_examen
+        ]
+        if solicitudes:
+            self.solicitud_repo.insert_many(solicitudes)
+            for _ in solicitudes:
+                inc_examen_solicitado()
+        return solicitudes
+
+    def autorizar_solicitud(self, solicitud_id: str, version: Optional[int] = None) -> Dict[str, Any]:
+        """Autoriza la solicitud con compare-and-swap sobre su versión.
+        Si el llamador envía la versión que leyó, un conflicto se propaga (ConflictoVersion -> 409);
+        si no, se relee y se reintenta ante escrituras concurrentes.
+        """
+        def _autorizar(esperada: Optional[int]) -> Dict[str, Any]:
+            if esperada is None:
+                actual = self.solicitud_repo.get(solicitud_id)
+                if not actual:
+                    raise ValueError("Solicitud no encontrada")
+                esperada = version_de(actual)
+            updated = self.solicitud_repo.update(solicitud_id, self._transicion_autorizar, expected_version=esperada)
+            if not updated:
+                raise ValueError("Solicitud no encontrada")
+            return updated
+        if version is not None:
+            return _autorizar(version)
+        return reintentar_en_conflicto(lambda: _autorizar(None))
 
     def _transicion_autorizar(self, solicitud: Dict[str, Any]) -> Dict[str, Any]:
         if solicitud.get("estado") != EstadoExamen.solicitado:
@@ -51,23 +83,29 @@ class ExamenWorkflowService:
         return solicitud
 
     def registrar_resultado(self, solicitud_id: str, valores: Dict[str, float], interpretacion: str | None = None) -> Dict[str, Any]:
-        solicitud = self.solicitud_repo.get(solicitud_id)
-        if not solicitud:
-            raise ValueError("Solicitud no encontrada")
-        if solicitud.get("estado") not in [EstadoExamen.autorizado, EstadoExamen.procesando]:
-            raise ValueError("No se puede registrar resultado en el estado actual")
-        resultado = ExamenResultado(
-            id=str(uuid4()),
-            solicitud_id=solicitud_id,
-            codigo_cita=solicitud["codigo_cita"],
-            documento_paciente=solicitud["documento_paciente"],
-            documento_medico=solicitud["documento_medico"],
-            valores=valores,
-            interpretacion=interpretacion,
-            estado_riesgo=self._evaluar_riesgo(valores)
-        )
-        self.resultado_repo.insert(resultado.model_dump())
-        self.solicitud_repo.update(solicitud_id, lambda s: self._transicion_resultado(s))
+        # Leyenda: lectura de la solicitud, alta del resultado y transición de estado en una
+        # sola unidad de trabajo: cada colección se lee y se escribe una vez, y ambos cambios
+        # se confirman juntos (journal) aunque el proceso caiga entre las dos escrituras.
+        # El id se genera antes de tomar los locks (nuevo_id lee la colección).
+        resultado_id = self.resultado_repo.nuevo_id()
+        with UnidadDeTrabajo(self.solicitud_repo, self.resultado_repo) as uow:
+            solicitud = uow.get(self.solicitud_repo, solicitud_id)
+            if not solicitud:
+                raise ValueError("Solicitud no encontrada")
+            if solicitud.get("estado") not in [EstadoExamen.autorizado, EstadoExamen.procesando]:
+                raise ValueError("No se puede registrar resultado en el estado actual")
+            resultado = ExamenResultado(
+                id=resultado_id,
+                solicitud_id=solicitud_id,
+                codigo_cita=solicitud["codigo_cita"],
+                documento_paciente=solicitud["documento_paciente"],
+                documento_medico=solicitud["documento_medico"],
+                valores=valores,
+                interpretacion=interpretacion,
+                estado_riesgo=self._evaluar_riesgo(valores)
+            )
+            uow.insert(self.resultado_repo, resultado.model_dump())
+            uow.update(self.solicitud_repo, solicitud_id, lambda s: self._transicion_resultado(s))
         return resultado.model_dump()
 
     def _transicion_resultado(self, solicitud: Dict[str, Any]) -> Dict[str, Any]:
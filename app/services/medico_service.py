@@ -3,9 +3,10 @@ from app.config import crear_token_acceso
 from app.managers.cita_manager import CitaManager
 from app.managers.admin_manager import AdminManager
 from app.services.examen_workflow_service import ExamenWorkflowService
-from app.metrics.metrics import inc_medico_registrado, inc_medico_login, inc_examen_solicitado
+from app.metrics.metrics import inc_medico_registrado, inc_medico_login
 import os
-from datetime import datetime, timezone
+import time
+from datetime import datetime
 import secrets
 import string
 
@@ -42,21 +43,20 @@ class MedicoService:
         """
         Autentica a un médico y genera un token de acceso.
         """
-        if self.medico_manager.autenticar_medico(documento, contraseña):
-            # Obtener datos del médico sin la contraseña
-            datos_medico = self.medico_manager.obtener_datos_medico(documento)
-            if datos_medico:
-                # Crear token de acceso con los datos del médico
-                token = crear_token_acceso({
-                    "documento": documento,
-                    "nombre_completo": datos_medico["nombre_completo"],
-                    "tipo_usuario": "medico"
-                })
-                inc_medico_login()
-                return {
-                    "token": token,
-                    "medico": datos_medico
-                }
+        # Una sola carga del perfil: veredicto y datos sin la contraseña
+        autenticado, datos_medico = self.medico_manager.autenticar_y_obtener(documento, contraseña)
+        if autenticado:
+            # Crear token de acceso con los datos del médico
+            token = crear_token_acceso({
+                "documento": documento,
+                "nombre_completo": datos_medico["nombre_completo"],
+                "tipo_usuario": "medico"
+            })
+            inc_medico_login()
+            return {
+                "token": token,
+                "medico": datos_medico
+            }
         
         raise ValueError("Credenciales inválidas")
 
@@ -66,42 +66,22 @@ class MedicoService:
         """
         return self.medico_manager.existe_medico(documento)
 
-    def obtener_agenda_medico(self, documento: str) -> list:
+    def obtener_agenda_medico(self, documento: str, desde: datetime = None, hasta: datetime = None) -> list:
         """
-        Obtiene la agenda de un médico con sus citas futuras.
-        Leyenda (refactor): Se normaliza la fecha de cada cita para evitar el error
-        'can't compare offset-naive and offset-aware datetimes'. Se aceptan formatos:
-        - 2025-11-24T12:00:00 (naive)
-        - 2025-11-24T12:00:00Z (UTC)
-        - 2025-11-24T12:00:00+00:00 (offset)
-        Retorna solo citas con fecha >= ahora.
+        Obtiene la agenda de un médico ordenada por fecha.
+        Sin `desde` retorna las citas futuras (fecha >= ahora) y, al final, las citas sin fecha
+        interpretable para revisión manual; `hasta` acota el rango.
+        Leyenda (refactor): cada cita guarda fecha_epoch (UTC) calculado al agendarla, así la
+        lectura no parsea fechas ni mezcla naive/aware: el rango se ubica con búsqueda binaria
+        sobre la agenda ordenada. Fechas naive en desde/hasta se interpretan en hora local.
         """
-        agenda_completa = self.medico_manager.obtener_agenda_medico(documento)
-        ahora_local = datetime.now()  # para comparar con fechas naive
-        ahora_utc = datetime.now(timezone.utc)  # para comparar con fechas aware
-        futuras = []
-        for cita in agenda_completa:
-            raw = cita.get("fecha")
-            if not isinstance(raw, str):
-                futuras.append(cita)
-                continue
-            iso = raw.strip()
-            if iso.endswith("Z"):
-                iso = iso[:-1] + "+00:00"  # compatibilidad con fromisoformat
-            try:
-                fecha_cita = datetime.fromisoformat(iso)
-                if fecha_cita.tzinfo is None:
-                    # naive vs naive
-                    if fecha_cita >= ahora_local:
-                        futuras.append(cita)
-                else:
-                    # aware -> convertir a UTC y comparar
-                    if fecha_cita.astimezone(timezone.utc) >= ahora_utc:
-                        futuras.append(cita)
-            except Exception:
-                # Si hay un problema de parsing, incluir para revisión manual
-                futuras.append(cita)
-        return futuras
+        inicio = desde.timestamp() if desde else time.time()
+        fin = hasta.timestamp() if hasta else None
+        agenda = self.cita_manager.obtener_agenda_medico(documento, inicio, fin)
+        if desde is None:
+            # Las citas sin fecha_epoch no entran en la agenda ordenada: se agregan para revisión manual.
+            agenda += self.cita_manager.obtener_citas_sin_fecha(documento)
+        return agenda
 
     def cerrar_cita(self, documento_medico: str, codigo_cita: str, estado: str, 
                     diagnostico: dict = None) -> bool:
@@ -111,16 +91,9 @@ class MedicoService:
         """
         if estado not in ['realizada', 'cancelada', 'noAsistida']:
             raise ValueError("Estado de cita inválido")
-        agenda = self.medico_manager.obtener_agenda_medico(documento_medico)
-        cita_encontrada = None
-        for i, cita in enumerate(agenda):
-            if cita.get("codigo_cita") == codigo_cita:
-                cita_encontrada = cita
-                indice_cita = i
-                break
-        if not cita_encontrada:
+        cita_encontrada = self.cita_manager.obtener_cita(codigo_cita)
+        if not cita_encontrada or cita_encontrada.get("documento_medico") != documento_medico:
             raise ValueError("Cita no encontrada en la agenda del médico")
-        cita_encontrada["estado"] = estado
         if estado == "realizada" and diagnostico:
             datos_medico = self.medico_manager.obtener_datos_medico(documento_medico)
             diagnostico["medico"] = {
@@ -130,19 +103,17 @@ class MedicoService:
             }
             self.medico_manager.agregar_diagnostico(codigo_cita, diagnostico)
             self.medico_manager.marcar_cita_atendida(documento_medico, codigo_cita)
-            if "examenes_solicitados" in diagnostico:
-                for examen in diagnostico["examenes_solicitados"]:
-                    # Leyenda: En vez de crear resultado directo, generamos solicitud formal.
-                    created = self.examen_workflow.crear_solicitud(
-                        codigo_cita=codigo_cita,
-                        documento_paciente=cita_encontrada.get("documento"),
-                        documento_medico=documento_medico,
-                        tipo_examen=examen
-                    )
-                    if created:
-                        inc_examen_solicitado()
-        agenda[indice_cita] = cita_encontrada
-        self.medico_manager.actualizar_agenda_medico(documento_medico, agenda)
+            if diagnostico.get("examenes_solicitados"):
+                # Leyenda: En vez de crear resultado directo, generamos solicitudes formales
+                # en lote (una sola escritura de examenes_solicitudes.json para N exámenes).
+                self.examen_workflow.crear_solicitudes(
+                    codigo_cita=codigo_cita,
+                    documento_paciente=cita_encontrada.get("documento"),
+                    documento_medico=documento_medico,
+                    tipos_examen=diagnostico["examenes_solicitados"]
+                )
+        # Leyenda: el estado se actualiza en el almacén único (visible para paciente y médico).
+        self.cita_manager.actualizar_estado_cita(codigo_cita, estado)
         return True
 
     def _generar_codigo_examen(self, length=8):
@@ -47,22 +47,21 @@ class PacienteService:
         """
         Autentica a un paciente y genera un token de acceso.
         """
-        if self.paciente_manager.autenticar_paciente(documento, contraseña):
-            # Obtener datos del paciente sin la contraseña
-            datos_paciente = self.paciente_manager.obtener_datos_paciente(documento)
-            if datos_paciente:
-                # Crear token de acceso con los datos del paciente
-                token = crear_token_acceso({
-                    "documento": documento,
-                    "nombre_completo": datos_paciente["nombre_completo"],
-                    "tipo_usuario": "paciente"
-                })
-                
-                inc_paciente_login()
-                return {
-                    "token": token,
-                    "paciente": datos_paciente
-                }
+        # Una sola carga del perfil: veredicto y datos sin la contraseña
+        autenticado, datos_paciente = self.paciente_manager.autenticar_y_obtener(documento, contraseña)
+        if autenticado:
+            # Crear token de acceso con los datos del paciente
+            token = crear_token_acceso({
+                "documento": documento,
+                "nombre_completo": datos_paciente["nombre_completo"],
+                "tipo_usuario": "paciente"
+            })
+            
+            inc_paciente_login()
+            return {
+                "token": token,
+                "paciente": datos_paciente
+            }
         
         raise ValueError("Credenciales inválidas")
 
@@ -120,8 +119,6 @@ class PacienteService:
         ex_legacy = self.admin_manager.obtener_resultado_examen(codigo_examen)
         if ex_legacy:
             return ex_legacy
-        # Buscar en resultados workflow (lista completa)
-        for r in self.examen_workflow.resultado_repo.list():
-            if r.get("id") == codigo_examen or r.get("solicitud_id") == codigo_examen:
-                return r
-        return None
+        # Buscar en resultados workflow por clave primaria o por solicitud (índices, sin recorrer la lista)
+        resultados = self.examen_workflow.resultado_repo
+        return resultados.get_by("id", codigo_examen) or resultados.get_by("solicitud_id", codigo_examen)
@@ -0,0 +1,61 @@
+"""
+Ejecución de trabajo bloqueante fuera del event loop.
+Los managers, servicios y repositorios son síncronos (FileLock, open, json.load, os.replace).
+Los handlers async de los routers no deben llamarlos directamente: una escritura lenta en disco
+detendría todas las solicitudes en curso del worker. ejecutar_bloqueante envía la llamada a un
+pool de hilos acotado (IO_POOL_SIZE) y expone su saturación como métricas Prometheus.
+"""
+from __future__ import annotations
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, TypeVar
+from app.config import IO_POOL_SIZE
+from app.metrics.metrics import registrar_io_pool, observe_io_pool_espera
+
+R = TypeVar("R")
+
+_executor = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="vitalapp-io")
+_estado_lock = threading.Lock()
+_en_cola = 0
+_ocupados = 0
+
+registrar_io_pool(IO_POOL_SIZE, lambda: _ocupados, lambda: _en_cola)
+
+
+def _ejecutar(encolado: float, ctx: contextvars.Context, fn: Callable[..., R]) -> R:
+    global _en_cola, _ocupados
+    with _estado_lock:
+        _en_cola -= 1
+        _ocupados += 1
+    observe_io_pool_espera(perf_counter() - encolado)
+    try:
+        return ctx.run(fn)
+    finally:
+        with _estado_lock:
+            _ocupados -= 1
+
+
+def _descontar_si_cancelada(futuro: Future) -> None:
+    # Una tarea cancelada antes de empezar nunca pasa por _ejecutar: sale de la cola aquí.
+    global _en_cola
+    if futuro.cancelled():
+        with _estado_lock:
+            _en_cola -= 1
+
+
+async def ejecutar_bloqueante(fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """Ejecuta fn(*args, **kwargs) en el pool de I/O y espera su resultado sin bloquear el loop.
+    Propaga el contexto (contextvars) de la solicitud al hilo que ejecuta la llamada.
+    """
+    global _en_cola
+    with _estado_lock:
+        _en_cola += 1
+    llamada = functools.partial(fn, *args, **kwargs)
+    futuro = _executor.submit(_ejecutar, perf_counter(), contextvars.copy_context(), llamada)
+    futuro.add_done_callback(_descontar_si_cancelada)
+    # Cancelar la espera (p. ej. el cliente se desconectó) cancela también la tarea si aún no empezó.
+    return await asyncio.wrap_future(futuro)
@@ -0,0 +1,49 @@
+"""Caché LRU acotada de contenidos de archivo validados por firma.
+Pensada para perfiles (pacientes/, medicos/): evita volver a parsear un archivo que no
+cambió. Cada entrada guarda la firma del archivo (mtime, inode, tamaño) con la que se leyó:
+si otro worker lo reescribe la firma no coincide y la entrada se descarta. Las escrituras
+del propio proceso la invalidan explícitamente (guardar_json).
+Los valores guardados no deben modificarse: quien los entrega a los managers los copia.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+import threading
+
+Firma = Tuple[int, int, int]
+
+
+class CacheLRU:
+
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[Hashable, Tuple[Firma, Any]]" = OrderedDict()
+
+    def obtener(self, clave: Hashable, firma: Firma) -> Optional[Any]:
+        """Valor vigente para la firma dada, o None si no está o el archivo cambió."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] != firma:
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave: Hashable, firma: Firma, valor: Any) -> None:
+        if valor is None:
+            return
+        with self._lock:
+            self._entradas[clave] = (firma, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, clave: Hashable) -> None:
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def __len__(self) -> int:
+        return len(self._entradas)
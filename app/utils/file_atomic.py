@@ -4,48 +4,106 @@ Se crea primero un archivo temporal y luego se reemplaza (os.replace) para asegu
 que nunca haya estados intermedios corruptos. Pensado para poder cambiar
 fácilmente a otra capa de persistencia (por ejemplo SQL) reemplazando estas funciones
 por adaptadores que ignoren el sistema de archivos.
+Lecturas sin lock: como todo escritor reemplaza el archivo con os.replace, un lector
+siempre abre la versión anterior o la nueva completa. Por eso atomic_load_json no toma
+el FileLock; el lock sólo serializa a los escritores entre sí.
+Instrumentación: cada lectura/escritura registra parseo/serialización y bytes, y los locks
+(LockMedido) la espera y la retención, con la colección como etiqueta (por defecto el
+directorio del archivo: pacientes/<doc>.json -> pacientes).
 """
 from __future__ import annotations
 import os
 import json
-from typing import Any, Dict
+from time import perf_counter
+from typing import Any, Optional
 from filelock import FileLock
+from app.metrics.metrics import observe_lock_espera, observe_lock_retencion, observe_parseo, observe_serializacion
 
 
-def atomic_write_json(path: str, data: Dict[str, Any]) -> None:
+def coleccion_de(path: str) -> str:
+    """Etiqueta de métricas de un archivo de entidad: nombre de su directorio."""
+    return os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+
+class LockMedido:
+    """Envuelve un lock (FileLock, transacción SQLite) y registra cuánto se esperó para
+    adquirirlo y cuánto tiempo se retuvo.
+    """
+    __slots__ = ("_lock", "coleccion", "_adquirido")
+
+    def __init__(self, lock, coleccion: str):
+        self._lock = lock
+        self.coleccion = coleccion
+        self._adquirido = 0.0
+
+    def __enter__(self):
+        inicio = perf_counter()
+        resultado = self._lock.__enter__()
+        self._adquirido = perf_counter()
+        observe_lock_espera(self.coleccion, self._adquirido - inicio)
+        return resultado
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_lock_retencion(self.coleccion, perf_counter() - self._adquirido)
+        return self._lock.__exit__(exc_type, exc, tb)
+
+
+def parsear_json(contenido: bytes | str, coleccion: str) -> Any:
+    inicio = perf_counter()
+    datos = json.loads(contenido)
+    observe_parseo(coleccion, perf_counter() - inicio, len(contenido))
+    return datos
+
+
+def serializar_json(data: Any, coleccion: str, **opciones) -> bytes:
+    inicio = perf_counter()
+    contenido = json.dumps(data, **opciones).encode("utf-8")
+    observe_serializacion(coleccion, perf_counter() - inicio, len(contenido))
+    return contenido
+
+
+def atomic_write_json(path: str, data: Any, coleccion: Optional[str] = None) -> None:
     """Escribe un JSON en disco de forma atómica.
     Pasos:
-      1. Crea <path>.tmp
-      2. Escribe JSON con indent=4
+      1. Serializa el JSON con indent=4 (medido aparte de la escritura)
+      2. Lo escribe en <path>.tmp
       3. os.replace para asegurar operación atómica en la mayoría de FS.
     """
+    contenido = serializar_json(data, coleccion or coleccion_de(path), indent=4)
     tmp_path = f"{path}.tmp"
-    with open(tmp_path, "w") as f:
-        json.dump(data, f, indent=4)
+    with open(tmp_path, "wb") as f:
+        f.write(contenido)
     os.replace(tmp_path, path)
 
 
-def atomic_load_json(path: str) -> Dict[str, Any] | None:
-    """Carga un JSON si existe, retornando dict o None si no existe / error."""
+def atomic_load_json(path: str, coleccion: Optional[str] = None) -> Any | None:
+    """Carga un JSON si existe, retornando su contenido o None si no existe / error.
+    No toma lock: válido para archivos escritos con atomic_write_json / locked_atomic_write.
+    """
     if not os.path.exists(path):
         return None
     try:
-        with open(path, "r") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            contenido = f.read()
+        return parsear_json(contenido, coleccion or coleccion_de(path))
     except Exception:
         return None
 
 
-def locked_atomic_write(path: str, data: Dict[str, Any]) -> None:
+def locked_atomic_write(path: str, data: Any, coleccion: Optional[str] = None) -> None:
     """Envuelve atomic_write_json bajo FileLock para evitar intercalado de escrituras."""
+    coleccion = coleccion or coleccion_de(path)
     lock_path = f"{path}.lock"
-    with FileLock(lock_path):
-        atomic_write_json(path, data)
+    with LockMedido(FileLock(lock_path), coleccion):
+        atomic_write_json(path, data, coleccion)
 
 
-def locked_atomic_load(path: str) -> Dict[str, Any] | None:
-    """Lectura protegida por FileLock (consistente con escrituras)."""
+def locked_atomic_load(path: str, coleccion: Optional[str] = None) -> Any | None:
+    """Lectura protegida por FileLock. Sólo necesaria si el escritor no usa os.replace;
+    para archivos escritos con locked_atomic_write usar atomic_load_json.
+    """
+    coleccion = coleccion or coleccion_de(path)
     lock_path = f"{path}.lock"
-    with FileLock(lock_path):
-        return atomic_load_json(path)
+    with LockMedido(FileLock(lock_path), coleccion):
+        return atomic_load_json(path, coleccion)
 
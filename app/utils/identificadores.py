@@ -0,0 +1,46 @@
+"""Identificadores ordenables por tiempo (estilo ULID).
+Formato: 26 caracteres Crockford base32 = 48 bits de milisegundos epoch + 80 bits aleatorios.
+- El orden lexicográfico coincide con el orden de creación: los ids nuevos quedan al final de
+  los índices ordenados y del log.
+- Monótono dentro del proceso: en el mismo milisegundo la parte aleatoria se incrementa en 1,
+  así dos ids generados seguidos nunca empatan ni se invierten.
+La unicidad frente a lo ya persistido la garantiza BaseRepository.nuevo_id (consulta la clave
+primaria) y, bajo el lock, la verificación de claves del insert.
+"""
+from __future__ import annotations
+import secrets
+import threading
+import time
+
+ALFABETO = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+LONGITUD = 26
+_ALEATORIO_BITS = 80
+
+_lock = threading.Lock()
+_ultimo = (0, 0)  # (milisegundos, parte aleatoria) del último id generado
+
+
+def _codificar(valor: int) -> str:
+    caracteres = []
+    for _ in range(LONGITUD):
+        valor, resto = divmod(valor, 32)
+        caracteres.append(ALFABETO[resto])
+    return "".join(reversed(caracteres))
+
+
+def nuevo_ulid() -> str:
+    """Nuevo id ordenable por tiempo, estrictamente creciente dentro del proceso."""
+    global _ultimo
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        ultimo_ms, ultimo_aleatorio = _ultimo
+        if ms <= ultimo_ms:
+            # Mismo milisegundo (o reloj hacia atrás): se continúa la secuencia anterior.
+            ms, aleatorio = ultimo_ms, ultimo_aleatorio + 1
+            if aleatorio >> _ALEATORIO_BITS:
+                ms, aleatorio = ms + 1, secrets.randbits(_ALEATORIO_BITS)
+        else:
+            aleatorio = secrets.randbits(_ALEATORIO_BITS)
+        _ultimo = (ms, aleatorio)
+    return _codificar((ms << _ALEATORIO_BITS) | aleatorio)
+
@@ -0,0 +1,110 @@
+"""Índice persistente clave -> lista de valores en un archivo JSON.
+Pensado para reemplazar recorridos de directorio (os.listdir + carga de cada archivo) por
+búsquedas O(1), p.ej. nombre de médico -> documento.
+- Lectura: sin lock (el archivo se reemplaza de forma atómica); el contenido parseado se
+  conserva en memoria y sólo se relee si cambia la firma del archivo (otro worker lo actualizó).
+- Escritura: lectura-modificación-escritura bajo FileLock + reemplazo atómico.
+- Si el archivo no existe se construye con la función `construir` (fuente de verdad en disco),
+  por lo que el índice puede borrarse en cualquier momento y se regenera en el próximo uso.
+"""
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+import os
+import threading
+from filelock import FileLock
+from app.utils.file_atomic import LockMedido, atomic_write_json, parsear_json
+
+Datos = Dict[str, List[str]]
+
+
+class IndicePersistente:
+
+    def __init__(self, path: Path, construir: Optional[Callable[[], Datos]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._construir = construir
+        self._datos: Datos = {}
+        self._firma: Optional[Tuple[int, int, int]] = None
+        self._memoria = threading.Lock()
+
+    def _lock(self) -> LockMedido:
+        return LockMedido(FileLock(str(self.path) + ".lock"), self.path.stem)
+
+    def _leer(self) -> Optional[Tuple[Tuple[int, int, int], Datos]]:
+        # Firma y contenido del mismo descriptor.
+        try:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                contenido = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            datos = parsear_json(contenido, self.path.stem)
+        except ValueError:
+            datos = None
+        if not isinstance(datos, dict):
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size), datos
+
+    def _vigente(self) -> Datos:
+        try:
+            st = os.stat(self.path)
+            firma = (st.st_mtime_ns, st.st_ino, st.st_size)
+        except FileNotFoundError:
+            firma = None
+        if firma is not None and firma == self._firma:
+            return self._datos
+        leido = self._leer()
+        if leido is None:
+            if self._construir is None:
+                return {}
+            self.reconstruir()
+            return self._datos
+        with self._memoria:
+            self._firma, self._datos = leido
+        return self._datos
+
+    def _escribir(self, datos: Datos) -> None:
+        """Requiere el FileLock del índice."""
+        atomic_write_json(str(self.path), datos, self.path.stem)
+        st = os.stat(self.path)
+        with self._memoria:
+            self._firma, self._datos = (st.st_mtime_ns, st.st_ino, st.st_size), datos
+
+    def obtener(self, clave: str) -> List[str]:
+        return list(self._vigente().get(clave, ()))
+
+    def agregar(self, clave: str, valor: str) -> None:
+        with self._lock():
+            leido = self._leer()
+            if leido is not None:
+                datos = leido[1]
+            else:
+                datos = self._construir() if self._construir else {}
+            valores = datos.setdefault(clave, [])
+            if valor in valores and leido is not None:
+                return
+            if valor not in valores:
+                valores.append(valor)
+            self._escribir(datos)
+
+    def quitar(self, clave: str, valor: str) -> None:
+        with self._lock():
+            leido = self._leer()
+            if leido is None:
+                return
+            datos = leido[1]
+            valores = datos.get(clave, [])
+            if valor in valores:
+                valores.remove(valor)
+                if not valores:
+                    datos.pop(clave)
+                self._escribir(datos)
+
+    def reconstruir(self) -> None:
+        """Regenera el índice completo desde la fuente de verdad."""
+        if self._construir is None:
+            return
+        with self._lock():
+            self._escribir(self._construir())
@@ -0,0 +1,65 @@
+"""Registro en memoria de los documentos registrados (pacientes/, medicos/).
+Reemplaza el `Path.exists()` por solicitud con una búsqueda en un set:
+- Al primer uso (o al iniciar la app) se listan una vez los <documento>.json del directorio.
+- registrar_paciente / registrar_medico agregan el documento al registro del proceso.
+- Coherencia entre workers: los documentos no se eliminan, así que una coincidencia en
+  memoria es definitiva. Ante un documento desconocido se consulta el archivo (pudo
+  registrarlo otro worker) y, si existe, se agrega al set: sólo los documentos no
+  registrados siguen costando una llamada al sistema de archivos.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Optional, Set
+import os
+import threading
+
+
+class RegistroDocumentos:
+
+    def __init__(self, directorio: Path):
+        self.directorio = Path(directorio)
+        self._lock = threading.Lock()
+        self._documentos: Optional[Set[str]] = None
+
+    def cargar(self) -> None:
+        """Lista el directorio una vez y reemplaza el contenido del registro."""
+        try:
+            documentos = {
+                entrada.name[:-5] for entrada in os.scandir(self.directorio)
+                if entrada.name.endswith(".json") and entrada.is_file()
+            }
+        except FileNotFoundError:
+            documentos = set()
+        with self._lock:
+            self._documentos = documentos | (self._documentos or set())
+
+    def existe(self, documento: str) -> bool:
+        if self._documentos is None:
+            self.cargar()
+        if documento in self._documentos:
+            return True
+        # Desconocido en este proceso: otro worker pudo registrarlo.
+        if (self.directorio / f"{documento}.json").exists():
+            self.agregar(documento)
+            return True
+        return False
+
+    def agregar(self, documento: str) -> None:
+        if self._documentos is None:
+            self.cargar()
+        with self._lock:
+            self._documentos.add(documento)
+
+
+_REGISTROS: Dict[str, RegistroDocumentos] = {}
+_REGISTROS_LOCK = threading.Lock()
+
+
+def registro_documentos(directorio: Path) -> RegistroDocumentos:
+    """Registro compartido del directorio (uno por proceso)."""
+    clave = os.path.abspath(directorio)
+    with _REGISTROS_LOCK:
+        registro = _REGISTROS.get(clave)
+        if registro is None:
+            registro = _REGISTROS[clave] = RegistroDocumentos(Path(clave))
+        return registro
@@ -0,0 +1,179 @@
+"""Sesión por solicitud (identity map) para los archivos JSON de los managers.
+Durante una solicitud HTTP (SesionMiddleware, registrado en main.py) los managers leen y escriben sus archivos
+de entidad (pacientes/, medicos/, diagnosticos/, examenes/) a través de este módulo:
+- Cada archivo se lee como máximo una vez por solicitud; las lecturas siguientes usan la copia
+  de la sesión (incluidos los cambios aún no escritos de la misma solicitud).
+- Las escrituras marcan el archivo como sucio y se persisten una sola vez al cerrar la
+  sesión (locked_atomic_write), aunque la solicitud lo haya modificado varias veces.
+- Se entregan copias: un manager que modifica lo que leyó (p.ej. quitar la contraseña) no
+  altera lo que ven los demás.
+- Lo que se deriva de un archivo (registro de documentos, índices persistentes) se actualiza
+  con al_confirmar(): sólo después de que la sesión escribió sus archivos, así un fallo al
+  escribir nunca deja índices apuntando a documentos inexistentes.
+Fuera de una sesión (tests, scripts) las funciones leen y escriben directamente en disco.
+Los repositorios no pasan por aquí: ya mantienen una caché por proceso validada por firma.
+Las lecturas de disco usan single-flight: hilos que leen a la vez la misma versión de un
+archivo comparten un solo parseo. Los managers de perfiles pasan además una CacheLRU
+(cache_lru.py) que conserva lo leído entre solicitudes mientras la firma del archivo no cambie;
+guardar_json la invalida.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import deepcopy
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import os
+import threading
+from app.utils.blocking import ejecutar_bloqueante
+from app.utils.cache_lru import CacheLRU
+from app.utils.file_atomic import atomic_load_json, locked_atomic_write
+from app.utils.single_flight import SingleFlight
+
+_AUSENTE = object()
+_LECTURAS = SingleFlight()
+
+
+def _leer_disco(path: str, compartir=None, cache: Optional[CacheLRU] = None) -> Any | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    firma = (st.st_mtime_ns, st.st_ino, st.st_size)
+    if cache is not None:
+        datos = cache.obtener(path, firma)
+        if datos is not None:
+            return compartir(datos) if compartir else datos
+    coleccion = os.path.basename(os.path.dirname(path))
+    datos = _LECTURAS.hacer(coleccion, (path, *firma), lambda: atomic_load_json(path))
+    if cache is not None:
+        cache.guardar(path, firma, datos)
+    return compartir(datos) if compartir else datos
+
+
+class Sesion:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos: Dict[str, Any] = {}  # ruta -> contenido (None si el archivo no existe)
+        self._sucios: Dict[str, None] = {}  # rutas pendientes de escritura, en orden
+        self._al_confirmar: List[Callable[[], None]] = []  # acciones a ejecutar tras escribir
+
+    def cargar(self, path: str, cache: Optional[CacheLRU] = None) -> Any | None:
+        with self._lock:
+            datos = self._datos.get(path, _AUSENTE)
+        if datos is _AUSENTE:
+            # Lo leído se guarda sin modificar y se entrega copiado: se puede compartir.
+            datos = _leer_disco(path, cache=cache)
+            with self._lock:
+                # Si otro hilo de la misma solicitud lo cargó o escribió antes, gana su versión.
+                datos = self._datos.setdefault(path, datos)
+        return deepcopy(datos)
+
+    def guardar(self, path: str, data: Any) -> None:
+        with self._lock:
+            self._datos[path] = deepcopy(data)
+            self._sucios[path] = None
+
+    def existe(self, path: str) -> bool:
+        with self._lock:
+            datos = self._datos.get(path, _AUSENTE)
+        if datos is _AUSENTE:
+            return os.path.exists(path)
+        return datos is not None
+
+    def despues_de_confirmar(self, accion: Callable[[], None]) -> None:
+        with self._lock:
+            self._al_confirmar.append(accion)
+
+    def pendiente(self) -> bool:
+        """Indica si hay escrituras o acciones esperando a confirmar()."""
+        with self._lock:
+            return bool(self._sucios or self._al_confirmar)
+
+    def confirmar(self) -> None:
+        """Escribe una vez cada archivo modificado durante la solicitud y luego ejecuta las
+        acciones registradas con despues_de_confirmar (se descartan si una escritura falla).
+        """
+        with self._lock:
+            pendientes = [(path, self._datos[path]) for path in self._sucios]
+            acciones, self._al_confirmar = self._al_confirmar, []
+            self._sucios.clear()
+        for path, datos in pendientes:
+            locked_atomic_write(path, datos)
+        for accion in acciones:
+            accion()
+
+
+_SESION: ContextVar[Optional[Sesion]] = ContextVar("vitalapp_sesion", default=None)
+
+
+def sesion_actual() -> Optional[Sesion]:
+    return _SESION.get()
+
+
+@contextmanager
+def abrir_sesion() -> Iterator[Sesion]:
+    """Activa una sesión en el contexto actual. El llamador decide cuándo confirmarla."""
+    sesion = Sesion()
+    token = _SESION.set(sesion)
+    try:
+        yield sesion
+    finally:
+        _SESION.reset(token)
+
+
+def cargar_json(path: str, cache: Optional[CacheLRU] = None) -> Any | None:
+    sesion = _SESION.get()
+    return sesion.cargar(path, cache) if sesion is not None else _leer_disco(path, deepcopy, cache)
+
+
+def guardar_json(path: str, data: Any, cache: Optional[CacheLRU] = None) -> None:
+    if cache is not None:
+        cache.invalidar(path)
+    sesion = _SESION.get()
+    if sesion is not None:
+        sesion.guardar(path, data)
+    else:
+        locked_atomic_write(path, data)
+
+
+def al_confirmar(accion: Callable[[], None]) -> None:
+    """Ejecuta `accion` cuando lo guardado ya está en disco: al confirmar la sesión, o de inmediato sin sesión."""
+    sesion = _SESION.get()
+    if sesion is not None:
+        sesion.despues_de_confirmar(accion)
+    else:
+        accion()
+
+
+def existe_json(path: str) -> bool:
+    sesion = _SESION.get()
+    return sesion.existe(path) if sesion is not None else os.path.exists(path)
+
+
+class SesionMiddleware:
+    """Middleware ASGI: abre una sesión por solicitud HTTP y escribe sus cambios antes de
+    enviar la respuesta (y otra vez al terminar, por si hubo escrituras durante el streaming).
+    Sin cambios pendientes no se ocupa un hilo del pool de I/O.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with abrir_sesion() as sesion:
+            async def _confirmar():
+                if sesion.pendiente():
+                    await ejecutar_bloqueante(sesion.confirmar)
+
+            async def _send(message):
+                if message["type"] == "http.response.start":
+                    await _confirmar()
+                await send(message)
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                await _confirmar()
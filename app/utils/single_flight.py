@@ -0,0 +1,54 @@
+"""Single-flight: deduplicación de lecturas idénticas concurrentes.
+Si varios hilos piden la misma clave mientras una lectura está en curso, sólo el primero
+(líder) ejecuta la función; los demás esperan y reciben el mismo resultado (o la misma
+excepción). La clave incluye la firma del archivo, de modo que quien llega después de una
+escritura no se une a una lectura iniciada antes de ella.
+No es una caché: al terminar la lectura la clave se libera. Cada lectura compartida se
+cuenta en vitalapp_lecturas_coalescidas_total{coleccion}.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+import threading
+from app.metrics.metrics import inc_lectura_coalescida
+
+R = TypeVar("R")
+
+
+class _Vuelo:
+    __slots__ = ("listo", "resultado", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso: Dict[Hashable, _Vuelo] = {}
+
+    def hacer(self, coleccion: str, clave: Hashable, fn: Callable[[], R]) -> R:
+        """Ejecuta fn una sola vez por clave en curso; quienes esperan reciben el mismo objeto."""
+        with self._lock:
+            vuelo = self._en_curso.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_curso[clave] = _Vuelo()
+        if not lider:
+            inc_lectura_coalescida(coleccion)
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+        try:
+            vuelo.resultado = fn()
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            vuelo.listo.set()
@@ -0,0 +1,66 @@
+import pytest
+from app.services.examen_workflow_service import ExamenWorkflowService
+from app.repositories.base_repository import ConflictoVersion, limpiar_cache
+from app.repositories.unit_of_work import UnidadDeTrabajo, recuperar_journals
+
+
+@pytest.fixture
+def workflow(tmp_path):
+    limpiar_cache()
+    servicio = ExamenWorkflowService()
+    servicio.solicitud_repo.file_path = tmp_path / 'examenes_solicitudes.json'
+    servicio.resultado_repo.file_path = tmp_path / 'examenes_resultados.json'
+    return servicio
+
+
+def test_crear_solicitudes_en_lote(workflow):
+    solicitudes = workflow.crear_solicitudes("CITA1", "P1", "M1", ["Glucosa", "Hemograma", "Perfil lipídico"])
+
+    assert [s["tipo_examen"] for s in solicitudes] == ["Glucosa", "Hemograma", "Perfil lipídico"]
+    guardadas = workflow.listar_solicitudes_paciente("P1", codigo_cita="CITA1")
+    assert {s["id"] for s in guardadas} == {s["id"] for s in solicitudes}
+    assert all(s["estado"] == "solicitado" for s in guardadas)
+
+
+def test_registrar_resultado_confirma_ambas_colecciones(workflow):
+    solicitud = workflow.crear_solicitud("CITA1", "P1", "M1", "Glucosa")
+    workflow.autorizar_solicitud(solicitud["id"])
+
+    resultado = workflow.registrar_resultado(solicitud["id"], {"glucosa": 190})
+
+    assert resultado["estado_riesgo"] == "critico"
+    assert workflow.solicitud_repo.get(solicitud["id"])["estado"] == "resultado"
+    assert workflow.resultado_repo.get(resultado["id"])["solicitud_id"] == solicitud["id"]
+    assert not list(workflow.solicitud_repo.file_path.parent.glob("*.journal"))
+
+
+def test_registrar_resultado_estado_invalido_no_escribe(workflow):
+    solicitud = workflow.crear_solicitud("CITA1", "P1", "M1", "Glucosa")
+
+    with pytest.raises(ValueError):
+        workflow.registrar_resultado(solicitud["id"], {"glucosa": 100})
+    assert workflow.resultado_repo.list() == []
+
+
+def test_recuperar_journal_interrumpido(workflow, monkeypatch):
+    solicitud = workflow.crear_solicitud("CITA1", "P1", "M1", "Glucosa")
+    workflow.autorizar_solicitud(solicitud["id"])
+    # Simula una caída después de escribir el journal y antes de persistir las colecciones.
+    monkeypatch.setattr(UnidadDeTrabajo, "_rehacer", lambda self, colecciones: None)
+    monkeypatch.setattr("app.repositories.unit_of_work.os.remove", lambda path: None)
+    resultado = workflow.registrar_resultado(solicitud["id"], {"glucosa": 100})
+    monkeypatch.undo()
+
+    assert workflow.resultado_repo.list() == []
+    assert recuperar_journals(workflow.solicitud_repo.file_path.parent) == 1
+    assert workflow.resultado_repo.get(resultado["id"]) is not None
+    assert workflow.solicitud_repo.get(solicitud["id"])["estado"] == "resultado"
+
+
+def test_autorizar_con_version_desactualizada(workflow):
+    solicitud = workflow.crear_solicitud("CITA1", "P1", "M1", "Glucosa")
+    workflow.solicitud_repo.update(solicitud["id"], lambda s: {**s, "tipo_examen": "Hemograma"})
+
+    with pytest.raises(ConflictoVersion):
+        workflow.autorizar_solicitud(solicitud["id"], version=1)
+    assert workflow.autorizar_solicitud(solicitud["id"], version=2)["estado"] == "autorizado"
@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 from app.main import app
 import uuid
+from datetime import datetime
 
 client = TestClient(app)
 
@@ -37,11 +38,12 @@ def _login_medico(documento: str):
         "contraseña": "secret"
     })
 
-def _crear_cita(token: str, documento_paciente: str):
+def _crear_cita(token: str, documento_paciente: str, documento_medico: str):
+    # El médico es nuevo en cada ejecución: su agenda está vacía y el horario fijo no se solapa
     return client.post('/citas/', json={
         "paciente": "Paciente Test",
-        "medico": "Medico Test",
-        "fecha": "2030-01-01T10:00:00",
+        "medico": documento_medico,
+        "fecha": datetime(2030, 1, 1, 10).isoformat(),
         "documento": documento_paciente,
         "tipoCita": "general",
         "motivoPaciente": "control"
@@ -68,8 +70,9 @@ def test_metricas_negocio_y_http():
     assert r4.status_code == 200
 
     # Crear cita
-    r5 = _crear_cita(token_pac, doc_pac)
+    r5 = _crear_cita(token_pac, doc_pac, doc_med)
     assert r5.status_code == 200
+    assert r5.json()['cita']['documento_medico'] == doc_med
 
     # Obtener métricas
     metrics = client.get('/metrics')
@@ -83,6 +86,12 @@ def test_metricas_negocio_y_http():
     assert 'vitalapp_medicos_login_total' in text
     assert 'vitalapp_citas_agendadas_total' in text
     assert 'vitalapp_http_requests_total' in text
+    assert 'vitalapp_http_response_size_bytes_count' in text
+    assert 'vitalapp_http_requests_en_curso' in text
+    # La ruta se etiqueta con la plantilla del router, no con la URL real
+    assert 'route="/pacientes/registro"' in text
+    assert 'vitalapp_io_pool_ocupados' in text
+    assert 'vitalapp_io_pool_espera_seconds_count' in text
 
     # Opcional: verificar que los contadores sean >=1
     # Buscamos línea del contador de pacientes registrados
@@ -62,3 +62,23 @@ def test_paciente_examenes_fusion_workflow_legacy(monkeypatch):
     assert detalle_leg["codigo_examen"] == "EXLEG001"
 
     shutil.rmtree(base)
+
+
+def test_examenes_legacy_por_indice_de_paciente():
+    base = _setup_tmp_dir()
+    admin_manager = AdminManager(base_dir=base)
+    admin_manager.crear_resultado_examen("EXA", {"documento_paciente": "P1", "estado": "pendiente"})
+    admin_manager.crear_resultado_examen("EXB", {"documento_paciente": "P2", "estado": "pendiente"})
+    admin_manager.crear_resultado_examen("EXC", {"documento_paciente": "P1", "estado": "pendiente"})
+
+    assert [e["codigo_examen"] for e in admin_manager.listar_examenes_paciente("P1")] == ["EXA", "EXC"]
+
+    # Reasignar un examen a otro paciente actualiza ambos índices
+    admin_manager.crear_resultado_examen("EXC", {"documento_paciente": "P2", "estado": "pendiente"})
+    assert [e["codigo_examen"] for e in admin_manager.listar_examenes_paciente("P1")] == ["EXA"]
+    assert admin_manager.indice_pacientes.obtener("P2") == ["EXB", "EXC"]
+
+    # Reconstrucción desde disco si el índice se pierde
+    os.remove(admin_manager.indice_pacientes.path)
+    assert [e["codigo_examen"] for e in AdminManager(base_dir=base).listar_examenes_paciente("P2")] == ["EXB", "EXC"]
+    shutil.rmtree(base)
@@ -0,0 +1,108 @@
+import json
+import pytest
+from app.repositories.base_repository import BaseRepository, limpiar_cache
+from app.repositories.append_log_storage import AppendLogStorage
+
+
+class TestAppendLogStorage:
+
+    @pytest.fixture
+    def repo(self, tmp_path, monkeypatch):
+        """Repositorio cuya colección usa el motor append-only"""
+        monkeypatch.setattr("app.config.STORAGE_ENGINES", {"coleccion_log": "log"})
+        limpiar_cache()
+        return BaseRepository(tmp_path, "coleccion_log.json")
+
+    def test_motor_seleccionado_por_configuracion(self, repo):
+        """Prueba que la colección configurada use AppendLogStorage"""
+        assert isinstance(repo._storage, AppendLogStorage)
+
+    def test_insert_update_agregan_lineas_al_log(self, repo):
+        """Prueba que las escrituras sólo agreguen registros y no creen snapshot"""
+        repo.insert({"id": "1", "valor": "a", "version": 1})
+        repo.update("1", lambda i: {**i, "valor": "b", "version": 2})
+
+        assert not repo.file_path.exists()
+        registros = [json.loads(l) for l in repo._storage.log_path.read_text().splitlines()]
+        assert [(r["op"], r["id"], r["version"]) for r in registros] == [("insert", "1", 1), ("update", "1", 2)]
+
+    def test_estado_se_reconstruye_desde_log(self, repo):
+        """Prueba que un proceso nuevo (caché vacía) reconstruya el estado con replay"""
+        repo.insert({"id": "1", "valor": "a"})
+        repo.insert({"id": "2", "valor": "x"})
+        repo.update("1", lambda i: {**i, "valor": "b"})
+        limpiar_cache()
+
+        assert repo.list() == [{"id": "1", "valor": "b", "version": 2}, {"id": "2", "valor": "x", "version": 1}]
+
+    def test_lectura_incremental_de_lineas_nuevas(self, repo):
+        """Prueba que un registro agregado por otro proceso se aplique sobre la entrada cacheada"""
+        repo.insert({"id": "1", "valor": "a"})
+        with open(repo._storage.log_path, "a") as f:
+            f.write(json.dumps({"op": "insert", "id": "2", "version": None, "item": {"id": "2"}}) + "\n")
+
+        assert [i["id"] for i in repo.list()] == ["1", "2"]
+
+    def test_compactacion_pliega_log_en_snapshot(self, repo):
+        """Prueba que compactar deje un snapshot con el estado y el log vacío"""
+        repo.insert({"id": "1", "valor": "a"})
+        repo.update("1", lambda i: {**i, "valor": "b"})
+        repo._storage.compactar()
+
+        assert json.loads(repo.file_path.read_text()) == [{"id": "1", "valor": "b", "version": 2}]
+        assert repo._storage.log_path.read_text() == ""
+        limpiar_cache()
+        assert repo.get("1")["valor"] == "b"
+
+    def test_replay_incremental_reemplaza_por_indice(self, repo):
+        """Prueba que una actualización de otro proceso se ubique con el índice de la entrada"""
+        repo.insert_many([{"id": str(i)} for i in range(3)])
+        entrada = repo._entrada()
+        with open(repo._storage.log_path, "a") as f:
+            f.write(json.dumps({"op": "update", "id": "1", "version": 2, "item": {"id": "1", "version": 2}}) + "\n")
+
+        assert [i.get("version") for i in repo.list()] == [1, 2, 1]
+        # Misma entrada (replay incremental) con el índice de claves al día
+        assert repo._entrada() is entrada
+        assert entrada.indice("id")["1"] == [1]
+
+    def test_vaciar_log_es_durable(self, repo, monkeypatch):
+        """Prueba que con STORAGE_FSYNC la compactación sincronice el log vacío y su directorio"""
+        monkeypatch.setattr("app.repositories.append_log_storage.STORAGE_FSYNC", True)
+        directorios = []
+        monkeypatch.setattr("app.repositories.append_log_storage.fsync_directorio", directorios.append)
+        repo.insert({"id": "1"})
+        directorios.clear()
+        repo._storage.compactar()
+
+        assert directorios == [repo._storage.log_path]
+
+    def test_lectura_sin_lock_reintenta_si_compactan(self, repo, monkeypatch):
+        """Prueba que leer no tome el lock de escritura y reintente si una compactación cambia el snapshot entre ambas lecturas"""
+        repo.insert({"id": "1", "valor": "a"})
+        repo._storage.compactar()
+        repo.insert({"id": "2", "valor": "b"})
+        storage = repo._storage
+        lock, leer_log = type(storage).lock, type(storage)._leer_log
+        lecturas, compactando = [], []
+
+        def _lock(self):
+            assert compactando, "la lectura tomó el lock de escritura"
+            return lock(self)
+
+        def _leer_log(self, desde):
+            lecturas.append(desde)
+            if len(lecturas) == 1:
+                # Compactación concurrente: snapshot nuevo y log vacío antes de leer el log.
+                compactando.append(True)
+                self.compactar()
+            return leer_log(self, desde)
+        monkeypatch.setattr(type(storage), "lock", _lock)
+        monkeypatch.setattr(type(storage), "_leer_log", _leer_log)
+        limpiar_cache()
+
+        with storage.lock_lectura():
+            entrada = storage.leer(None, ())
+        # Lectura descartada, la de la propia compactación y el reintento.
+        assert len(lecturas) == 3
+        assert [i["id"] for i in entrada.items] == ["1", "2"]
@@ -0,0 +1,371 @@
+import json
+import threading
+import time
+import pytest
+from app.repositories.base_repository import BaseRepository, ClaveDuplicada, ConflictoVersion, limpiar_cache, reintentar_en_conflicto
+from app.repositories.examen_repository import ExamenSolicitudRepository, ExamenResultadoRepository
+from app.repositories.group_commit import _Pendiente, _confirmar_lote
+from app.repositories.unit_of_work import UnidadDeTrabajo, recuperar_journals
+from app.metrics.metrics import LECTURAS_COALESCIDAS_TOTAL, REPO_CACHE_HITS_TOTAL, REPO_CACHE_MISSES_TOTAL
+from prometheus_client import REGISTRY
+
+
+def _valor(counter, coleccion):
+    return counter.labels(coleccion=coleccion)._value.get()
+
+
+class TestBaseRepository:
+
+    @pytest.fixture
+    def repo(self, tmp_path):
+        """Repositorio aislado en un directorio temporal con la caché limpia"""
+        limpiar_cache()
+        return BaseRepository(tmp_path, "coleccion_test.json")
+
+    def test_lectura_repetida_usa_cache(self, repo):
+        """Prueba que la segunda lectura sin cambios en disco no vuelva a parsear"""
+        repo.insert({"id": "1", "valor": "a"})
+        limpiar_cache()
+        hits = _valor(REPO_CACHE_HITS_TOTAL, repo.coleccion)
+        misses = _valor(REPO_CACHE_MISSES_TOTAL, repo.coleccion)
+
+        assert repo.get("1")["valor"] == "a"
+        assert repo.list() == [{"id": "1", "valor": "a", "version": 1}]
+
+        assert _valor(REPO_CACHE_MISSES_TOTAL, repo.coleccion) == misses + 1
+        assert _valor(REPO_CACHE_HITS_TOTAL, repo.coleccion) == hits + 1
+
+    def test_escritura_actualiza_cache(self, repo):
+        """Prueba que insert/update dejen la caché vigente (write-through)"""
+        repo.insert({"id": "1", "valor": "a"})
+        repo.update("1", lambda i: {**i, "valor": "b"})
+        misses = _valor(REPO_CACHE_MISSES_TOTAL, repo.coleccion)
+
+        assert repo.get("1")["valor"] == "b"
+        assert _valor(REPO_CACHE_MISSES_TOTAL, repo.coleccion) == misses
+
+    def test_cambio_externo_invalida_cache(self, repo):
+        """Prueba que una escritura de otro proceso (archivo reemplazado) invalide la caché"""
+        repo.insert({"id": "1", "valor": "a"})
+        with open(repo.file_path, "w") as f:
+            json.dump([{"id": "1", "valor": "externo"}, {"id": "2"}], f)
+
+        assert repo.get("1")["valor"] == "externo"
+        assert len(repo.list()) == 2
+
+    def test_mutar_resultado_no_afecta_cache(self, repo):
+        """Prueba que modificar un dict devuelto no altere la copia cacheada"""
+        repo.insert({"id": "1", "valor": "a"})
+        item = repo.get("1")
+        item["valor"] = "mutado"
+
+        assert repo.get("1")["valor"] == "a"
+
+    def test_mutar_valores_anidados_no_afecta_cache(self, repo):
+        """Prueba que listas y dicts anidados de lo devuelto (o de lo que recibe un updater) no se compartan con la caché"""
+        repo.insert({"id": "1", "tags": ["a"], "datos": {"x": 1}})
+        repo.get("1")["tags"].append("get")
+        repo.list()[0]["datos"]["x"] = 2
+        repo.filter(lambda i: True)[0]["tags"].append("filter")
+
+        def _updater_que_falla(item):
+            item["tags"].append("updater")
+            raise ValueError("cancelado")
+        with pytest.raises(ValueError):
+            repo.update("1", _updater_que_falla)
+
+        assert repo.get("1") == {"id": "1", "tags": ["a"], "datos": {"x": 1}, "version": 1}
+
+    def test_find_by_usa_indice_declarado(self, tmp_path):
+        """Prueba que find_by devuelva los items del valor y se mantenga en insert/update"""
+        limpiar_cache()
+        repo = ExamenSolicitudRepository(tmp_path)
+        repo.insert({"id": "1", "documento_paciente": "P1", "documento_medico": "M1"})
+        repo.insert({"id": "2", "documento_paciente": "P2", "documento_medico": "M1"})
+        repo.insert({"id": "3", "documento_paciente": "P1", "documento_medico": "M2"})
+
+        assert [e["id"] for e in repo.listar_por_paciente("P1")] == ["1", "3"]
+        assert [e["id"] for e in repo.listar_por_medico("M1")] == ["1", "2"]
+
+        repo.update("2", lambda e: {**e, "documento_paciente": "P1"})
+        assert [e["id"] for e in repo.listar_por_paciente("P1")] == ["1", "2", "3"]
+        assert repo.listar_por_paciente("P2") == []
+
+    def test_indice_se_reconstruye_al_cargar(self, tmp_path):
+        """Prueba que el índice se reconstruya desde el archivo en un proceso nuevo"""
+        repo = ExamenSolicitudRepository(tmp_path)
+        repo.insert({"id": "1", "documento_paciente": "P1", "documento_medico": "M1"})
+        limpiar_cache()
+
+        assert [e["id"] for e in repo.listar_por_paciente("P1")] == ["1"]
+
+    def test_insert_many_una_sola_escritura(self, repo, monkeypatch):
+        """Prueba que insert_many persista todos los items con una única escritura"""
+        escrituras = []
+        original = repo._storage.registrar
+        monkeypatch.setattr(repo._storage, "registrar", lambda e, m: escrituras.append(len(m)) or original(e, m))
+
+        repo.insert_many([{"id": str(i)} for i in range(8)])
+
+        assert escrituras == [8]
+        assert [i["id"] for i in repo.list()] == [str(i) for i in range(8)]
+
+    def test_update_many_atomico(self, repo):
+        """Prueba que update_many aplique todos los cambios o ninguno"""
+        repo.insert_many([{"id": "1", "estado": "a"}, {"id": "2", "estado": "a"}])
+
+        actualizados = repo.update_many({"1": lambda i: {**i, "estado": "b"}, "2": lambda i: {**i, "estado": "b"}, "X": dict})
+        assert [i["id"] for i in actualizados] == ["1", "2"]
+
+        def _falla(item):
+            raise ValueError("transición inválida")
+        with pytest.raises(ValueError):
+            repo.update_many({"1": lambda i: {**i, "estado": "c"}, "2": _falla})
+        assert {i["estado"] for i in repo.list()} == {"b"}
+
+    def test_update_incrementa_version(self, repo):
+        """Prueba que insert asigne versión 1 y cada update la incremente"""
+        repo.insert({"id": "1", "valor": "a"})
+        assert repo.get("1")["version"] == 1
+
+        assert repo.update("1", lambda i: {**i, "valor": "b"})["version"] == 2
+        assert repo.update("1", lambda i: {**i, "valor": "c"}, expected_version=2)["version"] == 3
+
+    def test_update_con_version_vencida_falla(self, repo):
+        """Prueba que el compare-and-swap rechace una versión desactualizada sin escribir"""
+        repo.insert({"id": "1", "valor": "a"})
+        repo.update("1", lambda i: {**i, "valor": "b"})
+
+        with pytest.raises(ConflictoVersion) as conflicto:
+            repo.update("1", lambda i: {**i, "valor": "x"}, expected_version=1)
+        assert (conflicto.value.esperada, conflicto.value.actual) == (1, 2)
+        assert repo.get("1")["valor"] == "b"
+
+    def test_reintentar_en_conflicto(self, repo):
+        """Prueba que el helper relea y reintente tras un conflicto"""
+        repo.insert({"id": "1", "contador": 0})
+        intentos = []
+
+        def _incrementar():
+            actual = repo.get("1")
+            if not intentos:
+                # Escritura concurrente entre la lectura y el compare-and-swap
+                repo.update("1", lambda i: {**i, "contador": i["contador"] + 1})
+            intentos.append(1)
+            return repo.update("1", lambda i: {**i, "contador": i["contador"] + 1}, expected_version=actual["version"])
+
+        assert reintentar_en_conflicto(_incrementar)["contador"] == 2
+        assert len(intentos) == 2
+
+    def test_lectura_no_espera_al_escritor(self, repo):
+        """Prueba que una lectura no quede bloqueada mientras otro hilo tiene el lock de escritura"""
+        repo.insert({"id": "1", "valor": "a"})
+        limpiar_cache()
+        tomado, liberar = threading.Event(), threading.Event()
+
+        def _escritor():
+            with repo._storage.lock():
+                tomado.set()
+                liberar.wait(5)
+        hilo = threading.Thread(target=_escritor)
+        hilo.start()
+        tomado.wait(5)
+        try:
+            assert repo.get("1")["valor"] == "a"
+        finally:
+            liberar.set()
+            hilo.join()
+
+    def test_lecturas_concurrentes_comparten_un_parseo(self, repo, monkeypatch):
+        """Prueba que lectores simultáneos con la caché vencida compartan una sola lectura"""
+        repo.insert({"id": "1", "valor": "a"})
+        limpiar_cache()
+        coalescidas = _valor(LECTURAS_COALESCIDAS_TOTAL, repo.coleccion)
+        leer = type(repo._storage).leer
+        lecturas, empezo, liberar = [], threading.Event(), threading.Event()
+
+        def _leer_lento(storage, previa, campos):
+            lecturas.append(1)
+            empezo.set()
+            liberar.wait(5)
+            return leer(storage, previa, campos)
+        monkeypatch.setattr(type(repo._storage), "leer", _leer_lento)
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(repo.get("1"))) for _ in range(5)]
+        hilos[0].start()
+        empezo.wait(5)
+        for hilo in hilos[1:]:
+            hilo.start()
+        while _valor(LECTURAS_COALESCIDAS_TOTAL, repo.coleccion) < coalescidas + 4:
+            time.sleep(0.01)
+        liberar.set()
+        for hilo in hilos:
+            hilo.join()
+
+        assert len(lecturas) == 1
+        assert [r["valor"] for r in resultados] == ["a"] * 5
+
+    def test_group_commit_agrupa_escrituras_concurrentes(self, repo, monkeypatch):
+        """Prueba que inserts/updates concurrentes dentro de la ventana se persistan en una escritura"""
+        monkeypatch.setattr("app.repositories.base_repository.GROUP_COMMIT_MS", 50)
+        repo.insert({"id": "0", "valor": 0})
+        escrituras = []
+        original = repo._storage.registrar
+        monkeypatch.setattr(repo._storage, "registrar", lambda e, m: escrituras.append(len(m)) or original(e, m))
+
+        def _falla(item):
+            raise ValueError("transición inválida")
+        operaciones = [lambda i=i: repo.insert({"id": str(i)}) for i in range(1, 6)]
+        operaciones.append(lambda: repo.update("0", lambda i: {**i, "valor": 1}))
+        operaciones.append(lambda: repo.update("0", _falla))
+        errores = []
+
+        def _ejecutar(op):
+            try:
+                op()
+            except ValueError as e:
+                errores.append(e)
+        hilos = [threading.Thread(target=_ejecutar, args=(op,)) for op in operaciones]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert len(escrituras) < len(operaciones) - 1
+        assert sum(escrituras) == 6
+        assert len(errores) == 1
+        limpiar_cache()
+        assert sorted(i["id"] for i in repo.list()) == [str(i) for i in range(6)]
+        assert repo.get("0")["valor"] == 1
+
+    def test_lote_de_group_commit_sin_copiar_la_entrada(self, repo, monkeypatch):
+        """Prueba que cada cálculo del lote vea los anteriores sin que la entrada viva cambie antes de escribir"""
+        repo.insert_many([{"id": str(i), "grupo": "a"} for i in range(3)])
+        entrada = repo._entrada()
+        items = entrada.items
+        original = repo._storage.registrar
+
+        def _registrar(e, m):
+            # Al escribir, la entrada viva todavía no tiene las mutaciones del lote.
+            assert e is entrada and len(e.items) == 3 and e.items[1].get("version") == 1
+            return original(e, m)
+        monkeypatch.setattr(repo._storage, "registrar", _registrar)
+
+        def _grupo(vista):
+            return [repo._posicion(vista, item["id"]) for item in vista.items if item["grupo"] == "b"]
+        lote = [
+            _Pendiente(lambda vista: [("insert", None, repo._nuevo({"id": "3", "grupo": "b"}))]),
+            _Pendiente(lambda vista: [("update", 1, repo._versionar(vista.items[1], {**vista.items[1], "grupo": "b"}))]),
+            _Pendiente(lambda vista: [("insert", None, repo._nuevo({"id": "3"}))]),
+            _Pendiente(lambda vista: [("update", pos, {**vista.items[pos], "visto": sorted(vista.indice("grupo").get("b"))})
+                                      for pos in _grupo(vista)]),
+        ]
+        _confirmar_lote(repo, lote)
+
+        assert isinstance(lote[2].error, ClaveDuplicada)
+        assert entrada.items is items
+        assert [i["grupo"] for i in repo.list()] == ["a", "b", "a", "b"]
+        assert repo.get("3")["visto"] == [1, 3]
+        limpiar_cache()
+        assert repo.get("1")["visto"] == [1, 3]
+
+    def test_clave_primaria_y_claves_unicas(self, tmp_path):
+        """Prueba búsquedas por índice de clave y el rechazo de claves duplicadas"""
+        repo = ExamenResultadoRepository(tmp_path)
+        repo.insert_many([{"id": "R1", "solicitud_id": "S1"}, {"id": "R2", "solicitud_id": "S2"}])
+
+        assert repo.get("R2")["solicitud_id"] == "S2"
+        assert repo.get_by("solicitud_id", "S1")["id"] == "R1"
+        with pytest.raises(ClaveDuplicada):
+            repo.insert({"id": "R3", "solicitud_id": "S1"})
+        with pytest.raises(ClaveDuplicada):
+            repo.update("R2", lambda r: {**r, "id": "R1"})
+        assert [r["id"] for r in repo.list()] == ["R1", "R2"]
+
+    def test_clave_repetida_dentro_de_un_lote(self, repo):
+        """Prueba que insert_many y la unidad de trabajo rechacen una clave repetida en el mismo lote"""
+        with pytest.raises(ClaveDuplicada):
+            repo.insert_many([{"id": "A"}, {"id": "A"}])
+        with pytest.raises(ClaveDuplicada):
+            with UnidadDeTrabajo(repo) as uow:
+                uow.insert(repo, {"id": "B"})
+                uow.insert(repo, {"id": "B"})
+
+        assert repo.list() == []
+        assert repo.validar_claves() == []
+
+    def test_journal_durable_en_el_directorio(self, repo, monkeypatch):
+        """Prueba que el journal de la unidad de trabajo se sincronice en el directorio al crearlo y al borrarlo"""
+        sincronizados = []
+        monkeypatch.setattr("app.repositories.unit_of_work.fsync_directorio", sincronizados.append)
+        with UnidadDeTrabajo(repo) as uow:
+            uow.insert(repo, {"id": "1"})
+
+        assert len(sincronizados) == 2
+        assert sincronizados[0] == sincronizados[1] and sincronizados[0].name.endswith(".journal")
+        assert not sincronizados[0].exists()
+        assert repo.get("1") is not None
+
+    def test_unidad_de_trabajo_sincroniza_datos_antes_de_borrar_journal(self, repo, monkeypatch):
+        """Prueba que la unidad de trabajo haga durable la colección antes de borrar el journal, aun sin STORAGE_FSYNC"""
+        monkeypatch.setattr("app.repositories.storage.STORAGE_FSYNC", False)
+        eventos = []
+        sincronizar = type(repo._storage).sincronizar
+        monkeypatch.setattr(type(repo._storage), "sincronizar", lambda self: (eventos.append("datos"), sincronizar(self)))
+        monkeypatch.setattr("app.repositories.unit_of_work.fsync_directorio",
+                            lambda path: eventos.append("journal" if path.exists() else "journal borrado"))
+        with UnidadDeTrabajo(repo) as uow:
+            uow.insert(repo, {"id": "1"})
+
+        assert eventos == ["journal", "datos", "journal borrado"]
+
+    def test_recuperar_journal_no_pisa_versiones_posteriores(self, repo, monkeypatch):
+        """Prueba que rehacer un journal ya aplicado no revierta un item que otro proceso actualizó después"""
+        repo.insert({"id": "1", "nombre": "a"})
+        monkeypatch.setattr("app.repositories.unit_of_work.os.remove", lambda path: None)
+        with UnidadDeTrabajo(repo) as uow:
+            uow.update(repo, "1", lambda item: {**item, "nombre": "b"})
+        monkeypatch.undo()
+        repo.update("1", lambda item: {**item, "nombre": "c"})
+
+        assert recuperar_journals(repo.file_path.parent) == 1
+        assert repo.get("1")["nombre"] == "c"
+        assert not list(repo.file_path.parent.glob("*.journal"))
+
+    def test_validar_claves_reporta_duplicados_del_archivo(self, repo):
+        """Prueba la validación de claves contra el contenido del archivo"""
+        repo.file_path.write_text(json.dumps([{"id": "1"}, {"id": "2"}, {"id": "1"}]))
+
+        assert repo.validar_claves() == ["coleccion_test: id=1 repetido en 2 registros"]
+
+    def test_nuevo_id_ordenado_y_libre(self, repo, monkeypatch):
+        """Prueba que nuevo_id sea creciente y descarte ids ya usados en la clave primaria"""
+        primero, segundo = repo.nuevo_id(), repo.nuevo_id()
+        assert len(primero) == 26 and primero < segundo
+
+        repo.insert({"id": segundo})
+        candidatos = iter([segundo, "01ZZZZZZZZZZZZZZZZZZZZZZZZ"])
+        monkeypatch.setattr("app.repositories.base_repository.nuevo_ulid", lambda: next(candidatos))
+        assert repo.nuevo_id() == "01ZZZZZZZZZZZZZZZZZZZZZZZZ"
+
+    def test_instrumentacion_de_almacenamiento(self, repo):
+        """Prueba que escrituras y lecturas registren lock, serialización, parseo y bytes por colección"""
+        def muestra(nombre):
+            return REGISTRY.get_sample_value(nombre, {"coleccion": repo.coleccion}) or 0
+
+        nombres = ("vitalapp_storage_lock_espera_seconds_count", "vitalapp_storage_lock_retencion_seconds_count",
+                   "vitalapp_storage_serializacion_seconds_count", "vitalapp_storage_parseo_seconds_count",
+                   "vitalapp_storage_bytes_escritos_total", "vitalapp_storage_bytes_leidos_total")
+        antes = {nombre: muestra(nombre) for nombre in nombres}
+
+        repo.insert({"id": "1", "valor": "a"})
+        limpiar_cache()
+        assert repo.get("1")["valor"] == "a"
+
+        tamano = repo.file_path.stat().st_size
+        assert muestra("vitalapp_storage_lock_espera_seconds_count") == antes["vitalapp_storage_lock_espera_seconds_count"] + 1
+        assert muestra("vitalapp_storage_lock_retencion_seconds_count") == antes["vitalapp_storage_lock_retencion_seconds_count"] + 1
+        assert muestra("vitalapp_storage_serializacion_seconds_count") > antes["vitalapp_storage_serializacion_seconds_count"]
+        assert muestra("vitalapp_storage_parseo_seconds_count") > antes["vitalapp_storage_parseo_seconds_count"]
+        assert muestra("vitalapp_storage_bytes_escritos_total") - antes["vitalapp_storage_bytes_escritos_total"] >= tamano
+        assert muestra("vitalapp_storage_bytes_leidos_total") - antes["vitalapp_storage_bytes_leidos_total"] >= tamano
@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import threading
+from prometheus_client import REGISTRY
+from app.utils import blocking
+from app.utils.blocking import ejecutar_bloqueante
+
+_SOLICITUD = contextvars.ContextVar("solicitud_test", default=None)
+
+
+def _en_cola():
+    return REGISTRY.get_sample_value("vitalapp_io_pool_en_cola")
+
+
+def _esperas():
+    return REGISTRY.get_sample_value("vitalapp_io_pool_espera_seconds_count") or 0
+
+
+class TestEjecutarBloqueante:
+
+    def test_propaga_contexto_y_corre_en_el_pool(self):
+        """Prueba que la llamada vea los contextvars de la solicitud y corra en un hilo del pool"""
+        def _leer():
+            return _SOLICITUD.get(), threading.current_thread().name
+
+        async def _solicitud():
+            _SOLICITUD.set("req-1")
+            return await ejecutar_bloqueante(_leer)
+
+        valor, hilo = asyncio.run(_solicitud())
+        assert valor == "req-1"
+        assert hilo.startswith("vitalapp-io") and hilo != threading.current_thread().name
+
+    def test_no_bloquea_el_event_loop(self):
+        """Prueba que el loop siga atendiendo corrutinas mientras la llamada bloqueante espera"""
+        liberada = threading.Event()
+
+        async def _principal():
+            llamada = asyncio.ensure_future(ejecutar_bloqueante(liberada.wait, 2))
+            # Si la llamada ocupara el loop, esta corrutina no correría hasta que venza el timeout.
+            await asyncio.sleep(0)
+            liberada.set()
+            return await llamada
+
+        assert asyncio.run(_principal()) is True
+
+    def test_registra_espera_en_cola(self):
+        """Prueba que cada llamada observe su tiempo de espera en el histograma del pool"""
+        antes = _esperas()
+
+        async def _varias():
+            return await asyncio.gather(*(ejecutar_bloqueante(sum, [i, 1]) for i in range(5)))
+
+        assert asyncio.run(_varias()) == [1, 2, 3, 4, 5]
+        assert _esperas() == antes + 5
+
+    def test_cancelar_en_cola_libera_el_gauge(self):
+        """Prueba que una llamada cancelada mientras espera un hilo libre salga de la cola"""
+        liberada = threading.Event()
+        ejecutada = threading.Event()
+
+        async def _principal():
+            # Ocupa todos los hilos del pool para que la siguiente llamada quede encolada.
+            ocupadas = [asyncio.ensure_future(ejecutar_bloqueante(liberada.wait, 2)) for _ in range(blocking._executor._max_workers)]
+            en_cola = asyncio.ensure_future(ejecutar_bloqueante(ejecutada.set))
+            await asyncio.sleep(0.05)
+            antes = _en_cola()
+            en_cola.cancel()
+            await asyncio.sleep(0)
+            despues = _en_cola()
+            liberada.set()
+            await asyncio.gather(*ocupadas)
+            return antes, despues
+
+        antes, despues = asyncio.run(_principal())
+        assert antes >= 1
+        assert despues == antes - 1
+        assert _en_cola() == 0
+        assert not ejecutada.is_set()
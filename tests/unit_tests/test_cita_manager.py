@@ -1,8 +1,13 @@
 import pytest
 import tempfile
 import os
+import json
 from datetime import datetime, timedelta
+from pathlib import Path
 from app.managers.cita_manager import CitaManager
+from app.managers.medico_manager import MedicoManager
+from app.repositories.cita_repository import HorarioOcupado
+from app.services.medico_service import MedicoService
 
 class TestCitaManager:
     
@@ -167,13 +172,218 @@ class TestCitaManager:
         codigo1 = cita_manager._generar_codigo_cita()
         codigo2 = cita_manager._generar_codigo_cita()
         
-        # Verificar que ambos códigos tengan 6 caracteres
-        assert len(codigo1) == 6
-        assert len(codigo2) == 6
+        # Verificar que ambos códigos tengan 26 caracteres (ULID)
+        assert len(codigo1) == 26
+        assert len(codigo2) == 26
         
-        # Verificar que sean diferentes (muy poco probable que sean iguales)
-        assert codigo1 != codigo2
+        # Verificar que sean diferentes y ordenados por creación
+        assert codigo1 < codigo2
         
         # Verificar que solo contengan caracteres válidos (letras mayúsculas y dígitos)
         for char in codigo1:
-            assert char.isupper() or char.isdigit()
\ No newline at end of file
+            assert char.isupper() or char.isdigit()
+    
+    def test_cita_visible_para_paciente_y_medico(self, cita_manager, temp_dir):
+        """Prueba que una cita se guarde una vez y aparezca en la vista del paciente y del médico"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        cita_manager.medico_manager.registrar_medico(
+            "M200", "Ana Ruiz", "clave", "3000000000", "ana@example.com", "Pediatría"
+        )
+        cita = cita_manager.agendar_cita(
+            paciente="Laura Diaz",
+            medico="M200",
+            fecha=(datetime.now() + timedelta(days=1)).isoformat(),
+            documento="P200",
+            tipoCita="Consulta",
+            motivoPaciente="Fiebre"
+        )
+
+        assert [c["codigo_cita"] for c in cita_manager.obtener_agenda_medico("M200")] == [cita["codigo_cita"]]
+        cita_manager.actualizar_estado_cita(cita["codigo_cita"], "realizada")
+        assert cita_manager.obtener_citas_paciente("P200")[0]["estado"] == "realizada"
+        assert not os.path.exists(os.path.join(temp_dir, "P200.json"))
+
+    def test_agenda_ordenada_y_rango_de_fechas(self, cita_manager, temp_dir):
+        """Prueba que la agenda se ordene por fecha_epoch y que desde/hasta acoten el resultado"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        cita_manager.medico_manager.registrar_medico(
+            "M400", "Eva Mora", "clave", "3000000000", "eva@example.com", "Pediatría"
+        )
+        ahora = datetime.now()
+        for dias in (3, 1, 2):
+            cita = cita_manager.agendar_cita(
+                paciente="Laura Diaz", medico="M400", fecha=(ahora + timedelta(days=dias)).isoformat(),
+                documento=f"P40{dias}", tipoCita="Consulta", motivoPaciente="Control"
+            )
+            assert cita["fecha_epoch"] == pytest.approx((ahora + timedelta(days=dias)).timestamp())
+
+        agenda = cita_manager.obtener_agenda_medico("M400", desde=ahora.timestamp())
+        assert [c["documento"] for c in agenda] == ["P401", "P402", "P403"]
+        rango = cita_manager.obtener_agenda_medico(
+            "M400", desde=(ahora + timedelta(days=1, hours=1)).timestamp(),
+            hasta=(ahora + timedelta(days=3)).timestamp()
+        )
+        assert [c["documento"] for c in rango] == ["P402", "P403"]
+
+    def test_rechaza_horario_solapado(self, cita_manager, temp_dir):
+        """Prueba que no se agenden dos citas solapadas con el mismo médico"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        cita_manager.medico_manager.registrar_medico(
+            "M500", "Raul Gil", "clave", "3000000000", "raul@example.com", "Cardiología"
+        )
+        inicio = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        datos = dict(paciente="Laura Diaz", medico="M500", documento="P500", tipoCita="Consulta", motivoPaciente="Control")
+        cita = cita_manager.agendar_cita(fecha=inicio.isoformat(), **datos)
+
+        with pytest.raises(HorarioOcupado):
+            cita_manager.agendar_cita(fecha=(inicio + timedelta(minutes=15)).isoformat(), **datos)
+        # Contigua: no se solapa
+        cita_manager.agendar_cita(fecha=(inicio + timedelta(minutes=30)).isoformat(), **datos)
+        # Una cita eliminada libera su horario
+        cita_manager.repo.eliminar([cita["codigo_cita"]])
+        cita_manager.agendar_cita(fecha=(inicio - timedelta(minutes=10)).isoformat(), **datos)
+
+    def test_solapamiento_con_cita_anterior_mas_larga(self, cita_manager, temp_dir):
+        """Prueba que se detecte el cruce con una cita larga aunque otra más corta empiece después"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        cita_manager.medico_manager.registrar_medico(
+            "M550", "Nora Cid", "clave", "3000000000", "nora@example.com", "Cardiología"
+        )
+        inicio = (datetime.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0).timestamp()
+        # Citas importadas con duraciones distintas: 9:00-11:00 y 9:30-10:00
+        cita_manager.repo.importar([
+            {"codigo_cita": "LARGA", "documento_medico": "M550", "fecha_epoch": inicio, "fecha_fin_epoch": inicio + 7200},
+            {"codigo_cita": "CORTA", "documento_medico": "M550", "fecha_epoch": inicio + 1800, "fecha_fin_epoch": inicio + 3600},
+        ])
+        datos = dict(paciente="Laura Diaz", medico="M550", documento="P550", tipoCita="Consulta", motivoPaciente="Control")
+
+        with pytest.raises(HorarioOcupado) as error:
+            cita_manager.agendar_cita(fecha=datetime.fromtimestamp(inicio + 4500).isoformat(), **datos)
+        assert error.value.cita["codigo_cita"] == "LARGA"
+        assert cita_manager.repo.intervalos_ocupados("M550", inicio + 4500, inicio + 5400) == [(inicio, inicio + 7200)]
+        cita_manager.agendar_cita(fecha=datetime.fromtimestamp(inicio + 7200).isoformat(), **datos)
+
+    def test_horarios_libres_desde_la_agenda(self, cita_manager, temp_dir):
+        """Prueba que los horarios libres omitan los ocupados y respeten la jornada"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        for documento, nombre in (("M600", "Sara Paz"), ("M601", "Ivan Rey")):
+            cita_manager.medico_manager.registrar_medico(
+                documento, nombre, "clave", "3000000000", "m@example.com", "Dermatología"
+            )
+        dia = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        cita_manager.agendar_cita(
+            paciente="Laura Diaz", medico="M600", fecha=(dia + timedelta(hours=8)).isoformat(),
+            documento="P600", tipoCita="Consulta", motivoPaciente="Control"
+        )
+        documentos = cita_manager.medico_manager.buscar_documentos_por_especialidad("dermatologia")
+        assert documentos == ["M600", "M601"]
+
+        libres = cita_manager.horarios_libres(["M600"], dia.timestamp(), (dia + timedelta(days=1)).timestamp(), n=2)
+        assert [h["fecha"] for h in libres] == [
+            (dia + timedelta(hours=8, minutes=30)).isoformat(), (dia + timedelta(hours=9)).isoformat()
+        ]
+        libres = cita_manager.horarios_libres(documentos, dia.timestamp(), (dia + timedelta(days=1)).timestamp(), n=2)
+        assert [(h["documento_medico"], h["fecha"]) for h in libres] == [
+            ("M601", (dia + timedelta(hours=8)).isoformat()), ("M600", (dia + timedelta(hours=8, minutes=30)).isoformat())
+        ]
+
+    def test_cancelar_cita_por_codigo(self, cita_manager, temp_dir):
+        """Prueba que cancelar por código quite la cita de ambas vistas y deje la marca"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        cita_manager.medico_manager.registrar_medico(
+            "M700", "Olga Vera", "clave", "3000000000", "olga@example.com", "Pediatría"
+        )
+        cita = cita_manager.agendar_cita(
+            paciente="Laura Diaz", medico="M700", fecha=(datetime.now() + timedelta(days=1)).isoformat(),
+            documento="P700", tipoCita="Consulta", motivoPaciente="Control"
+        )
+
+        assert cita_manager.cancelar_cita(cita["codigo_cita"])["eliminada"] is True
+        assert cita_manager.obtener_citas_paciente("P700") == []
+        assert cita_manager.obtener_agenda_medico("M700") == []
+        assert cita_manager.repo.get(cita["codigo_cita"])["eliminada"] is True
+        assert cita_manager.cancelar_cita(cita["codigo_cita"]) is None
+
+    def test_cancelar_cita_agrega_solo_la_marca(self, cita_manager, monkeypatch):
+        """Prueba que con el motor log cancelar busque la cita una vez y agregue una línea sin reescribir citas.json"""
+        monkeypatch.setattr("app.config.STORAGE_ENGINES", {"citas": "log"})
+        repo = cita_manager.repo
+        cita = cita_manager.agendar_cita(
+            paciente="Laura Diaz", medico="Dr. Smith", fecha=(datetime.now() + timedelta(days=1)).isoformat(),
+            documento="P701", tipoCita="Consulta", motivoPaciente="Control"
+        )
+        snapshot = repo._storage.firma()[:3]
+        lineas = repo._storage.log_path.read_text().count("\n")
+        busquedas = []
+        posicion = type(repo)._posicion
+        monkeypatch.setattr(type(repo), "_posicion", lambda self, entrada, id: busquedas.append(id) or posicion(self, entrada, id))
+
+        assert cita_manager.cancelar_cita(cita["codigo_cita"])["eliminada"] is True
+        assert busquedas == [cita["codigo_cita"]]
+        assert repo._storage.firma()[:3] == snapshot
+        assert repo._storage.log_path.read_text().count("\n") == lineas + 1
+
+    def test_migracion_desde_archivos_legacy(self, temp_dir):
+        """Prueba la migración única de citas/<paciente>.json y agendas/<medico>.json"""
+        base = {"paciente": "Luis", "documento": "P300", "codigo_cita": "AAA111",
+                "medico_info": {"documento_medico": "M300", "nombre_medico": "Dr. X"}}
+        with open(os.path.join(temp_dir, "P300.json"), "w") as f:
+            json.dump([base, {**base, "codigo_cita": "BBB222"}], f)
+        os.makedirs(os.path.join(temp_dir, "agendas"))
+        with open(os.path.join(temp_dir, "agendas", "M300.json"), "w") as f:
+            json.dump([{**base, "estado": "realizada"}], f)
+
+        manager = CitaManager(base_path=temp_dir)
+        assert {c["codigo_cita"]: c.get("estado") for c in manager.obtener_citas_paciente("P300")} == {"AAA111": "realizada", "BBB222": None}
+        assert [c["codigo_cita"] for c in manager.obtener_agenda_medico("M300")] == ["AAA111", "BBB222"]
+        # Una segunda instancia no vuelve a migrar
+        assert len(CitaManager(base_path=temp_dir).repo.list()) == 2
+
+    def test_agenda_incluye_citas_sin_fecha_para_revision(self, cita_manager, temp_dir):
+        """Prueba que la agenda por defecto conserve las citas sin fecha interpretable"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        cita_manager.medico_manager.registrar_medico(
+            "M800", "Ana Sol", "clave", "3000000000", "ana@example.com", "Pediatría"
+        )
+        futura = cita_manager.agendar_cita(
+            paciente="Laura Diaz", medico="M800", fecha=(datetime.now() + timedelta(days=1)).isoformat(),
+            documento="P800", tipoCita="Consulta", motivoPaciente="Control"
+        )
+        cita_manager.repo.importar([{"codigo_cita": "LEGACY", "documento_medico": "M800", "fecha": "mañana"}])
+        servicio = MedicoService.__new__(MedicoService)
+        servicio.cita_manager = cita_manager
+
+        agenda = servicio.obtener_agenda_medico("M800")
+        assert [c["codigo_cita"] for c in agenda] == [futura["codigo_cita"], "LEGACY"]
+        # Con un rango explícito sólo se retornan citas con fecha
+        desde = datetime.now()
+        assert [c["codigo_cita"] for c in servicio.obtener_agenda_medico("M800", desde)] == [futura["codigo_cita"]]
+
+    def test_migracion_conserva_codigos_legacy_repetidos(self, temp_dir, caplog):
+        """Prueba que dos citas legacy distintas con el mismo código se migren ambas"""
+        cita = {"paciente": "Luis", "codigo_cita": "AAA111", "fecha": "2030-01-01T10:00:00",
+                "medico_info": {"documento_medico": "M310", "nombre_medico": "Dr. X"}}
+        with open(os.path.join(temp_dir, "P310.json"), "w") as f:
+            json.dump([{**cita, "documento": "P310"}], f)
+        with open(os.path.join(temp_dir, "P311.json"), "w") as f:
+            json.dump([{**cita, "documento": "P311"}], f)
+
+        manager = CitaManager(base_path=temp_dir)
+        assert [c["codigo_cita"] for c in manager.obtener_citas_paciente("P310")] == ["AAA111"]
+        otra = manager.obtener_citas_paciente("P311")
+        assert [(c["codigo_cita"], c["codigo_cita_legacy"]) for c in otra] == [("AAA111-1", "AAA111")]
+        assert "AAA111" in caplog.text
+
+    def test_verificar_medico_por_nombre_usa_indice(self, cita_manager, temp_dir):
+        """Prueba que el médico se resuelva por nombre normalizado sin recorrer el directorio"""
+        cita_manager.medico_manager = MedicoManager(base_dir=Path(temp_dir))
+        cita_manager.medico_manager.registrar_medico(
+            "M100", "José Pérez", "clave", "3000000000", "jose@example.com", "Medicina general"
+        )
+        
+        assert cita_manager.verificar_medico("jose  PEREZ") == {"nombre": "José Pérez", "documento": "M100"}
+        
+        # El índice se reconstruye desde medicos/ si se elimina
+        os.remove(cita_manager.medico_manager.indice_nombres.path)
+        otro = MedicoManager(base_dir=Path(temp_dir))
+        assert otro.buscar_documentos_por_nombre("José Pérez") == ["M100"]
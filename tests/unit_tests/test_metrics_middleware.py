@@ -0,0 +1,60 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.responses import StreamingResponse
+from prometheus_client import REGISTRY
+from app.metrics.middleware import MetricsMiddleware
+
+
+def _muestra(nombre, **labels):
+    return REGISTRY.get_sample_value(nombre, labels) or 0
+
+
+def _en_curso():
+    return REGISTRY.get_sample_value("vitalapp_http_requests_en_curso")
+
+
+class TestMetricsMiddleware:
+
+    def _cliente(self, observado):
+        app = FastAPI()
+
+        @app.get("/mw-test/falla/{codigo}")
+        async def falla(codigo: str):
+            raise RuntimeError("error de prueba")
+
+        @app.get("/mw-test/stream")
+        async def stream():
+            async def _fragmentos():
+                for fragmento in (b"abc", b"defg", b"hi"):
+                    observado.append(_en_curso())
+                    yield fragmento
+            return StreamingResponse(_fragmentos())
+
+        app.add_middleware(MetricsMiddleware)
+        return TestClient(app, raise_server_exceptions=False)
+
+    def test_excepcion_se_registra_como_500(self):
+        """Prueba que una excepción del endpoint se registre con status 500 y la plantilla de la ruta"""
+        cliente = self._cliente([])
+        antes = _muestra("vitalapp_http_requests_total", method="GET", route="/mw-test/falla/{codigo}", status="500")
+
+        assert cliente.get("/mw-test/falla/X1").status_code == 500
+
+        assert _muestra("vitalapp_http_requests_total", method="GET", route="/mw-test/falla/{codigo}", status="500") == antes + 1
+        assert _en_curso() == 0
+
+    def test_streaming_registra_status_tamano_y_en_curso(self):
+        """Prueba que una respuesta en streaming se mida hasta el último fragmento"""
+        observado = []
+        cliente = self._cliente(observado)
+        antes = _muestra("vitalapp_http_requests_total", method="GET", route="/mw-test/stream", status="200")
+        bytes_antes = _muestra("vitalapp_http_response_size_bytes_sum", method="GET", route="/mw-test/stream")
+
+        respuesta = cliente.get("/mw-test/stream")
+
+        assert respuesta.content == b"abcdefghi"
+        assert _muestra("vitalapp_http_requests_total", method="GET", route="/mw-test/stream", status="200") == antes + 1
+        assert _muestra("vitalapp_http_response_size_bytes_sum", method="GET", route="/mw-test/stream") == bytes_antes + 9
+        # La solicitud cuenta como en curso mientras se envían los fragmentos y vuelve a 0 al terminar
+        assert observado == [1, 1, 1]
+        assert _en_curso() == 0
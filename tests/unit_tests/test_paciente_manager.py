@@ -135,4 +135,37 @@ class TestPacienteManager:
         assert hash1 == hash2
         
         # Contraseñas diferentes deben generar hashes diferentes
-        assert hash1 != hash3
\ No newline at end of file
+        assert hash1 != hash3
+    
+    def test_existencia_desde_registro_en_memoria(self, paciente_manager, monkeypatch):
+        """Prueba que un paciente registrado se verifique sin consultar el disco"""
+        paciente_manager.registrar_paciente("555", "Ana Ruiz", "clave", "300", "ana@example.com", 30, "F")
+        # Registrado por otro worker: sólo existe el archivo
+        with open(os.path.join(paciente_manager._pacientes_dir, "777.json"), "w") as f:
+            f.write("{}")
+        assert paciente_manager.existe_paciente("777")
+
+        def _sin_disco(*args):
+            raise AssertionError("consulta al sistema de archivos")
+        monkeypatch.setattr("pathlib.Path.exists", _sin_disco)
+        assert paciente_manager.existe_paciente("555")
+        assert paciente_manager.existe_paciente("777")
+
+    def test_autenticar_y_obtener_con_cache_de_perfiles(self, paciente_manager, monkeypatch):
+        """Prueba que login cargue el perfil una vez y que la escritura invalide la caché"""
+        from app.utils import sesion
+        paciente_manager.registrar_paciente("888", "Ana Ruiz", "clave", "300", "ana@example.com", 30, "F")
+        lecturas = []
+        cargar = sesion.atomic_load_json
+        monkeypatch.setattr(sesion, "atomic_load_json", lambda p: lecturas.append(p) or cargar(p))
+
+        autenticado, datos = paciente_manager.autenticar_y_obtener("888", "clave")
+        assert autenticado and datos["nombre_completo"] == "Ana Ruiz" and "contraseña" not in datos
+        assert paciente_manager.autenticar_y_obtener("888", "otra") == (False, None)
+        assert paciente_manager.obtener_datos_paciente("888")["email"] == "ana@example.com"
+        assert len(lecturas) == 1
+
+        datos = paciente_manager._cargar_paciente("888")
+        paciente_manager._guardar_paciente({**datos, "contraseña": "nueva", "email": "nuevo@example.com"})
+        assert paciente_manager.obtener_datos_paciente("888")["email"] == "nuevo@example.com"
+        assert len(lecturas) == 2
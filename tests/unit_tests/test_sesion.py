@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+import json
+from app.managers.medico_manager import MedicoManager
+from app.utils import sesion as sesion_mod
+from app.utils.sesion import SesionMiddleware, abrir_sesion
+
+
+class TestSesion:
+
+    def test_lectura_unica_y_escritura_al_confirmar(self, tmp_path, monkeypatch):
+        """Prueba que cada archivo se lea una vez y los cambios se escriban al cerrar la sesión"""
+        manager = MedicoManager(base_dir=tmp_path)
+        manager.registrar_medico("M1", "Ana Ruiz", "clave", "300", "ana@example.com", "Pediatría")
+        archivo = tmp_path / "medicos" / "M1.json"
+        lecturas, escrituras = [], []
+        cargar, escribir = sesion_mod.atomic_load_json, sesion_mod.locked_atomic_write
+        monkeypatch.setattr(sesion_mod, "atomic_load_json", lambda p: lecturas.append(p) or cargar(p))
+        monkeypatch.setattr(sesion_mod, "locked_atomic_write", lambda p, d: escrituras.append(p) or escribir(p, d))
+
+        with abrir_sesion() as sesion:
+            datos = manager.obtener_datos_medico("M1")
+            manager.marcar_cita_atendida("M1", "C1")
+            manager.marcar_cita_atendida("M1", "C2")
+            assert manager.obtener_datos_medico("M1")["citas_atendidas"] == ["C1", "C2"]
+            # Aún no se escribió en disco
+            assert json.loads(archivo.read_text())["citas_atendidas"] == []
+            sesion.confirmar()
+
+        assert lecturas == [str(archivo)]
+        assert escrituras == [str(archivo)]
+        guardado = json.loads(archivo.read_text())
+        assert guardado["citas_atendidas"] == ["C1", "C2"]
+        # obtener_datos_medico quitó la contraseña de su copia, no de la sesión
+        assert "contraseña" not in datos and guardado["contraseña"]
+
+    def test_sin_sesion_escribe_directo(self, tmp_path):
+        """Prueba que fuera de una solicitud los managers lean y escriban en disco"""
+        manager = MedicoManager(base_dir=tmp_path)
+        manager.registrar_medico("M2", "Eva Mora", "clave", "300", "eva@example.com", "Pediatría")
+        manager.marcar_cita_atendida("M2", "C1")
+
+        assert json.loads((tmp_path / "medicos" / "M2.json").read_text())["citas_atendidas"] == ["C1"]
+
+    def test_registro_e_indices_se_actualizan_al_confirmar(self, tmp_path, monkeypatch):
+        """Prueba que registro e índices sólo apunten a médicos cuyo archivo se escribió"""
+        manager = MedicoManager(base_dir=tmp_path)
+
+        def _falla(path, data):
+            raise OSError("disco lleno")
+        monkeypatch.setattr(sesion_mod, "locked_atomic_write", _falla)
+        with abrir_sesion() as sesion:
+            manager.registrar_medico("M3", "Luz Paz", "clave", "300", "luz@example.com", "Pediatría")
+            # Dentro de la misma solicitud el médico ya es visible
+            assert manager.obtener_datos_medico("M3")["nombre_completo"] == "Luz Paz"
+            with pytest.raises(OSError):
+                sesion.confirmar()
+        assert not manager.existe_medico("M3")
+        assert manager.buscar_documentos_por_especialidad("Pediatría") == []
+
+        monkeypatch.undo()
+        with abrir_sesion() as sesion:
+            manager.registrar_medico("M4", "Eva Mora", "clave", "300", "eva@example.com", "Pediatría")
+            assert manager.buscar_documentos_por_especialidad("Pediatría") == []
+            sesion.confirmar()
+        assert manager.existe_medico("M4")
+        assert manager.buscar_documentos_por_especialidad("Pediatría") == ["M4"]
+
+    def test_middleware_confirma_solo_con_cambios(self, monkeypatch):
+        """Prueba que el middleware no use el pool de I/O si la solicitud no dejó cambios y confirme una sola vez si los dejó"""
+        llamadas = []
+
+        async def _ejecutar(fn):
+            llamadas.append(fn)
+            return fn()
+        monkeypatch.setattr(sesion_mod, "ejecutar_bloqueante", _ejecutar)
+
+        def _app(con_cambios):
+            async def app(scope, receive, send):
+                if con_cambios:
+                    sesion_mod.al_confirmar(lambda: None)
+                await send({"type": "http.response.start", "status": 200, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+            return app
+
+        async def _enviar(message):
+            pass
+
+        asyncio.run(SesionMiddleware(_app(False))({"type": "http"}, None, _enviar))
+        assert llamadas == []
+        asyncio.run(SesionMiddleware(_app(True))({"type": "http"}, None, _enviar))
+        assert len(llamadas) == 1
@@ -0,0 +1,76 @@
+import json
+import sqlite3
+import pytest
+from app.repositories.base_repository import limpiar_cache
+from app.repositories.examen_repository import ExamenSolicitudRepository
+from app.repositories.sqlite_storage import SQLiteStorage, importar_json
+from app.repositories.storage import EntradaCache
+
+
+class TestSQLiteStorage:
+
+    @pytest.fixture
+    def repo(self, tmp_path, monkeypatch):
+        """Repositorio de solicitudes respaldado por SQLite"""
+        monkeypatch.setattr("app.config.STORAGE_ENGINES", {"examenes_solicitudes": "sqlite"})
+        limpiar_cache()
+        return ExamenSolicitudRepository(tmp_path)
+
+    def test_base_en_modo_wal_con_columnas_indexadas(self, repo):
+        """Prueba que la base use WAL e indexe las columnas de consulta"""
+        assert isinstance(repo._storage, SQLiteStorage)
+        conn = sqlite3.connect(repo._storage.db_path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        indices = {fila[1] for fila in conn.execute("PRAGMA index_list(items)")}
+        for columna in ("id", "codigo_cita", "documento_paciente", "documento_medico", "estado"):
+            assert f"ix_items_{columna}" in indices
+
+    def test_operaciones_del_repositorio(self, repo):
+        """Prueba list/get/insert/update/filter sobre SQLite"""
+        repo.insert({"id": "1", "codigo_cita": "C1", "documento_paciente": "P1", "estado": "solicitado"})
+        repo.insert({"id": "2", "codigo_cita": "C2", "documento_paciente": "P2", "estado": "solicitado"})
+        repo.update("1", lambda s: {**s, "estado": "autorizado"})
+
+        assert repo.get("C1")["estado"] == "autorizado"
+        assert [s["id"] for s in repo.list()] == ["1", "2"]
+        assert [s["id"] for s in repo.filter(lambda s: s["estado"] == "solicitado")] == ["2"]
+
+    def test_consulta_indexada_sin_cache(self, repo):
+        """Prueba que find_by consulte SQLite cuando la colección no está en memoria"""
+        repo.insert({"id": "1", "documento_paciente": "P1", "documento_medico": "M1"})
+        limpiar_cache()
+
+        assert repo.listar_por_paciente("P1") == [{"id": "1", "documento_paciente": "P1", "documento_medico": "M1", "version": 1}]
+        assert repo.get("1")["documento_medico"] == "M1"
+
+    def test_cache_se_actualiza_solo_con_filas_cambiadas(self, repo):
+        """Prueba que una escritura de otro worker se aplique sin releer la tabla completa"""
+        repo.insert_many([{"id": str(i), "estado": "solicitado"} for i in range(3)])
+        entrada = repo._entrada()
+        storage = repo._storage
+        # Otro worker: escribe sin pasar por la caché de este proceso
+        with storage.lock():
+            storage.registrar(EntradaCache(entrada.firma, list(entrada.items)), [
+                ("update", 1, {**entrada.items[1], "estado": "autorizado"}),
+                ("insert", None, {"id": "3", "estado": "solicitado"}),
+            ])
+
+        assert repo._entrada() is entrada
+        assert [(s["id"], s["estado"]) for s in repo.list()] == [
+            ("0", "solicitado"), ("1", "autorizado"), ("2", "solicitado"), ("3", "solicitado")
+        ]
+        assert repo.find_by("estado", "autorizado")[0]["id"] == "1"
+        # Una reescritura completa sí obliga a releer
+        with storage.lock():
+            storage.escribir_todo([{"id": "9"}])
+        assert [s["id"] for s in repo.list()] == ["9"]
+
+    def test_importar_json(self, tmp_path):
+        """Prueba la importación única desde el archivo JSON existente"""
+        json_path = tmp_path / "examenes_resultados.json"
+        json_path.write_text(json.dumps([{"id": "1"}, {"id": "2"}]))
+
+        assert importar_json(json_path) == 2
+        assert importar_json(json_path) == 2
+        storage = SQLiteStorage(json_path)
+        assert [i["id"] for i in storage.leer(None, ()).items] == ["1", "2"]
@@ -0,0 +1,49 @@
+import pytest
+from app.config import crear_token_acceso
+from app.security import token_cache
+from app.security.token_cache import limpiar_tokens, verificar_token
+
+
+class TestTokenCache:
+
+    @pytest.fixture
+    def decodificaciones(self, monkeypatch):
+        """Cuenta las verificaciones criptográficas reales"""
+        limpiar_tokens()
+        llamadas = []
+        original = token_cache.config.decodificar_token_acceso
+        monkeypatch.setattr(token_cache.config, "decodificar_token_acceso", lambda t: llamadas.append(t) or original(t))
+        yield llamadas
+        limpiar_tokens()
+
+    def test_token_repetido_no_se_vuelve_a_verificar(self, decodificaciones):
+        """Prueba que el mismo token se verifique una sola vez"""
+        token = crear_token_acceso({"documento": "P1", "tipo_usuario": "paciente"})
+
+        assert verificar_token(token)["documento"] == "P1"
+        assert verificar_token(token)["documento"] == "P1"
+        assert len(decodificaciones) == 1
+
+    def test_vigencia_acotada_por_exp(self, decodificaciones, monkeypatch):
+        """Prueba que la entrada no sobreviva al exp del token"""
+        token = crear_token_acceso({"documento": "P1"})
+        payload = verificar_token(token)
+        monkeypatch.setattr(token_cache, "time", lambda: payload["exp"] + 1)
+
+        # Vencida la entrada se vuelve a verificar (y PyJWT rechaza el token si expiró)
+        verificar_token(token)
+        assert len(decodificaciones) == 2
+
+    def test_capacidad_acotada(self, decodificaciones, monkeypatch):
+        """Prueba que al llenarse se descarte el token usado hace más tiempo"""
+        monkeypatch.setattr(token_cache.config, "TOKEN_CACHE_SIZE", 2)
+        a, b, c = (crear_token_acceso({"documento": d}) for d in ("A", "B", "C"))
+        for token in (a, b, a, c):
+            verificar_token(token)
+        decodificaciones.clear()
+
+        verificar_token(a)
+        verificar_token(c)
+        assert decodificaciones == []
+        verificar_token(b)
+        assert decodificaciones == [b]